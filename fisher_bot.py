@@ -1,15 +1,29 @@
+import asyncio
 import datetime
 from typing import Tuple
 import discord
 import os
 import sys
 import logging
+import threading
+import time
 
-from discord.ext import commands
+from discord.ext import commands, tasks
 
+from services.admission import AdmissionController
+from services.autofish import AutoFishScheduler
+from services.backup import BackupService
+from services.catch_log import CatchLog
 from services.db import DbService
-
-import sqlite3
+from services.ledger import compact_ledger
+from services.maintenance import MaintenanceService
+from services.metrics import Metrics
+from services.notifier import NotificationQueue
+from services.purge import PurgeService
+from services.read_pool import ReadPool
+from services.shard_router import ShardRouter
+from services.trace import TraceRecorder
+from services.watchdog import ACTIVE_COMMAND, LoopWatchdog
 
 from services.fish_service import FishService
 
@@ -17,11 +31,17 @@ from services.fish_service import FishService
 # Set to True to drop all tables and reinitialize the database on startup.
 DELETE_DEFAULTS: bool = False
 
-discord.utils.setup_logging(root=True)
-
 
 class FisherBot(commands.Bot):
-  def __init__(self, dbpath):
+  def __init__(
+    self,
+    dbpath,
+    shard_count: int = 1,
+    backup_dir: str | None = None,
+    trace_path: str | None = None,
+    maintenance_hour: int = 4,
+    purge_after_days: int = 30,
+  ):
     intents = discord.Intents.default()
     intents.message_content = True
 
@@ -34,9 +54,20 @@ class FisherBot(commands.Bot):
 
     self.logger = logging.getLogger('FisherCat')
 
+    self.metrics = Metrics()
+    self.watchdog: LoopWatchdog | None = None
+
+    self.notifier = NotificationQueue(self.metrics)
+
+    # Records anonymized traffic for tools/replay.py when FISHER_TRACE is set.
+    self.trace = TraceRecorder(trace_path) if trace_path else None
+
+    # How long the event loop may go without answering before the watchdog reports a stall.
+    self.stall_threshold: float = 0.25
+
     self.logger.info('Connecting to database.')
-    self.connection = sqlite3.connect(dbpath)
-    self.connection.row_factory = sqlite3.Row
+    self.router = ShardRouter(dbpath, shard_count)
+    self.connection = self.router.catalog
 
     if DELETE_DEFAULTS:
       from services.db_init import (
@@ -56,6 +87,13 @@ class FisherBot(commands.Bot):
       else:
         sys.exit(1)
 
+      self.router.load_directory()
+
+      if shard_count > 1:
+        for shard in self.router.shards:
+          if not drop_tables(shard):
+            sys.exit(1)
+
       if not import_fish(self.connection, self.fish_service):
         sys.exit(1)
       if not import_rods(self.connection, self.fish_service):
@@ -68,11 +106,40 @@ class FisherBot(commands.Bot):
       if not load_existing_rods(self.connection, self.fish_service):
         sys.exit(1)
 
-    self.db = DbService(self.connection)
+    from services.db_init import initialize_shard
+
+    # Also adds tables introduced after a database was created, like the ledger.
+    for shard in self.router.shards:
+      if not initialize_shard(shard):
+        sys.exit(1)
+
+    self.read_pool = ReadPool(self.router)
+    self.db = DbService(self.router, self.read_pool)
+
+    self.admission = AdmissionController(self.metrics, self.read_pool)
+
+    self.backups: BackupService | None = None
+    if backup_dir:
+      self.backups = BackupService(self.router, backup_dir, self.metrics)
+
+    self.maintenance = MaintenanceService(self.router, self.metrics)
+    # Hour of the day (UTC) to run maintenance at, pick one with little traffic.
+    self.maintenance_hour = maintenance_hour
+
+    self.catches = CatchLog(self.router, self.read_pool, self.metrics)
+
+    # Data of guilds and members that left is deleted this many days later, unless they come back.
+    self.purge = PurgeService(self.router, self.metrics, grace_days=purge_after_days)
+
+    self.autofish = AutoFishScheduler(
+      self.router, self.fish_service, self.notifier, self.metrics, self.catches
+    )
 
   async def on_tree_error(
     self, interaction: discord.Interaction, error: discord.app_commands.AppCommandError
   ):
+    self.admission.finished(interaction)
+
     if isinstance(error, discord.app_commands.CommandOnCooldown):
       await interaction.response.send_message(
         f'Cooldown! Try again in {error.retry_after:.2f}s', ephemeral=True
@@ -92,8 +159,51 @@ class FisherBot(commands.Bot):
 
     self.logger.error('Ignoring exception in command tree:', exc_info=error)
 
+  async def on_tree_interaction_check(self, interaction: discord.Interaction) -> bool:
+    if interaction.command is not None:
+      ACTIVE_COMMAND.set(interaction.command.qualified_name)
+
+    return await self.admission.check(interaction)
+
+  async def on_app_command_completion(
+    self, interaction: discord.Interaction, command: discord.app_commands.Command
+  ):
+    self.admission.finished(interaction)
+
   async def on_ready(self):
-    self.logger.info(f'Logged in as {self.user.name} - {self.user.id}')  # type: ignore
+    self.logger.info('Logged in as %s - %s', self.user.name, self.user.id)  # type: ignore
+
+  def dispatch(self, event_name: str, /, *args, **kwargs) -> None:
+    if event_name == 'interaction':
+      # Runs while the interaction is parsed, before the command tree's check or on_interaction get to
+      # run, so admission measures how long it waited here by the monotonic clock instead of the host's
+      # wall clock against Discord's.
+      args[0].extras['received'] = time.monotonic()
+    super().dispatch(event_name, *args, **kwargs)
+
+  async def on_interaction(self, interaction: discord.Interaction):
+    if self.trace is not None:
+      self.trace.interaction(interaction)
+
+  async def on_guild_remove(self, guild: discord.Guild):
+    self.purge.depart(guild.id)
+    self.autofish.drop_guild(guild.id)
+    self.logger.info(
+      'Left guild %s, its data is purged in %s days.', guild.id, self.purge.grace_days
+    )
+
+  async def on_guild_join(self, guild: discord.Guild):
+    if self.purge.cancel(guild.id):
+      self.logger.info('Back in guild %s, its data is kept.', guild.id)
+
+  # Member events only arrive with the members intent, enable it in the developer portal to purge members too.
+  async def on_member_remove(self, member: discord.Member):
+    if not member.bot:
+      self.purge.depart(member.guild.id, member.id)
+
+  async def on_member_join(self, member: discord.Member):
+    if not member.bot:
+      self.purge.cancel(member.guild.id, member.id)
 
   async def on_message(self, message: discord.Message):
     if message.author.bot:
@@ -101,6 +211,13 @@ class FisherBot(commands.Bot):
     if not message.guild:
       return
 
+    if self.trace is not None:
+      self.trace.message(message)
+
+    # Message XP is the first thing to go when the database is backed up.
+    if not self.admission.admit('message', essential=False):
+      return
+
     self.db.ensure_guild(message.guild.id)
 
     user = self.db.ensure_user(message.author.id, message.guild.id)
@@ -121,28 +238,54 @@ class FisherBot(commands.Bot):
     if not user_found:
       self.message_cooldowns.append((message.author.id, datetime.datetime.now()))
 
+      # add_xp writes the change itself.
       _, total_coins = self.db.add_xp(
-        guild_id=message.author.id,
-        member_id=message.guild.id,
+        guild_id=message.guild.id,
+        member_id=message.author.id,
         xp=user.xp_next,
         user=user,
       )
 
-      await message.channel.send(
-        f'Congrats, {message.author.mention}! You leveled up and earned {total_coins} coins!'
-      )
-
-    self.db.update_user(message.guild.id, message.author.id, user)
+      self.notifier.level_up(message.channel, message.author.mention, total_coins)
 
   async def setup_hook(self):
+    self.start_services()
+    await self.load_modules()
+
+    self.logger.info('Syncing.')
+    try:
+      synced = await self.tree.sync()
+      self.logger.info('Synced %s command(s) globally.', len(synced))
+    except Exception as e:
+      self.logger.error('Failed to sync commands: %s', e)
+
+  def start_services(self):
     self.tree.on_error = self.on_tree_error
+    self.tree.interaction_check = self.on_tree_interaction_check
 
+    self.watchdog = LoopWatchdog(
+      self.loop, threading.get_ident(), self.metrics, threshold=self.stall_threshold
+    )
+    self.watchdog.start()
+
+    self.compact_ledgers.start()
+    self.autofish_tick.start()
+    self.flush_catches.start()
+    if self.backups is not None:
+      self.backup_databases.start()
+
+    self.maintain_databases.change_interval(
+      time=datetime.time(hour=self.maintenance_hour, tzinfo=datetime.timezone.utc)
+    )
+    self.maintain_databases.start()
+
+  async def load_modules(self):
     for root, dirs, files in os.walk('modules'):
       for file in files:
         if file.endswith('.py'):
           path = (
             os.path.relpath(os.path.join(root, file), 'modules')
-            .replace('\\', '.')
+            .replace(os.sep, '.')
             .replace('.py', '')
           )
 
@@ -151,16 +294,100 @@ class FisherBot(commands.Bot):
 
           try:
             await self.load_extension(f'modules.{path}')
-            self.logger.info(f'Loaded module: {path}')
+            self.logger.info('Loaded module: %s', path)
           except Exception as e:
-            self.logger.error(f'Failed to load module {path}: {e}')
+            self.logger.error('Failed to load module %s: %s', path, e)
+
+  @tasks.loop(seconds=30)
+  async def compact_ledgers(self):
+    for index in range(self.router.shard_count):
+      # A shard that is locked or failing is tried again next round, the others still get compacted.
+      try:
+        folded = await asyncio.to_thread(self._compact_shard_ledger, index)
+      except Exception as e:
+        self.logger.error('Compacting the ledger of shard %s failed: %s', index, e)
+        continue
+
+      if folded:
+        self.metrics.increment('ledger.compacted', folded)
+
+  def _compact_shard_ledger(self, index: int) -> int:
+    # Runs on a worker thread with its own connection, in small batches so the
+    # bot's writer never waits long for the lock.
+    conn = self.router.open_shard(index)
+    try:
+      total = 0
+      while folded := compact_ledger(conn):
+        total += folded
+      return total
+    finally:
+      conn.close()
+
+  @tasks.loop(seconds=5)
+  async def autofish_tick(self):
+    try:
+      await self.autofish.tick()
+    except Exception as e:
+      self.logger.error('Auto-fishing tick failed: %s', e)
+
+  @tasks.loop(seconds=10)
+  async def flush_catches(self):
+    pending = self.catches.take()
+    if pending:
+      try:
+        await asyncio.to_thread(self.catches.flush, pending)
+      except Exception as e:
+        self.logger.error('Flushing catches failed: %s', e)
+
+  @flush_catches.after_loop
+  async def flush_remaining_catches(self):
+    # Whatever was caught since the last flush is written before the bot goes down.
+    pending = self.catches.take()
+    if pending:
+      await asyncio.to_thread(self.catches.flush, pending)
+
+  @tasks.loop(hours=6)
+  async def backup_databases(self):
+    try:
+      await asyncio.to_thread(self.backups.run)
+    except Exception as e:
+      self.logger.error('Scheduled backup failed: %s', e)
 
-    self.logger.info('Syncing.')
+  @tasks.loop(hours=24)
+  async def maintain_databases(self):
     try:
-      synced = await self.tree.sync()
-      self.logger.info(f'Synced {len(synced)} command(s) globally.')
+      await asyncio.to_thread(self.maintenance.run)
     except Exception as e:
-      self.logger.error(f'Failed to sync commands: {e}')
+      self.logger.error('Scheduled maintenance failed: %s', e)
+
+    try:
+      await asyncio.to_thread(self.catches.prune)
+    except Exception as e:
+      self.logger.error('Pruning the catch history failed: %s', e)
+
+    try:
+      await asyncio.to_thread(self.purge.run)
+    except Exception as e:
+      self.logger.error('Purging departed guilds failed: %s', e)
+
+  async def close(self):
+    self.compact_ledgers.cancel()
+    self.autofish_tick.cancel()
+    self.flush_catches.stop()
+    self.backup_databases.cancel()
+    self.maintain_databases.cancel()
+
+    if self.watchdog is not None:
+      self.watchdog.stop()
+
+    self.notifier.close()
+
+    if self.trace is not None:
+      self.trace.close()
+
+    await super().close()
+    self.read_pool.close()
+    self.router.close()
 
   def get_guildmember_ids(self, interaction: discord.Interaction) -> Tuple[int, int]:
     guildid = interaction.guild_id
@@ -1,11 +1,27 @@
+import logging
 import os
 from dotenv import load_dotenv
 
 from fisher_bot import FisherBot
+from util.log_queue import parse_sampling, setup_logging
 
 
 load_dotenv()
 TOKEN: str = os.environ['FISHER_TOKEN']
 
-client = FisherBot(os.environ['FISHER_DATABASE'])
-client.run(TOKEN)
+setup_logging(
+  level=getattr(logging, os.environ.get('FISHER_LOG_LEVEL', 'INFO').upper()),
+  json_output=os.environ.get('FISHER_LOG_FORMAT') == 'json',
+  sampling=parse_sampling(os.environ.get('FISHER_LOG_SAMPLE')),
+)
+
+client = FisherBot(
+  os.environ['FISHER_DATABASE'],
+  shard_count=int(os.environ.get('FISHER_SHARDS', 1)),
+  backup_dir=os.environ.get('FISHER_BACKUP_DIR'),
+  trace_path=os.environ.get('FISHER_TRACE'),
+  maintenance_hour=int(os.environ.get('FISHER_MAINTENANCE_HOUR', 4)),
+  purge_after_days=int(os.environ.get('FISHER_PURGE_DAYS', 30)),
+)
+# Logging is already set up above, don't let discord.py add its own handler.
+client.run(TOKEN, log_handler=None)
@@ -1,7 +1,16 @@
 from enum import Enum
 
 class Area(Enum):
-  lake = 1,
-  ocean = 2,
-  swamp = 3,
+  lake = 1
+  ocean = 2
+  swamp = 3
   river = 4
+
+  @classmethod
+  def decode(cls, value) -> 'Area':
+    """
+    Reads an area from the database, which is an integer since schema v2 and its name before that.
+    """
+    if isinstance(value, str) and not value.isdigit():
+      return cls[value]
+    return cls(int(value))
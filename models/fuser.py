@@ -1,9 +1,27 @@
 import datetime
 from datetime import datetime
+from typing import Dict, Set
 
 
 class FUser:
+    # Field -> guildmember column, for every field that is stored.
+    COLUMNS: Dict[str, str] = {
+        'coins': 'coins',
+        'xp': 'xp',
+        'xp_step': 'xpstep',
+        'xp_next': 'xpnext',
+        'level': 'level',
+        'lastclaimed': 'lastclaimed',
+        'fishing_cooldown': 'fishingcooldown',
+    }
+
+    # Counters are written as deltas, so changes made elsewhere in the meantime add up instead of being overwritten.
+    COUNTERS = ('coins', 'xp', 'xp_step', 'xp_next', 'level')
+
     def __init__(self):
+        # Names of the fields assigned to since the user was loaded or last written.
+        self.dirty: Set[str] = set()
+
         self.coins: int = 0
 
         self.xp: int = 0
@@ -12,6 +30,59 @@ class FUser:
 
         self.level: int = 1
 
-        self.lastclaimed: datetime = datetime.strptime('1970-01-01 02:00:00', '%Y-%m-%d %H:%M:%S')
+        self.lastclaimed: datetime = datetime.fromtimestamp(0)
 
         self.fishing_cooldown: int = 15
+
+        # Values as last read from or written to the database, used to turn changes into ledger deltas.
+        self.baseline: dict = self.snapshot()
+        self.dirty.clear()
+
+    def __setattr__(self, name, value):
+        if name in self.COLUMNS:
+            self.__dict__['dirty'].add(name)
+        object.__setattr__(self, name, value)
+
+    def snapshot(self) -> dict:
+        return {field: getattr(self, field) for field in self.COLUMNS}
+
+    def deltas(self) -> Dict[str, int]:
+        """
+        How much every dirty counter changed, by column. Counters that ended up where they started are left out.
+        """
+        return {
+            self.COLUMNS[field]: getattr(self, field) - self.baseline[field]
+            for field in self.COUNTERS
+            if field in self.dirty and getattr(self, field) != self.baseline[field]
+        }
+
+    def changes(self) -> Dict[str, object]:
+        """
+        The new value of every dirty field that is not a counter, by column.
+        """
+        return {
+            self.COLUMNS[field]: getattr(self, field)
+            for field in self.COLUMNS
+            if field not in self.COUNTERS and field in self.dirty and getattr(self, field) != self.baseline[field]
+        }
+
+    def mark_clean(self) -> None:
+        self.baseline = self.snapshot()
+        self.dirty.clear()
+
+    def rebase(self, fresh: 'FUser') -> None:
+        """
+        Moves this user onto the values in `fresh`, read after it, keeping the changes made to it that were not
+        written yet on top.
+        """
+        deltas = {field: getattr(self, field) - self.baseline[field] for field in self.COUNTERS if field in self.dirty}
+        changes = {field: getattr(self, field) for field in self.COLUMNS if field not in self.COUNTERS and field in self.dirty}
+
+        for field in self.COLUMNS:
+            object.__setattr__(self, field, getattr(fresh, field))
+        self.baseline = fresh.snapshot()
+
+        for field, delta in deltas.items():
+            setattr(self, field, getattr(self, field) + delta)
+        for field, value in changes.items():
+            setattr(self, field, value)
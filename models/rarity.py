@@ -1,10 +1,19 @@
 from enum import Enum
 
 class Rarity(Enum):
-  common = 1,
-  uncommon = 2,
-  rare = 3,
-  epic = 4,
-  legendary = 5,
+  common = 1
+  uncommon = 2
+  rare = 3
+  epic = 4
+  legendary = 5
 
   special = 6
+
+  @classmethod
+  def decode(cls, value) -> 'Rarity':
+    """
+    Reads a rarity from the database, which is an integer since schema v2 and its name before that.
+    """
+    if isinstance(value, str) and not value.isdigit():
+      return cls[value]
+    return cls(int(value))
@@ -7,9 +7,12 @@ import random
 
 import datetime
 
+from typing import Literal
+
 from fisher_bot import FisherBot
 from models.area import Area
 from models.fish import Fish
+from services.autofish import AutoFishSession
 from util.weighted_random import WeightedRandom
 
 
@@ -24,6 +27,17 @@ class Fishing(commands.Cog):
   async def fish(self, interaction: discord.Interaction, area: Area):
     guild_id, member_id = self.bot.get_guildmember_ids(interaction)
 
+    session = self.bot.autofish.active(guild_id, member_id)
+    if session is not None:
+      await interaction.response.send_message(
+        f'You are already fishing in the {session.area.name}! Use /autofish stop to cast by hand again.',
+        ephemeral=True,
+      )
+      return
+
+    # Hold on to this cast's catalog, a reload can swap in a new one while we wait on the database.
+    catalog = self.bot.fish_service.catalog
+
     self.bot.db.ensure_guild(guild_id)
     user = self.bot.db.ensure_user(member_id, guild_id)
 
@@ -50,9 +64,9 @@ class Fishing(commands.Cog):
       self.user_cooldowns.append((member_id, datetime.datetime.now()))
 
     caught_fish: list[Fish] = []
-    fish: WeightedRandom = getattr(self.bot.fish_service, area.name)
+    fish: WeightedRandom = catalog.sampler(area)
 
-    rod = self.bot.db.get_user_rod(member_id, guild_id)
+    rod = await self.bot.db.get_user_rod(member_id, guild_id)
 
     fish_count = random.randint(rod.min_catch, rod.max_catch)
     escaped = 0
@@ -61,16 +75,18 @@ class Fishing(commands.Cog):
         escaped += 1
         continue
 
-      caught_fish.append(fish.get())
-
-    caught_data = [(f.id, f.name, f.rarity) for f in caught_fish]
+      # Nothing bites when every fish in the area has been reweighted to 0.
+      caught = fish.get()
+      if caught is not None:
+        caught_fish.append(caught)
 
-    ordered_fish_count = Counter(caught_data)
+    ordered_fish_count = Counter(caught_fish)
 
     summary_parts = []
-    for (fish_id, fish_name, fish_rarity), count in ordered_fish_count.items():
-      summary_parts.append(f'{count}x {fish_name} ({fish_rarity.name.title()})')
-      self.bot.db.add_fish(guild_id, member_id, fish_id, count)
+    for caught, count in ordered_fish_count.items():
+      summary_parts.append(f'{count}x {caught.name} ({caught.rarity.name.title()})')
+      self.bot.db.add_fish(guild_id, member_id, caught.id, count)
+      self.bot.catches.record(guild_id, member_id, caught, count)
 
     summary = '\n'.join(summary_parts)
     if escaped != 0:
@@ -89,6 +105,76 @@ class Fishing(commands.Cog):
 
     await interaction.response.send_message(embed=summary_embed)
 
+  @app_commands.command(
+    name='autofish',
+    description='Fish on your own for a while and get a summary now and then.',
+  )
+  @app_commands.describe(
+    action='Start or stop fishing on your own.',
+    area='Where to fish when starting.',
+    minutes='How long to keep fishing for.',
+  )
+  @app_commands.guild_only()
+  async def autofish(
+    self,
+    interaction: discord.Interaction,
+    action: Literal['start', 'stop'],
+    area: Area | None = None,
+    minutes: app_commands.Range[int, 1, 360] = 60,
+  ):
+    guild_id, member_id = self.bot.get_guildmember_ids(interaction)
+
+    if action == 'stop':
+      if self.bot.autofish.stop(guild_id, member_id) is None:
+        await interaction.response.send_message(
+          'You are not fishing right now!', ephemeral=True
+        )
+        return
+
+      await interaction.response.send_message(
+        'You pack up your rod, a summary of your trip is on its way.', ephemeral=True
+      )
+      return
+
+    if area is None:
+      await interaction.response.send_message(
+        'Pick an area to fish in!', ephemeral=True
+      )
+      return
+
+    session = self.bot.autofish.active(guild_id, member_id)
+    if session is not None:
+      await interaction.response.send_message(
+        f'You are already fishing in the {session.area.name}!', ephemeral=True
+      )
+      return
+
+    self.bot.db.ensure_guild(guild_id)
+    user = self.bot.db.ensure_user(member_id, guild_id)
+    rod = await self.bot.db.get_user_rod(member_id, guild_id)
+
+    # Casts as often as the member could use /fish, with the rod they have now.
+    session = AutoFishSession(
+      guild_id,
+      member_id,
+      interaction.channel,  # type: ignore
+      interaction.user.mention,
+      area,
+      rod,
+      interval=user.fishing_cooldown,
+      duration=minutes * 60,
+    )
+    if not self.bot.autofish.start(session):
+      await interaction.response.send_message(
+        'You are already fishing!', ephemeral=True
+      )
+      return
+
+    await interaction.response.send_message(
+      f'You settle down by the {area.name} with your {rod.name} for {minutes} minute(s). '
+      f'You will hear about your catches every {self.bot.autofish.summary_every / 60:.0f} minutes.'
+    )
+
 
 async def setup(bot: commands.Bot):
   await bot.add_cog(Fishing(bot))  # type: ignore
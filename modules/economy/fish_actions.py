@@ -8,15 +8,21 @@ from discord import ui
 
 from fisher_bot import FisherBot
 from models.fish import Fish
-from models.fuser import FUser
 from models.rod import Rod
-from util.paginator_view import PaginatorView
+from util.paginator_view import PageButton, PaginatorView, check_owner
 
 
 class InventoryPaginator(PaginatorView):
-  def __init__(self, member_id: int, data, rod: Rod, per_page=6, timeout=60):
-    super().__init__(data, member_id, per_page=per_page, timeout=timeout, title='Inventory')
-    self.rod = rod
+  kind = 'inventory'
+  per_page = 6
+  title = 'Inventory'
+
+  async def load(self, interaction: discord.Interaction):
+    bot: FisherBot = interaction.client  # type: ignore
+    guild_id, _ = bot.get_guildmember_ids(interaction)
+
+    self.rod: Rod = await bot.db.get_user_rod(self.member_id, guild_id)
+    return await bot.db.get_all_user_fish(guild_id, self.member_id)
 
   async def format_page(self, entries):
     embed = discord.Embed(title='Inventory', colour=discord.Colour.blue())
@@ -28,7 +34,7 @@ class InventoryPaginator(PaginatorView):
     )
 
     desc = ''
-    if type(entries[0]) is int:
+    if not entries:
       desc = 'Nothing to see here... yet!'
     else:
       for i, fish_data in enumerate(entries):
@@ -45,198 +51,133 @@ class InventoryPaginator(PaginatorView):
     return embed
 
 
-class SellingView(ui.View):
+# Buttons that change how many fish are on the chopping block, in display order.
+SELL_STEPS = ('+1', '+5', '+10', '+50', '+100', '-1', '-5', '-10', '-50', '-100')
+
+
+class SellButton(
+  ui.DynamicItem[ui.Button],
+  template=r'sell:(?P<member_id>\d+):(?P<fish_id>\d+):(?P<amount>\d+):(?P<action>[+-]\d+|all|sell|cancel)',
+):
+  """
+  A button of the Fish MegaMart. Owner, fish and the amount on the chopping block live in the custom_id.
+  """
+
   def __init__(
     self,
-    fish_id: int,
     member_id: int,
-    guild_id: int,
-    bot: FisherBot,
-    fish_data: tuple[Fish, int],
-    user: FUser,
+    fish_id: int,
+    amount: int,
+    action: str,
+    style=discord.ButtonStyle.blurple,
+    disabled=False,
   ):
-    super().__init__(timeout=60)
-
-    self.fishid = int(fish_id)
-    self.fish_to_sell = 1
-
-    self.fish_data = fish_data
-
-    self.bot = bot
-    self.user = user
+    super().__init__(
+      ui.Button(
+        label=action,
+        style=style,
+        disabled=disabled,
+        custom_id=f'sell:{member_id}:{fish_id}:{amount}:{action}',
+      )
+    )
 
     self.member_id = member_id
-    self.guild_id = guild_id
-
-    self.update_buttons()
-
-  async def interaction_check(self, interaction: discord.Interaction) -> bool:
-    if interaction.user.id != self.member_id:
-        await interaction.response.send_message(
-            "This isn't your fishing shop! Use the command yourself to browse.",
-            ephemeral=True
-        )
-        return False
-    return True
-
-  def update_buttons(self):
-    self.children[0].disabled = self.fish_to_sell + 1 > self.fish_data[1]  # type: ignore
-    self.children[1].disabled = self.fish_to_sell + 5 > self.fish_data[1]  # type: ignore
-    self.children[2].disabled = self.fish_to_sell + 10 > self.fish_data[1]  # type: ignore
-    self.children[3].disabled = self.fish_to_sell + 50 > self.fish_data[1]  # type: ignore
-    self.children[4].disabled = self.fish_to_sell + 100 > self.fish_data[1]  # type: ignore
-
-    self.children[5].disabled = self.fish_to_sell - 1 < 1  # type: ignore
-    self.children[6].disabled = self.fish_to_sell - 5 < 1  # type: ignore
-    self.children[7].disabled = self.fish_to_sell - 10 < 1  # type: ignore
-    self.children[8].disabled = self.fish_to_sell - 50 < 1  # type: ignore
-    self.children[9].disabled = self.fish_to_sell - 100 < 1  # type: ignore
-
-  async def create_embed(self, interaction: discord.Interaction):
-    embed = discord.Embed(
-      title='Fish MegaMart!',
-      description=f'You have a total of {self.fish_data[1]} {self.fish_data[0].name}.\nCurrently on the chopping block: {self.fish_to_sell}',
-      colour=discord.Colour.gold(),
+    self.fish_id = fish_id
+    self.amount = amount
+    self.action = action
+
+  @classmethod
+  async def from_custom_id(
+    cls, interaction: discord.Interaction, item: ui.Button, match
+  ) -> 'SellButton':
+    return cls(
+      int(match['member_id']),
+      int(match['fish_id']),
+      int(match['amount']),
+      match['action'],
     )
 
-    await interaction.response.edit_message(embed=embed, view=self)
-
-  @discord.ui.button(label='+1', style=discord.ButtonStyle.blurple)
-  async def sell_one(self, interaction: discord.Interaction, button: ui.Button):
-    if not await self.interaction_check(interaction):
-      return
-
-    self.fish_to_sell += 1
-    self.update_buttons()
-
-    await self.create_embed(interaction)
-
-  @discord.ui.button(label='+5', style=discord.ButtonStyle.blurple)
-  async def sell_five(self, interaction: discord.Interaction, button: ui.Button):
-    if not await self.interaction_check(interaction):
-      return
-
-    self.fish_to_sell += 5
-    self.update_buttons()
-
-    await self.create_embed(interaction)
-
-  @discord.ui.button(label='+10', style=discord.ButtonStyle.blurple)
-  async def sell_ten(self, interaction: discord.Interaction, button: ui.Button):
-    if not await self.interaction_check(interaction):
-      return
-
-    self.fish_to_sell += 10
-    self.update_buttons()
-
-    await self.create_embed(interaction)
-
-  @discord.ui.button(label='+50', style=discord.ButtonStyle.blurple)
-  async def sell_fifty(self, interaction: discord.Interaction, button: ui.Button):
-    if not await self.interaction_check(interaction):
-      return
-
-    self.fish_to_sell += 50
-    self.update_buttons()
-
-    await self.create_embed(interaction)
-
-  @discord.ui.button(label='+100', style=discord.ButtonStyle.blurple)
-  async def sell_onehunge(self, interaction: discord.Interaction, button: ui.Button):
-    if not await self.interaction_check(interaction):
-      return
-
-    self.fish_to_sell += 100
-    self.update_buttons()
-
-    await self.create_embed(interaction)
-
-  @discord.ui.button(label='-1', style=discord.ButtonStyle.blurple)
-  async def remove_one(self, interaction: discord.Interaction, button: ui.Button):
-    if not await self.interaction_check(interaction):
-      return
-
-    self.fish_to_sell -= 1
-    self.update_buttons()
-
-    await self.create_embed(interaction)
-
-  @discord.ui.button(label='-5', style=discord.ButtonStyle.blurple)
-  async def remove_five(self, interaction: discord.Interaction, button: ui.Button):
-    if not await self.interaction_check(interaction):
-      return
-
-    self.fish_to_sell -= 5
-    self.update_buttons()
+  async def interaction_check(self, interaction: discord.Interaction) -> bool:
+    return await check_owner(interaction, self.member_id)
 
-    await self.create_embed(interaction)
+  async def callback(self, interaction: discord.Interaction):
+    bot: FisherBot = interaction.client  # type: ignore
+    guild_id, member_id = bot.get_guildmember_ids(interaction)
 
-  @discord.ui.button(label='-10', style=discord.ButtonStyle.blurple)
-  async def remove_ten(self, interaction: discord.Interaction, button: ui.Button):
-    if not await self.interaction_check(interaction):
+    if self.action == 'cancel':
+      embed = discord.Embed(
+        title='You leave the Fish MegaMart with nothing sold...',
+        colour=discord.Colour.red(),
+      )
+      await interaction.response.edit_message(embed=embed, view=None)
       return
 
-    self.fish_to_sell -= 10
-    self.update_buttons()
-
-    await self.create_embed(interaction)
+    if self.action == 'sell':
+      # Straight to the guarded take, a count read on the read pool could be stale by the time it is written.
+      fish = bot.fish_service.catalog.by_id.get(self.fish_id)
+      if fish is None:
+        embed = discord.Embed(
+          title='That fish is no longer sold here!',
+          colour=discord.Colour.red(),
+        )
+        await interaction.response.edit_message(embed=embed, view=None)
+        return
 
-  @discord.ui.button(label='-50', style=discord.ButtonStyle.blurple)
-  async def remove_fifty(self, interaction: discord.Interaction, button: ui.Button):
-    if not await self.interaction_check(interaction):
+      await self.finish_transaction(interaction, bot, guild_id, fish)
       return
 
-    self.fish_to_sell -= 50
-    self.update_buttons()
-
-    await self.create_embed(interaction)
-
-  @discord.ui.button(label='-100', style=discord.ButtonStyle.blurple)
-  async def remove_onehunge(self, interaction: discord.Interaction, button: ui.Button):
-    if not await self.interaction_check(interaction):
+    fish_data = await bot.db.get_user_fish(guild_id, member_id, self.fish_id)
+    if fish_data is None:
+      embed = discord.Embed(
+        title="You don't have any of those fish anymore!",
+        colour=discord.Colour.red(),
+      )
+      await interaction.response.edit_message(embed=embed, view=None)
       return
 
-    self.fish_to_sell -= 100
-    self.update_buttons()
+    fish, owned = fish_data
 
-    await self.create_embed(interaction)
+    amount = owned if self.action == 'all' else self.amount + int(self.action)
+    amount = min(max(amount, 1), owned)
 
-  @discord.ui.button(label='all', style=discord.ButtonStyle.secondary)  # type: ignore
-  async def add_all(self, interaction: discord.Interaction, button: discord.ui.Button):
-    if not await self.interaction_check(interaction):
-      return
+    view = SellingView(member_id, fish.id, amount, owned)
+    await interaction.response.edit_message(embed=view.create_embed(fish), view=view)
 
-    self.fish_to_sell = self.fish_data[1]
-    self.update_buttons()
-
-    await self.create_embed(interaction)
-
-  @discord.ui.button(label='sell', style=discord.ButtonStyle.green)
   async def finish_transaction(
-    self, interaction: discord.Interaction, button: discord.ui.Button
+    self,
+    interaction: discord.Interaction,
+    bot: FisherBot,
+    guild_id: int,
+    fish: Fish,
   ):
-    if not await self.interaction_check(interaction):
-      return
+    fish_to_sell = self.amount
 
-    count = self.fish_data[1] - self.fish_to_sell
+    # The message could be old or clicked twice, only pay for fish that were actually there to take.
+    if not bot.db.take_user_fish(guild_id, self.member_id, fish.id, fish_to_sell):
+      embed = discord.Embed(
+        title=f'You no longer have that many {fish.name}!',
+        colour=discord.Colour.red(),
+      )
+      await interaction.response.edit_message(embed=embed, view=None)
+      return
 
-    self.bot.db.update_user_fish(self.member_id, self.guild_id, self.fishid, count)
+    user = bot.db.ensure_user(self.member_id, guild_id)
 
-    coins_earned = self.fish_data[0].base_value * self.fish_to_sell
-    self.user.coins += coins_earned
+    coins_earned = fish.base_value * fish_to_sell
+    user.coins += coins_earned
 
-    rod = self.bot.db.get_user_rod(member_id=self.member_id, guild_id=self.guild_id)
+    rod = await bot.db.get_user_rod(member_id=self.member_id, guild_id=guild_id)
 
-    xp_earned = math.floor(self.fish_data[0].xp * self.fish_to_sell * rod.xp_multiplier)
-    total_levels, total_coins = self.bot.db.add_xp(
-      guild_id=self.guild_id, member_id=self.member_id, xp=xp_earned, user=self.user
+    xp_earned = math.floor(fish.xp * fish_to_sell * rod.xp_multiplier)
+    total_levels, total_coins = bot.db.add_xp(
+      guild_id=guild_id, member_id=self.member_id, xp=xp_earned, user=user
     )
 
-    self.bot.db.update_user(self.guild_id, self.member_id, self.user)
+    bot.db.update_user(guild_id, self.member_id, user)
 
     embed = discord.Embed(
       title='Fish MegaMart!',
-      description=f'You sold {self.fish_to_sell} {self.fish_data[0].name} for {coins_earned} coins and {xp_earned} XP!',
+      description=f'You sold {fish_to_sell} {fish.name} for {coins_earned} coins and {xp_earned} XP!',
       colour=discord.Colour.green(),
     )
 
@@ -246,30 +187,65 @@ class SellingView(ui.View):
         value=f'Coins Earned: {total_coins}\nLevels Earned: {total_levels}',
       )
 
-    self.stop()
     await interaction.response.edit_message(embed=embed, view=None)
 
-  @discord.ui.button(label='cancel', style=discord.ButtonStyle.red)
-  async def cancel_all(
-    self, interaction: discord.Interaction, button: discord.ui.Button
-  ):
-    if not await self.interaction_check(interaction):
-      return
 
-    embed = discord.Embed(
-      title='You leave the Fish MegaMart with nothing sold...',
-      colour=discord.Colour.red(),
+class SellingView(ui.View):
+  """
+  Built fresh for every render; all of its state is encoded in the buttons.
+  """
+
+  def __init__(self, member_id: int, fish_id: int, fish_to_sell: int, owned: int):
+    super().__init__(timeout=None)
+
+    self.fish_to_sell = fish_to_sell
+    self.owned = owned
+
+    for step in SELL_STEPS:
+      target = fish_to_sell + int(step)
+      self.add_item(
+        SellButton(
+          member_id,
+          fish_id,
+          fish_to_sell,
+          step,
+          disabled=target > owned or target < 1,
+        )
+      )
+
+    self.add_item(
+      SellButton(
+        member_id, fish_id, fish_to_sell, 'all', style=discord.ButtonStyle.secondary
+      )
+    )
+    self.add_item(
+      SellButton(
+        member_id, fish_id, fish_to_sell, 'sell', style=discord.ButtonStyle.green
+      )
+    )
+    self.add_item(
+      SellButton(
+        member_id, fish_id, fish_to_sell, 'cancel', style=discord.ButtonStyle.red
+      )
     )
 
-    self.stop()
-    await interaction.response.edit_message(embed=embed, view=None)
+  def create_embed(self, fish: Fish) -> discord.Embed:
+    return discord.Embed(
+      title='Fish MegaMart!',
+      description=f'You have a total of {self.owned} {fish.name}.\nCurrently on the chopping block: {self.fish_to_sell}',
+      colour=discord.Colour.gold(),
+    )
 
 
 class FishingActions(commands.Cog):
   def __init__(self, bot: FisherBot):
     self.bot = bot
 
-  @app_commands.command(name='inventory', description='Look at your fish and rod!')
+  @app_commands.command(
+    name='inventory',
+    description='Look at your fish and rod!',
+    extras={'essential': False},
+  )
   @app_commands.guild_only()
   async def inventory(self, interaction: discord.Interaction):
     guild_id, member_id = self.bot.get_guildmember_ids(interaction)
@@ -278,23 +254,16 @@ class FishingActions(commands.Cog):
 
     _ = self.bot.db.ensure_user(member_id, guild_id)
 
-    rod = self.bot.db.get_user_rod(member_id, guild_id)
-    fish = self.bot.db.get_all_user_fish(guild_id, member_id)
-    if fish == []:
-      fish = [-1]
-
-    paginator = InventoryPaginator(member_id=member_id, data=fish, rod=rod)
-    first_page_entries = paginator.get_current_page_data()
-    first_embed = await paginator.format_page(first_page_entries)
+    embed, paginator = await InventoryPaginator.render(interaction, member_id, 0)
 
-    await interaction.response.send_message(embed=first_embed, view=paginator)
+    await interaction.response.send_message(embed=embed, view=paginator)
 
   async def fish_autocomplete(
     self, interaction: discord.Interaction, current: str
   ) -> list[app_commands.Choice[str]]:
     (guild_id, member_id) = self.bot.get_guildmember_ids(interaction)
 
-    inventory = self.bot.db.get_all_user_fish(guild_id, member_id)
+    inventory = await self.bot.db.get_all_user_fish(guild_id, member_id)
 
     choices = []
     for fish_obj, count in inventory:
@@ -314,27 +283,24 @@ class FishingActions(commands.Cog):
     guild_id, member_id = self.bot.get_guildmember_ids(interaction)
 
     self.bot.db.ensure_guild(guild_id)
-    user = self.bot.db.ensure_user(member_id, guild_id)
+    self.bot.db.ensure_user(member_id, guild_id)
 
-    fish_data = self.bot.db.get_user_fish(guild_id, member_id, int(fish))
-
-    embed = discord.Embed(
-      title='Fish MegaMart!',
-      description=f'You have a total of {fish_data[1]} {fish_data[0].name}.\nCurrently on the chopping block: 1',
-      colour=discord.Colour.gold(),
-    )
+    fish_data = await self.bot.db.get_user_fish(guild_id, member_id, int(fish))
+    if fish_data is None:
+      await interaction.response.send_message(
+        "You don't have any of those fish!", ephemeral=True
+      )
+      return
 
     view = SellingView(
-      fish_id=int(fish),
-      member_id=member_id,
-      guild_id=guild_id,
-      bot=self.bot,
-      fish_data=fish_data,
-      user=user,
+      member_id=member_id, fish_id=int(fish), fish_to_sell=1, owned=fish_data[1]
     )
 
-    await interaction.response.send_message(embed=embed, view=view)
+    await interaction.response.send_message(
+      embed=view.create_embed(fish_data[0]), view=view
+    )
 
 
 async def setup(bot: commands.Bot):
+  bot.add_dynamic_items(PageButton, SellButton)
   await bot.add_cog(FishingActions(bot))  # type: ignore
@@ -0,0 +1,162 @@
+import time
+
+from datetime import datetime, timezone
+from typing import Literal, Optional
+
+from discord.ext import commands
+from discord import app_commands
+import discord
+
+from fisher_bot import FisherBot
+from models.area import Area
+from models.fish import Fish
+from models.rarity import Rarity
+from services.catch_log import DAY, HOUR
+
+# Period -> (seconds back, bucket the activity chart is drawn in).
+PERIODS = {'day': (DAY, HOUR), 'week': (7 * DAY, DAY), 'month': (30 * DAY, DAY)}
+CHART_WIDTH = 20
+
+
+class Fishdex(commands.Cog):
+  def __init__(self, bot: FisherBot):
+    self.bot = bot
+
+  async def name_autocomplete(
+    self, interaction: discord.Interaction, current: str
+  ) -> list[app_commands.Choice[str]]:
+    matches = self.bot.fish_service.catalog.index.search(current, limit=25)
+
+    return [
+      app_commands.Choice(
+        name=f'{fish.name} ({fish.area.name.title()}, {fish.rarity.name.title()})',
+        value=fish.name,
+      )
+      for fish in matches
+    ]
+
+  @app_commands.command(
+    name='fishdex',
+    description='Look up fish in the encyclopedia!',
+    extras={'essential': False},
+  )
+  @app_commands.describe(
+    name='The fish to look for, close enough is fine.',
+    area='Only show fish from this area.',
+    rarity='Only show fish of this rarity.',
+  )
+  @app_commands.autocomplete(name=name_autocomplete)
+  async def fishdex(
+    self,
+    interaction: discord.Interaction,
+    name: Optional[str] = None,
+    area: Optional[Area] = None,
+    rarity: Optional[Rarity] = None,
+  ):
+    def matches(fish: Fish) -> bool:
+      return (area is None or fish.area == area) and (
+        rarity is None or fish.rarity == rarity
+      )
+
+    results = self.bot.fish_service.catalog.index.search(
+      name or '', limit=10, predicate=matches
+    )
+
+    embed = discord.Embed(title='Fishdex', colour=discord.Colour.teal())
+
+    if not results:
+      embed.description = 'No fish like that around here...'
+
+    for fish in results:
+      embed.add_field(
+        name=fish.name,
+        value=f'Area: {fish.area.name.title()}\nRarity: **{fish.rarity.name.title()}**\nOdds: 1/{fish.odds}\nValue: {fish.base_value} XP: {fish.xp}',
+        inline=True,
+      )
+
+    embed.set_footer(
+      text=f'Requested by {interaction.user.name}',
+      icon_url=interaction.user.display_avatar.url,
+    )
+
+    await interaction.response.send_message(embed=embed)
+
+  @app_commands.command(
+    name='catches',
+    description='See what this server has been catching.',
+    extras={'essential': False},
+  )
+  @app_commands.describe(
+    period='How far back to look.',
+    rarity='Only count fish of this rarity.',
+  )
+  @app_commands.guild_only()
+  async def catches(
+    self,
+    interaction: discord.Interaction,
+    period: Literal['day', 'week', 'month'] = 'week',
+    rarity: Optional[Rarity] = None,
+  ):
+    guild_id, _ = self.bot.get_guildmember_ids(interaction)
+
+    span, width = PERIODS[period]
+    since = int(time.time()) - span
+
+    totals = await self.bot.catches.totals(
+      guild_id, since, rarity.value if rarity is not None else None
+    )
+    activity = await self.bot.catches.activity(guild_id, since, daily=width == DAY)
+
+    catalog = self.bot.fish_service.catalog
+    title = f'{rarity.name.title()} catches' if rarity is not None else 'Catches'
+    embed = discord.Embed(
+      title=f'{title} in the last {period}', colour=discord.Colour.teal()
+    )
+
+    if not totals:
+      embed.description = 'Nothing caught yet... go fishing!'
+    else:
+      by_rarity: dict[Rarity, int] = {}
+      for _, fish_rarity, amount in totals:
+        key = Rarity.decode(fish_rarity)
+        by_rarity[key] = by_rarity.get(key, 0) + amount
+
+      embed.description = f'{sum(by_rarity.values())} fish caught.'
+      embed.add_field(
+        name='By rarity',
+        value='\n'.join(
+          f'{key.name.title()}: {amount}'
+          for key, amount in sorted(by_rarity.items(), key=lambda item: item[0].value)
+        ),
+        inline=True,
+      )
+
+      top = []
+      for fish_id, _, amount in totals[:5]:
+        fish = catalog.by_id.get(fish_id)
+        top.append(f'{amount}x {fish.name if fish is not None else f"#{fish_id}"}')
+      embed.add_field(name='Most caught', value='\n'.join(top), inline=True)
+
+    # Activity is over every rarity, the chart shows how busy the server was.
+    if activity:
+      peak = max(amount for _, amount in activity)
+      label = '%H:00' if width == HOUR else '%m-%d'
+      lines = [
+        f'{datetime.fromtimestamp(start, timezone.utc).strftime(label)} '
+        f'{"#" * max(round(amount / peak * CHART_WIDTH), 1)} {amount}'
+        for start, amount in activity[-24:]
+      ]
+      embed.add_field(
+        name='Activity (UTC)', value='```\n' + '\n'.join(lines) + '\n```', inline=False
+      )
+
+    embed.set_footer(
+      text=f'Requested by {interaction.user.name}',
+      icon_url=interaction.user.display_avatar.url,
+    )
+
+    await interaction.response.send_message(embed=embed)
+
+
+async def setup(bot: commands.Bot):
+  await bot.add_cog(Fishdex(bot))  # type: ignore
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional, Tuple
 from discord.ext import commands
 from discord import app_commands
 
@@ -10,66 +10,198 @@ import discord
 
 from models.fuser import FUser
 from models.rod import Rod
+from util.bitset import has_bit
+from util.paginator_view import check_owner
+
+
+class RodButton(
+  ui.DynamicItem[ui.Button],
+  template=r'rod:(?P<member_id>\d+):(?P<page>\d+)(?::(?P<rod_id>\d+))?:(?P<action>prev|next|equip|buy)',
+):
+  """
+  A button of the rod manager. Owner, current page and the rod on it live in the custom_id; equip and buy
+  go by the rod, the page only says where to go next.
+  """
+
+  def __init__(
+    self,
+    member_id: int,
+    page: int,
+    rod_id: Optional[int],
+    action: str,
+    label: str = '',
+    style=discord.ButtonStyle.blurple,
+    disabled=False,
+  ):
+    rod = f':{rod_id}' if rod_id is not None else ''
+    super().__init__(
+      ui.Button(
+        label=label or action,
+        style=style,
+        disabled=disabled,
+        custom_id=f'rod:{member_id}:{page}{rod}:{action}',
+      )
+    )
+
+    self.member_id = member_id
+    self.page = page
+    self.rod_id = rod_id
+    self.action = action
+
+  @classmethod
+  async def from_custom_id(
+    cls, interaction: discord.Interaction, item: ui.Button, match
+  ) -> 'RodButton':
+    # Buttons sent before the rod was part of the custom_id have none, they can only turn pages.
+    rod_id = int(match['rod_id']) if match['rod_id'] is not None else None
+    return cls(int(match['member_id']), int(match['page']), rod_id, match['action'])
+
+  async def interaction_check(self, interaction: discord.Interaction) -> bool:
+    return await check_owner(interaction, self.member_id)
+
+  async def callback(self, interaction: discord.Interaction):
+    bot: FisherBot = interaction.client  # type: ignore
+    guild_id, _ = bot.get_guildmember_ids(interaction)
+
+    page = self.page
+    if self.action == 'prev':
+      page -= 1
+    elif self.action == 'next':
+      page += 1
+    elif self.action in ('equip', 'buy'):
+      active_rod = (
+        bot.fish_service.catalog.rod(self.rod_id) if self.rod_id is not None else None
+      )
+      if active_rod is None:
+        embed, view = await RodManagerView.render(interaction, self.member_id, page)
+        await interaction.response.edit_message(embed=embed, view=view)
+        return
+
+      # The rod may have moved to another page since the message was sent, stay with it.
+      page = bot.fish_service.rods.index(active_rod)
+
+      user = bot.db.ensure_user(self.member_id, guild_id)
+      owned = await bot.db.get_rod_mask(self.member_id, guild_id)
+
+      # Check again, the buttons on an old message can be out of date.
+      if self.action == 'equip' and has_bit(owned, active_rod.id):
+        bot.db.equip_rod(self.member_id, guild_id, active_rod.id)
+      elif (
+        self.action == 'buy'
+        and not has_bit(owned, active_rod.id)
+        and user.level >= active_rod.level_required
+        # Checked again as it is spent, something else may have spent the coins since they were read.
+        and bot.db.spend_coins(guild_id, self.member_id, active_rod.value) is not None
+      ):
+        bot.db.add_rod(self.member_id, guild_id, active_rod.id)
+
+    embed, view = await RodManagerView.render(interaction, self.member_id, page)
+    await interaction.response.edit_message(embed=embed, view=view)
 
 
 class RodManagerView(ui.View):
+  """
+  Built fresh for every render from the catalog and the database; all of its state is encoded in the buttons.
+  """
+
   def __init__(
     self,
-    bot: FisherBot,
     user: FUser,
     member_id: int,
     rod: Rod,
     data: List[Rod],
-    owned_ids: List[int],
+    owned: int,
+    page: int = 0,
   ):
-    super().__init__(timeout=60)
-
-    self.bot = bot
+    super().__init__(timeout=None)
 
     self.user = user
     self.rod = rod
 
     self.member_id = member_id
 
-    self.current_page = 0
+    self.current_page = page
     self.total_pages = len(data)
 
-    self.owned_ids = owned_ids
+    self.owned = owned
     self.data = data
 
     self.update_buttons()
 
-  async def interaction_check(self, interaction: discord.Interaction) -> bool:
-    if interaction.user.id != self.member_id:
-      await interaction.response.send_message(
-        "This isn't your fishing shop! Use the command yourself to browse.",
-        ephemeral=True,
-      )
-      return False
-    return True
+  @classmethod
+  async def render(
+    cls, interaction: discord.Interaction, member_id: int, page: int
+  ) -> Tuple[discord.Embed, 'RodManagerView']:
+    bot: FisherBot = interaction.client  # type: ignore
+    guild_id, _ = bot.get_guildmember_ids(interaction)
 
-  def update_buttons(self):
-    self.children[0].disabled = self.current_page == 0  # type: ignore
-    self.children[1].disabled = self.current_page == self.total_pages - 1  # type: ignore
+    user = bot.db.ensure_user(member_id=member_id, guild_id=guild_id)
+    rod = await bot.db.get_user_rod(member_id=member_id, guild_id=guild_id)
+
+    owned = await bot.db.get_rod_mask(member_id=member_id, guild_id=guild_id)
+
+    rods = bot.fish_service.rods
+    page = min(max(page, 0), len(rods) - 1)
 
+    view = cls(user, member_id, rod, rods, owned, page)
+    return (await view.format_page(), view)
+
+  def update_buttons(self):
     current_rod = self.data[self.current_page]
-    owned = current_rod.id in self.owned_ids
+    owned = has_bit(self.owned, current_rod.id)
     is_equipped = self.rod.id == current_rod.id
     too_low_level = self.user.level < current_rod.level_required
     too_low_money = self.user.coins < current_rod.value
 
-    self.children[2].disabled = (not owned) or is_equipped  # type: ignore
-    self.children[3].disabled = (owned or too_low_level) or too_low_money  # type: ignore
-
-  async def update_message(self, interaction: discord.Interaction):
-    embed = await self.format_page()
-    await interaction.response.edit_message(embed=embed, view=self)
+    self.clear_items()
+    self.add_item(
+      RodButton(
+        self.member_id,
+        self.current_page,
+        current_rod.id,
+        'prev',
+        label='Previous',
+        disabled=self.current_page == 0,
+      )
+    )
+    self.add_item(
+      RodButton(
+        self.member_id,
+        self.current_page,
+        current_rod.id,
+        'next',
+        label='Next',
+        disabled=self.current_page == self.total_pages - 1,
+      )
+    )
+    self.add_item(
+      RodButton(
+        self.member_id,
+        self.current_page,
+        current_rod.id,
+        'equip',
+        label='Equip',
+        style=discord.ButtonStyle.red,
+        disabled=(not owned) or is_equipped,
+      )
+    )
+    self.add_item(
+      RodButton(
+        self.member_id,
+        self.current_page,
+        current_rod.id,
+        'buy',
+        label='Buy',
+        style=discord.ButtonStyle.green,
+        disabled=(owned or too_low_level) or too_low_money,
+      )
+    )
 
   async def format_page(self) -> discord.Embed:
     embed = discord.Embed(title='Rod Management Office!', colour=discord.Colour.green())
 
     active_rod = self.data[self.current_page]
-    owned = active_rod.id in self.owned_ids
+    owned = has_bit(self.owned, active_rod.id)
 
     embed.add_field(
       name=f'{active_rod.name} ("{active_rod.description}") {("[owned]" if owned else "")}',
@@ -80,69 +212,6 @@ class RodManagerView(ui.View):
 
     return embed
 
-  @ui.button(label='Previous', style=discord.ButtonStyle.blurple)
-  async def prev_button(
-    self, interaction: discord.Interaction, button: discord.ui.Button
-  ):
-    if not await self.interaction_check(interaction):
-      return
-
-    self.current_page -= 1
-    self.update_buttons()
-
-    await self.update_message(interaction)
-
-  @ui.button(label='Next', style=discord.ButtonStyle.blurple)
-  async def next_button(
-    self, interaction: discord.Interaction, button: discord.ui.Button
-  ):
-    if not await self.interaction_check(interaction):
-      return
-
-    self.current_page += 1
-    self.update_buttons()
-
-    await self.update_message(interaction)
-
-  @ui.button(label='Equip', style=discord.ButtonStyle.red)
-  async def equip_button(
-    self, interaction: discord.Interaction, button: discord.ui.Button
-  ):
-    if not await self.interaction_check(interaction):
-      return
-
-    if interaction.guild_id is None:
-      return
-
-    self.bot.db.equip_rod(
-      self.member_id, interaction.guild_id, self.data[self.current_page].id
-    )
-
-    self.rod = self.bot.db.get_user_rod(self.member_id, interaction.guild_id)
-
-    self.update_buttons()
-    await self.update_message(interaction)
-
-  @ui.button(label='Buy', style=discord.ButtonStyle.green)
-  async def buy_button(
-    self, interaction: discord.Interaction, button: discord.ui.Button
-  ):
-    if not await self.interaction_check(interaction):
-      return
-
-    if interaction.guild_id is None:
-      return
-
-    active_rod = self.data[self.current_page]
-
-    self.user.coins -= active_rod.value
-    self.bot.db.update_user(interaction.guild_id, self.member_id, self.user)
-
-    self.bot.db.add_rod(self.member_id, interaction.guild_id, active_rod.id)
-
-    self.update_buttons()
-    await self.update_message(interaction)
-
 
 class RodActions(commands.Cog):
   def __init__(self, bot: FisherBot):
@@ -157,19 +226,11 @@ class RodActions(commands.Cog):
 
     self.bot.db.ensure_guild(guild_id)
 
-    user = self.bot.db.ensure_user(member_id=member_id, guild_id=guild_id)
-    rod = self.bot.db.get_user_rod(member_id=member_id, guild_id=guild_id)
-
-    all_rods = self.bot.db.get_user_rods(member_id=member_id, guild_id=guild_id)
-    ids = [rod.id for rod in all_rods]
-
-    manager = RodManagerView(
-      self.bot, user, member_id, rod, self.bot.fish_service.rods, ids
-    )
-    embed = await manager.format_page()
+    embed, manager = await RodManagerView.render(interaction, member_id, 0)
 
     await interaction.response.send_message(embed=embed, view=manager)
 
 
 async def setup(bot: commands.Bot):
+  bot.add_dynamic_items(RodButton)
   await bot.add_cog(RodActions(bot))  # type: ignore
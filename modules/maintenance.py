@@ -1,21 +1,367 @@
 from discord.ext import commands
 from discord import app_commands
 
+import asyncio
 import discord
+import io
+
+from typing import Dict, List, Literal, Optional
 
 from fisher_bot import FisherBot
+from models.area import Area
+from models.fish import Fish
+from models.fuser import FUser
+from models.rarity import Rarity
+from models.rod import Rod
+from services.db_init import sync_catalog
+from services.fish_service import FishCatalog
+from services.maintenance import JOBS
+from util.checks import owner_only
+from util.memory import (
+  allocation_diff,
+  count_objects,
+  is_tracing,
+  start_tracing,
+  stop_tracing,
+)
+from util.profiler import is_profiling, profile_loop
 
 
 class Maintenance(commands.Cog):
   def __init__(self, bot: FisherBot):
     self.bot = bot
 
+    self.reload_lock = asyncio.Lock()
+
+    # Diagnostics are needed most when the bot is struggling, admission control never turns them away.
+    for command in self.get_app_commands():
+      command.extras['exempt'] = True
+
   @app_commands.command(name='ping', description="Check the bot's latency.")
   @app_commands.guild_only()
   async def ping(self, interaction: discord.Interaction):
     latency = round(self.bot.latency * 1000)
     await interaction.response.send_message(f'Pong! Latency: {latency}ms')
 
+  @app_commands.command(name='profile', description='Profile the running bot.')
+  @app_commands.describe(
+    seconds='How long to profile for.',
+    collapsed='Also sample collapsed stacks for flame graphs.',
+  )
+  @app_commands.guild_only()
+  @owner_only()
+  async def profile(
+    self,
+    interaction: discord.Interaction,
+    seconds: app_commands.Range[int, 1, 300] = 10,
+    collapsed: bool = False,
+  ):
+    if is_profiling():
+      await interaction.response.send_message(
+        'A profile is already running!', ephemeral=True
+      )
+      return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    report, stacks = await profile_loop(seconds, collapsed=collapsed)
+
+    files = [discord.File(io.BytesIO(report.encode()), filename='profile.txt')]
+    if stacks is not None:
+      files.append(
+        discord.File(io.BytesIO(stacks.encode()), filename='profile.collapsed')
+      )
+
+    await interaction.followup.send(
+      f'Profiled the bot for {seconds}s.', files=files, ephemeral=True
+    )
+
+  @app_commands.command(name='metrics', description='Show internal bot metrics.')
+  @app_commands.guild_only()
+  @owner_only()
+  async def metrics(self, interaction: discord.Interaction):
+    snapshot = self.bot.metrics.snapshot()
+
+    embed = discord.Embed(title='Metrics', colour=discord.Colour.dark_grey())
+    embed.description = (
+      '\n'.join(f'`{name}`: {value:g}' for name, value in sorted(snapshot.items()))
+      or 'Nothing recorded yet.'
+    )
+
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+  @app_commands.command(
+    name='reloadcatalog', description='Reload fish and rods from the data files.'
+  )
+  @app_commands.guild_only()
+  @owner_only()
+  async def reload_catalog(self, interaction: discord.Interaction):
+    if self.reload_lock.locked():
+      await interaction.response.send_message(
+        'A reload is already running!', ephemeral=True
+      )
+      return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    async with self.reload_lock:
+      catalog = await asyncio.to_thread(self._load_catalog)
+
+      if catalog is None:
+        await interaction.followup.send(
+          'Could not reload the catalog, check the logs.', ephemeral=True
+        )
+        return
+
+      old = self.bot.fish_service.swap(catalog)
+
+    await interaction.followup.send(
+      f'Reloaded! Fish: {len(old.fish)} -> {len(catalog.fish)}, Rods: {len(old.rods)} -> {len(catalog.rods)}',
+      ephemeral=True,
+    )
+
+  @app_commands.command(
+    name='reweight', description='Make fish of a rarity more or less likely to bite.'
+  )
+  @app_commands.describe(
+    rarity='Which fish to change.',
+    factor='How many times their normal chance, 1 puts them back to normal and 0 turns them off.',
+    area='Only change fish in this area.',
+  )
+  @app_commands.guild_only()
+  @owner_only()
+  async def reweight(
+    self,
+    interaction: discord.Interaction,
+    rarity: Rarity,
+    factor: app_commands.Range[float, 0, 100],
+    area: Optional[Area] = None,
+  ):
+    fish = [
+      f
+      for f in self.bot.fish_service.fish
+      if f.rarity == rarity and (area is None or f.area == area)
+    ]
+    self.bot.fish_service.reweight({f.id: factor for f in fish})
+
+    where = f'in the {area.name}' if area is not None else 'everywhere'
+    await interaction.response.send_message(
+      f'{len(fish)} {rarity.name} fish {where} now bite at {factor:g}x their normal chance.',
+      ephemeral=True,
+    )
+
+  @app_commands.command(name='backup', description='Back up the database right now.')
+  @app_commands.guild_only()
+  @owner_only()
+  async def backup(self, interaction: discord.Interaction):
+    if self.bot.backups is None:
+      await interaction.response.send_message(
+        'Backups are off, set FISHER_BACKUP_DIR to turn them on.', ephemeral=True
+      )
+      return
+
+    if self.bot.backups.lock.locked():
+      await interaction.response.send_message(
+        'A backup is already running!', ephemeral=True
+      )
+      return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    try:
+      name = await asyncio.to_thread(self.bot.backups.run)
+    except Exception as e:
+      await interaction.followup.send(f'Backup failed: {e}', ephemeral=True)
+      return
+
+    await interaction.followup.send(f'Backed up to `{name}`.', ephemeral=True)
+
+  async def backup_autocomplete(
+    self, interaction: discord.Interaction, current: str
+  ) -> List[app_commands.Choice[str]]:
+    if self.bot.backups is None:
+      return []
+
+    names = await asyncio.to_thread(self.bot.backups.snapshots)
+    return [
+      app_commands.Choice(name=name, value=name)
+      for name in reversed(names)
+      if current in name
+    ][:25]
+
+  @app_commands.command(
+    name='verifybackup', description='Check that a backup can be restored.'
+  )
+  @app_commands.describe(name='Which backup to check, the newest one by default.')
+  @app_commands.guild_only()
+  @owner_only()
+  @app_commands.autocomplete(name=backup_autocomplete)
+  async def verify_backup(
+    self, interaction: discord.Interaction, name: Optional[str] = None
+  ):
+    if self.bot.backups is None:
+      await interaction.response.send_message(
+        'Backups are off, set FISHER_BACKUP_DIR to turn them on.', ephemeral=True
+      )
+      return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    problems = await asyncio.to_thread(self.bot.backups.verify, name)
+
+    if problems:
+      await interaction.followup.send('\n'.join(problems)[:2000], ephemeral=True)
+    else:
+      await interaction.followup.send(
+        f'`{name or self.bot.backups.snapshots()[-1]}` is good to restore.',
+        ephemeral=True,
+      )
+
+  @app_commands.command(
+    name='dbmaintenance', description='Show or run database maintenance.'
+  )
+  @app_commands.describe(
+    action='Show the state of the databases, or run maintenance now.',
+    job='Which job to run, all of them by default.',
+  )
+  @app_commands.guild_only()
+  @owner_only()
+  async def db_maintenance(
+    self,
+    interaction: discord.Interaction,
+    action: Literal['status', 'run'] = 'status',
+    job: Literal['all', 'analyze', 'vacuum', 'check', 'checkpoint'] = 'all',
+  ):
+    if action == 'run' and self.bot.maintenance.lock.locked():
+      await interaction.response.send_message(
+        'Maintenance is already running!', ephemeral=True
+      )
+      return
+
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    if action == 'run':
+      lines = await asyncio.to_thread(
+        self.bot.maintenance.run, JOBS if job == 'all' else (job,)
+      )
+    else:
+      lines = await asyncio.to_thread(self.bot.maintenance.status)
+
+    await interaction.followup.send(
+      ('```\n' + '\n'.join(lines))[:1996] + '\n```', ephemeral=True
+    )
+
+  @app_commands.command(name='memory', description='Look at what is using memory.')
+  @app_commands.describe(
+    action='Start or stop tracing allocations, or just report.',
+    frames='Frames of traceback to keep per allocation when starting.',
+  )
+  @app_commands.guild_only()
+  @owner_only()
+  async def memory(
+    self,
+    interaction: discord.Interaction,
+    action: Literal['report', 'start', 'stop'] = 'report',
+    frames: app_commands.Range[int, 1, 25] = 1,
+  ):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+
+    if action == 'start':
+      if is_tracing():
+        await interaction.followup.send(
+          'Allocations are already being traced!', ephemeral=True
+        )
+        return
+      start_tracing(frames)
+      message = (
+        'Started tracing allocations, the next report shows what grew since now.'
+      )
+    elif action == 'stop':
+      if not is_tracing():
+        await interaction.followup.send(
+          'Allocations are not being traced!', ephemeral=True
+        )
+        return
+      stop_tracing()
+      message = 'Stopped tracing allocations.'
+    else:
+      message = 'Memory report attached.'
+
+    report = await asyncio.to_thread(self._memory_report, self._memory_sizes())
+    await interaction.followup.send(
+      message,
+      file=discord.File(io.BytesIO(report.encode()), filename='memory.txt'),
+      ephemeral=True,
+    )
+
+  def _memory_sizes(self) -> Dict[str, int]:
+    # Read on the event loop, these change while the loop runs.
+    store = self.bot._connection._view_store
+    sizes = {
+      'bot.message_cooldowns': len(self.bot.message_cooldowns),
+      'views.items': sum(len(items) for items in store._views.values()),
+      'views.message_views': len(store._synced_message_views),
+      'cache.guilds': len(self.bot.guilds),
+      'cache.users': len(self.bot.users),
+      'cache.messages': len(self.bot.cached_messages),
+      'notifier.channels': len(self.bot.notifier.channels),
+      'notifier.pending': sum(
+        len(entries) for entries in self.bot.notifier.pending.values()
+      ),
+      'notifier.reports': sum(
+        len(lines) for lines in self.bot.notifier.reports.values()
+      ),
+      'autofish.sessions': len(self.bot.autofish.sessions),
+      'catches.pending': sum(len(rows) for rows in self.bot.catches.pending.values()),
+    }
+
+    fishing = self.bot.get_cog('Fishing')
+    if fishing is not None:
+      sizes['Fishing.user_cooldowns'] = len(fishing.user_cooldowns)  # type: ignore
+
+    return sizes
+
+  def _memory_report(self, sizes: Dict[str, int]) -> str:
+    # Runs on a worker thread, walking every object and diffing snapshots takes a while.
+    counts = count_objects(
+      {
+        'FUser': FUser,
+        'Fish': Fish,
+        'Rod': Rod,
+        'View': discord.ui.View,
+        'DynamicItem': discord.ui.DynamicItem,
+        'Embed': discord.Embed,
+      }
+    )
+
+    lines = ['Live objects (count, shallow KiB):']
+    lines.extend(
+      f'  {name:<14}{count:>10}{size / 1024:>12.1f}'
+      for name, (count, size) in counts.items()
+    )
+    lines.append('')
+    lines.append('Sizes:')
+    lines.extend(f'  {name:<28}{size:>10}' for name, size in sizes.items())
+
+    if is_tracing():
+      lines.append('')
+      lines.append(allocation_diff())
+    else:
+      lines.append('')
+      lines.append(
+        'Allocations are not being traced, use action:start to see where memory goes.'
+      )
+
+    return '\n'.join(lines)
+
+  def _load_catalog(self) -> FishCatalog | None:
+    # Runs on a worker thread with its own connection so the event loop never waits on it.
+    conn = self.bot.router.open_catalog()
+    try:
+      return sync_catalog(conn)
+    finally:
+      conn.close()
+
 
 async def setup(bot: commands.Bot):
   await bot.add_cog(Maintenance(bot))  # type: ignore
@@ -12,7 +12,9 @@ class UserActions(commands.Cog):
   def __init__(self, bot: FisherBot):
     self.bot = bot
 
-  @app_commands.command(name='stats', description='Show off yout stats!')
+  @app_commands.command(
+    name='stats', description='Show off yout stats!', extras={'essential': False}
+  )
   @app_commands.guild_only()
   async def stats(self, interaction: discord.Interaction):
     guild_id, member_id = self.bot.get_guildmember_ids(interaction)
@@ -95,7 +97,7 @@ class UserActions(commands.Cog):
 
       return
 
-    user.coins = self.bot.db.DAILY_BONUS_COINS
+    user.coins += self.bot.db.DAILY_BONUS_COINS
 
     total_levels, total_coins = self.bot.db.add_xp(
       guild_id=guild_id, member_id=member_id, xp=self.bot.db.DAILY_XP_BONUS, user=user
@@ -0,0 +1,173 @@
+import logging
+import time
+
+from typing import Dict, Tuple
+
+import discord
+
+from services.metrics import Metrics
+from services.read_pool import ReadPool
+
+LOGGER = logging.getLogger('FisherCat.Admission')
+
+# Discord drops an interaction that is not answered within this many seconds.
+RESPONSE_DEADLINE = 3.0
+
+# Seconds for the command latency average to fade to half while no admitted command finishes.
+LATENCY_HALF_LIFE = 5.0
+
+# Without a receipt time the wait is read from the host clock against Discord's; anything outside of
+# 0 to this many seconds is the clocks disagreeing rather than a real wait, and is counted as no wait.
+MAX_CLOCK_WAIT = 15.0
+
+
+class AdmissionController:
+  """
+  Decides whether there is room for more database work before a command or a message starts on it.
+
+  Pressure is read from three signals: how many commands are running at once, how many reads are queued
+  on the read pool, and how long commands have been taking lately. Under pressure, work that is not
+  essential (stats renders, message XP) is shed, as is work that already waited so long it would likely
+  miss Discord's deadline. When overloaded everything is shed, and commands get a quick "busy" reply
+  instead of timing out. Every decision is counted in the metrics under `admission.`.
+  """
+
+  def __init__(
+    self,
+    metrics: Metrics,
+    read_pool: ReadPool,
+    max_in_flight: int = 32,
+    max_queued_reads: int = 16,
+    max_latency: float = 1.0,
+    overload: float = 2.0,
+    max_wait: float = 2.0,
+    smoothing: float = 0.2,
+  ):
+    self.metrics = metrics
+    self.read_pool = read_pool
+
+    self.max_in_flight = max_in_flight
+    self.max_queued_reads = max_queued_reads
+    self.max_latency = max_latency
+    # Past the limits times this, even essential work is turned away.
+    self.overload = overload
+    # Non-essential work that already waited this long would likely miss the deadline, it is answered right away.
+    self.max_wait = max_wait
+    self.smoothing = smoothing
+
+    # Interaction id -> when it was admitted.
+    self.running: Dict[int, float] = {}
+    # Moving average of how long admitted commands took, and when it was last updated.
+    self.latency: float = 0.0
+    self.latency_updated: float = 0.0
+
+  def load(self) -> Tuple[float, float]:
+    """
+    How close to its limits the bot is, 1 being right at the limit of the busiest signal. Returns the load of
+    the database (running commands, queued reads) and the load with the command latency taken into account.
+    """
+    now = time.monotonic()
+
+    # A command whose completion was never reported would otherwise count as running forever.
+    for interaction_id, started in list(self.running.items()):
+      if now - started > 60:
+        del self.running[interaction_id]
+
+    # The average only moves when an admitted command finishes, which stops happening once everything is
+    # shed. Without that it fades, halving every LATENCY_HALF_LIFE seconds, so shedding cannot keep itself going.
+    idle = now - self.latency_updated
+    latency = self.latency * 0.5 ** (idle / LATENCY_HALF_LIFE)
+
+    database = max(
+      len(self.running) / self.max_in_flight,
+      self.read_pool.queued / self.max_queued_reads,
+    )
+    load = max(database, latency / self.max_latency)
+    self.metrics.set_gauge('admission.load', load)
+    self.metrics.max_gauge('admission.peak_load', load)
+    return database, load
+
+  def admit(self, kind: str, essential: bool, waited: float = 0.0) -> bool:
+    """
+    Whether to go ahead with some work of `kind` ('command', 'message', ...), after it `waited` seconds to
+    reach us. Counts the decision either way.
+    """
+    database, load = self.load()
+
+    # Essential work is only ever turned away when the database is overloaded. Latency alone does not count
+    # for it, it includes time spent waiting on Discord; neither does a late start.
+    if (database if essential else load) >= self.overload:
+      reason = 'overload'
+    elif waited > self.max_wait and not essential:
+      reason = 'late'
+    elif load >= 1 and not essential:
+      reason = 'pressure'
+    else:
+      self.metrics.increment(f'admission.{kind}.admitted')
+      return True
+
+    self.metrics.increment(f'admission.{kind}.shed')
+    self.metrics.increment(f'admission.shed.{reason}')
+    LOGGER.debug('Shed a %s (%s, load %.2f, waited %.2fs).', kind, reason, load, waited)
+    return False
+
+  async def check(self, interaction: discord.Interaction) -> bool:
+    """
+    Admission for an app command, from the command tree's interaction check. Answers shed commands itself.
+    """
+    command = interaction.command
+    if command is None or command.extras.get('exempt', False):
+      return True
+
+    # Commands are essential unless they say otherwise with extras={'essential': False}.
+    essential = command.extras.get('essential', True)
+    waited = self.waited(interaction)
+
+    if interaction.type is discord.InteractionType.autocomplete:
+      # Suggestions can go without an answer, they are dropped as soon as there is any pressure.
+      return self.admit('autocomplete', essential=False, waited=waited)
+
+    if not self.admit('command', essential, waited):
+      await self.busy(interaction, waited)
+      return False
+
+    self.running[interaction.id] = time.monotonic()
+    return True
+
+  def waited(self, interaction: discord.Interaction) -> float:
+    """
+    Seconds since the bot received `interaction`, from the receipt time FisherBot.dispatch puts in its extras.
+    """
+    received = interaction.extras.get('received')
+    if received is not None:
+      return time.monotonic() - received
+
+    age = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+    return age if 0 <= age <= MAX_CLOCK_WAIT else 0.0
+
+  def finished(self, interaction: discord.Interaction) -> None:
+    """
+    Reports that an admitted command is done, whether it worked or not.
+    """
+    started = self.running.pop(interaction.id, None)
+    if started is None:
+      return
+
+    elapsed = time.monotonic() - started
+    self.latency += self.smoothing * (elapsed - self.latency)
+    self.latency_updated = time.monotonic()
+    self.metrics.set_gauge('admission.latency', self.latency)
+    self.metrics.max_gauge('admission.max_latency', elapsed)
+
+  async def busy(self, interaction: discord.Interaction, waited: float) -> None:
+    if waited >= RESPONSE_DEADLINE:
+      # Too late to answer at all.
+      return
+
+    try:
+      await interaction.response.send_message(
+        'The fish are swarming right now! Please try again in a few seconds.',
+        ephemeral=True,
+      )
+    except discord.HTTPException as e:
+      LOGGER.debug('Could not send the busy reply: %s', e)
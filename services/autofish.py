@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import random
+import time
+
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import discord
+
+from models.area import Area
+from models.rod import Rod
+from services.catch_log import CatchLog
+from services.fish_service import FishService
+from services.metrics import Metrics
+from services.notifier import NotificationQueue
+from services.shard_router import ShardRouter
+from util.weighted_random import WeightedRandom
+
+LOGGER = logging.getLogger('FisherCat.AutoFish')
+
+
+class AutoFishSession:
+  """
+  One member fishing on their own in one area until `ends_at`, casting once every `interval` seconds
+  with the rod they had when the session started.
+  """
+
+  def __init__(
+    self,
+    guild_id: int,
+    member_id: int,
+    channel: discord.abc.Messageable,
+    mention: str,
+    area: Area,
+    rod: Rod,
+    interval: float,
+    duration: float,
+  ):
+    self.guild_id = guild_id
+    self.member_id = member_id
+    self.channel = channel
+    self.mention = mention
+    self.area = area
+    self.rod = rod
+    # A cooldown of 0 would make every tick cast as often as it is allowed to.
+    self.interval = max(interval, 1.0)
+
+    now = time.monotonic()
+    self.started_at = now
+    self.due_at = now + self.interval
+    self.ends_at = now + duration
+    self.last_summary = now
+
+    self.casts = 0
+    self.escaped = 0
+    # Fish id -> how many, since the last summary and over the whole session.
+    self.recent: Counter = Counter()
+    self.caught: Counter = Counter()
+
+  @property
+  def key(self) -> Tuple[int, int]:
+    return (self.guild_id, self.member_id)
+
+
+class AutoFishScheduler:
+  """
+  Runs every auto-fishing session from one periodic tick instead of one interaction per cast.
+
+  A tick resolves the casts of every due session, area by area with that area's sampler from a single
+  catalog, and writes all the catches to the ledger in one transaction per shard. Sessions report what
+  they caught through the notifier every `summary_every` seconds and once more when they end.
+  """
+
+  def __init__(
+    self,
+    router: ShardRouter,
+    fish_service: FishService,
+    notifier: NotificationQueue,
+    metrics: Metrics,
+    catches: Optional[CatchLog] = None,
+    summary_every: float = 600.0,
+    max_casts_per_tick: int = 3,
+  ):
+    self.router = router
+    self.fish_service = fish_service
+    self.notifier = notifier
+    self.metrics = metrics
+    self.catches = catches
+    self.summary_every = summary_every
+    # A session that fell behind (a slow tick, a stalled loop) catches up at most this many casts at once.
+    self.max_casts_per_tick = max_casts_per_tick
+
+    self.sessions: Dict[Tuple[int, int], AutoFishSession] = {}
+
+  def active(self, guild_id: int, member_id: int) -> Optional[AutoFishSession]:
+    return self.sessions.get((guild_id, member_id))
+
+  def start(self, session: AutoFishSession) -> bool:
+    """
+    Starts `session`, returns False if the member is already fishing.
+    """
+    if session.key in self.sessions:
+      return False
+
+    self.sessions[session.key] = session
+    self.metrics.set_gauge('autofish.sessions', len(self.sessions))
+    return True
+
+  def stop(self, guild_id: int, member_id: int) -> Optional[AutoFishSession]:
+    """
+    Ends a member's session and queues its final summary. Returns the session, or None if there was none.
+    """
+    session = self.sessions.pop((guild_id, member_id), None)
+    if session is not None:
+      self.metrics.set_gauge('autofish.sessions', len(self.sessions))
+      self.notifier.report(session.channel, self.format_summary(session, final=True))
+    return session
+
+  def drop_guild(self, guild_id: int) -> int:
+    """
+    Ends every session in a guild without a summary, for when the bot can no longer post there.
+    """
+    keys = [key for key in self.sessions if key[0] == guild_id]
+    for key in keys:
+      del self.sessions[key]
+    self.metrics.set_gauge('autofish.sessions', len(self.sessions))
+    return len(keys)
+
+  async def tick(self) -> int:
+    """
+    Resolves the casts of every due session and writes them to the ledger. Returns how many casts were made.
+    """
+    started = time.perf_counter()
+    now = time.monotonic()
+
+    due: Dict[Area, List[AutoFishSession]] = {}
+    for session in self.sessions.values():
+      if session.due_at <= min(now, session.ends_at):
+        due.setdefault(session.area, []).append(session)
+
+    # Every cast of this tick uses the same catalog, even if a reload swaps in a new one meanwhile.
+    catalog = self.fish_service.catalog
+
+    catches: Dict[Tuple[int, int], Counter] = {}
+    casts = 0
+    for area, sessions in due.items():
+      sampler = catalog.sampler(area)
+      for session in sessions:
+        caught, escaped, cast = self.resolve(sampler, session, now)
+        casts += cast
+        session.casts += cast
+        session.escaped += escaped
+        if caught:
+          catches[session.key] = caught
+
+    if catches:
+      rows_by_shard: Dict[int, List[Tuple[int, int, int, int]]] = {}
+      for (guild_id, member_id), caught in catches.items():
+        rows = rows_by_shard.setdefault(self.router.shard_for(guild_id), [])
+        rows.extend(
+          (guild_id, member_id, fish_id, amount) for fish_id, amount in caught.items()
+        )
+
+      written = await asyncio.to_thread(self._write, rows_by_shard)
+
+      for key, caught in catches.items():
+        if self.router.shard_for(key[0]) not in written:
+          continue
+
+        if self.catches is not None:
+          for fish_id, amount in caught.items():
+            self.catches.record(key[0], key[1], catalog.by_id[fish_id], amount)
+
+        # The member may have stopped while the catches were being written.
+        session = self.sessions.get(key)
+        if session is not None:
+          session.recent.update(caught)
+          session.caught.update(caught)
+
+    self.report(now)
+
+    elapsed = time.perf_counter() - started
+    self.metrics.increment('autofish.ticks')
+    self.metrics.increment('autofish.casts', casts)
+    self.metrics.set_gauge('autofish.tick_seconds', elapsed)
+    self.metrics.set_gauge('autofish.sessions', len(self.sessions))
+    return casts
+
+  def resolve(
+    self, sampler: WeightedRandom, session: AutoFishSession, now: float
+  ) -> Tuple[Counter, int, int]:
+    """
+    Makes the casts `session` is due for the same way /fish does. Returns (caught fish ids, escaped, casts).
+    """
+    behind = int((now - session.due_at) // session.interval) + 1
+    casts = min(behind, self.max_casts_per_tick)
+    if behind > casts:
+      # Too far behind to catch up, skip the missed casts instead of piling them into later ticks.
+      session.due_at = now + session.interval
+    else:
+      session.due_at += casts * session.interval
+
+    rod = session.rod
+
+    caught: Counter = Counter()
+    escaped = 0
+    for _ in range(casts):
+      for _ in range(random.randint(rod.min_catch, rod.max_catch)):
+        if random.randint(1, rod.line_break_chance) == 1:
+          escaped += 1
+          continue
+
+        fish = sampler.get()
+        if fish is not None:
+          caught[fish.id] += 1
+
+    return caught, escaped, casts
+
+  def _write(self, rows_by_shard: Dict[int, List[Tuple[int, int, int, int]]]) -> set:
+    # Runs on a worker thread with its own connection per shard, one transaction each.
+    written = set()
+    for index, rows in rows_by_shard.items():
+      conn = self.router.open_shard(index)
+      try:
+        with conn:
+          conn.executemany(
+            'INSERT INTO ledger (guildid, memberid, fishid, amount) VALUES (?, ?, ?, ?);',
+            rows,
+          )
+        written.add(index)
+      except Exception as e:
+        self.metrics.increment('autofish.failures')
+        LOGGER.error(
+          'Could not write %s catch(es) to shard %s: %s', len(rows), index, e
+        )
+      finally:
+        conn.close()
+    return written
+
+  def report(self, now: float) -> None:
+    # Summaries of sessions that are due for one, ended sessions get their final one and are dropped.
+    for key, session in list(self.sessions.items()):
+      if now >= session.ends_at:
+        self.stop(*key)
+      elif now - session.last_summary >= self.summary_every and session.recent:
+        self.notifier.report(session.channel, self.format_summary(session))
+        session.recent.clear()
+        session.last_summary = now
+
+  def format_summary(self, session: AutoFishSession, final: bool = False) -> str:
+    catalog = self.fish_service.catalog
+    counts = session.caught if final else session.recent
+
+    parts = []
+    for fish_id, count in counts.most_common():
+      fish = catalog.by_id.get(fish_id)
+      name = fish.name if fish is not None else f'fish #{fish_id}'
+      parts.append(f'{count}x {name}')
+
+    caught = ', '.join(parts) if parts else 'nothing'
+    if final:
+      minutes = (time.monotonic() - session.started_at) / 60
+      return (
+        f'{session.mention} finished fishing in the {session.area.name} after {minutes:.0f} minute(s) '
+        f'and {session.casts} cast(s). Caught: {caught}. {session.escaped} fish escaped.'
+      )
+    return (
+      f'{session.mention} is fishing in the {session.area.name} and caught: {caught}.'
+    )
@@ -0,0 +1,209 @@
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from datetime import datetime
+from typing import List, Optional
+
+from services.metrics import Metrics
+from services.shard_router import ShardRouter
+
+LOGGER = logging.getLogger('FisherCat.Backup')
+
+CHECKSUM_FILE = 'SHA256SUMS'
+
+
+class BackupRestarted(Exception):
+  pass
+
+
+def file_checksum(path: str) -> str:
+  digest = hashlib.sha256()
+  with open(path, 'rb') as f:
+    while chunk := f.read(1 << 20):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+
+def copy_database(
+  source: sqlite3.Connection,
+  target_path: str,
+  pages: int = 256,
+  pause: float = 0.005,
+  max_restarts: int = 3,
+) -> None:
+  """
+  Copies a live database with SQLite's online backup API, `pages` pages at a time, sleeping in between
+  so the bot's writer always gets the lock back quickly.
+
+  A write from another connection makes SQLite restart the copy. If that keeps happening, the rest is
+  copied in a single step. In WAL mode that only holds a read snapshot, so the writer is not blocked.
+  """
+  restarts = 0
+  last_remaining: Optional[int] = None
+
+  def progress(status: int, remaining: int, total: int):
+    nonlocal restarts, last_remaining
+
+    if last_remaining is not None and remaining > last_remaining:
+      restarts += 1
+      if restarts > max_restarts:
+        raise BackupRestarted()
+    last_remaining = remaining
+
+    time.sleep(pause)
+
+  target = sqlite3.connect(target_path)
+  try:
+    try:
+      source.backup(target, pages=pages, progress=progress)
+    except BackupRestarted:
+      LOGGER.info('Backup to %s kept restarting, copying it in one step.', target_path)
+      source.backup(target, pages=-1)
+
+    # Backups are plain files, the bot switches them back to WAL once they are restored.
+    target.execute('PRAGMA journal_mode = DELETE;')
+  finally:
+    target.close()
+
+
+class BackupService:
+  """
+  Takes backups of the catalog and every shard into `directory`, one folder per backup, and keeps the
+  newest `keep` of them. Every folder has a SHA256SUMS file so a backup can be checked before it is restored.
+
+  Everything here blocks, run it on a worker thread.
+  """
+
+  def __init__(
+    self,
+    router: ShardRouter,
+    directory: str,
+    metrics: Metrics,
+    keep: int = 7,
+    pages: int = 256,
+    pause: float = 0.005,
+  ):
+    self.router = router
+    self.directory = directory
+    self.metrics = metrics
+    self.keep = keep
+    self.pages = pages
+    self.pause = pause
+
+    self.lock = threading.Lock()
+
+    os.makedirs(self.directory, exist_ok=True)
+
+  def snapshots(self) -> List[str]:
+    """
+    Names of the finished backups, oldest first.
+    """
+    return sorted(
+      name
+      for name in os.listdir(self.directory)
+      if os.path.isfile(os.path.join(self.directory, name, CHECKSUM_FILE))
+    )
+
+  def run(self) -> str:
+    """
+    Takes a backup and returns its name.
+    """
+    with self.lock:
+      started = time.perf_counter()
+      name = datetime.now().strftime('%Y%m%d-%H%M%S')
+      # Written under a temporary name, so a crash never leaves a folder that looks complete.
+      partial = os.path.join(self.directory, f'.{name}.partial')
+      shutil.rmtree(partial, ignore_errors=True)
+      os.makedirs(partial)
+
+      try:
+        checksums = []
+        for path in self.router.database_paths():
+          filename = os.path.basename(path)
+          target = os.path.join(partial, filename)
+
+          source = sqlite3.connect(path)
+          try:
+            copy_database(source, target, self.pages, self.pause)
+          finally:
+            source.close()
+
+          checksums.append(f'{file_checksum(target)}  {filename}\n')
+
+        with open(os.path.join(partial, CHECKSUM_FILE), 'w') as f:
+          f.writelines(checksums)
+
+        os.rename(partial, os.path.join(self.directory, name))
+      except Exception:
+        self.metrics.increment('backup.failures')
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+      self.rotate()
+
+      elapsed = time.perf_counter() - started
+      self.metrics.increment('backup.runs')
+      self.metrics.set_gauge('backup.last_seconds', elapsed)
+      LOGGER.info(
+        'Backed up %s database(s) to %s in %.2fs.', len(checksums), name, elapsed
+      )
+      return name
+
+  def rotate(self) -> None:
+    for name in self.snapshots()[: -self.keep]:
+      shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+      LOGGER.info('Removed old backup %s.', name)
+
+  def verify(self, name: Optional[str] = None) -> List[str]:
+    """
+    Checks a backup, the newest one by default. Every file must match its checksum and restore into a
+    database that passes an integrity check. Returns the problems found, an empty list means it is fine.
+    """
+    snapshots = self.snapshots()
+    if name is None:
+      if not snapshots:
+        return ['There are no backups yet.']
+      name = snapshots[-1]
+    elif name not in snapshots:
+      return [f'There is no backup called {name}.']
+
+    folder = os.path.join(self.directory, name)
+    with open(os.path.join(folder, CHECKSUM_FILE), 'r') as f:
+      expected = [line.rstrip('\n').split('  ', 1) for line in f if line.strip()]
+
+    problems = []
+    with tempfile.TemporaryDirectory() as scratch:
+      for checksum, filename in expected:
+        path = os.path.join(folder, filename)
+        if not os.path.isfile(path):
+          problems.append(f'{filename} is missing.')
+          continue
+
+        if file_checksum(path) != checksum:
+          problems.append(f'{filename} does not match its checksum.')
+          continue
+
+        # Restore it the same way a real restore would, then check what came out.
+        restored = os.path.join(scratch, filename)
+        source = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+          copy_database(source, restored, pages=-1)
+        finally:
+          source.close()
+
+        conn = sqlite3.connect(restored)
+        try:
+          result = conn.execute('PRAGMA integrity_check;').fetchone()[0]
+        finally:
+          conn.close()
+
+        if result != 'ok':
+          problems.append(f'{filename} failed the integrity check: {result}')
+
+    return problems
@@ -0,0 +1,223 @@
+import logging
+import sqlite3
+import time
+
+from typing import Dict, List, Optional, Tuple
+
+from models.fish import Fish
+from services.metrics import Metrics
+from services.read_pool import ReadPool
+from services.shard_router import ShardRouter
+
+LOGGER = logging.getLogger('FisherCat.CatchLog')
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Rollup table -> width of its buckets in seconds.
+ROLLUPS = {'catch_hourly': HOUR, 'catch_daily': DAY}
+
+# (guildid, memberid, fishid, area, rarity, amount, caught)
+CatchRow = Tuple[int, int, int, int, int, int, int]
+
+
+def bucket(timestamp: int, width: int) -> int:
+  return timestamp - timestamp % width
+
+
+def rollup_rows(
+  rows: List[CatchRow], width: int
+) -> List[Tuple[int, int, int, int, int, int]]:
+  """
+  Sums raw catches into (guildid, bucket, area, fishid, rarity, amount) rows, one per bucket and species.
+  """
+  totals: Dict[Tuple[int, int, int, int, int], int] = {}
+  for guild_id, _, fish_id, area, rarity, amount, caught in rows:
+    key = (guild_id, bucket(caught, width), area, fish_id, rarity)
+    totals[key] = totals.get(key, 0) + amount
+  return [(*key, amount) for key, amount in totals.items()]
+
+
+class CatchLog:
+  """
+  An append-only history of every catch, with hourly and daily totals per guild, area and species.
+
+  Catches are buffered in memory and written by flush, from a worker thread, in one transaction per shard
+  that appends the raw rows and adds them to the rollups. Stats read the rollups, so they never scan raw
+  catches. Raw catches are kept for `raw_days`, hourly totals for `hourly_days` and daily totals forever.
+  """
+
+  def __init__(
+    self,
+    router: ShardRouter,
+    read_pool: ReadPool,
+    metrics: Metrics,
+    raw_days: int = 30,
+    hourly_days: int = 90,
+    prune_batch: int = 1000,
+    pause: float = 0.05,
+  ):
+    self.router = router
+    self.read_pool = read_pool
+    self.metrics = metrics
+    self.raw_days = raw_days
+    self.hourly_days = hourly_days
+    self.prune_batch = prune_batch
+    self.pause = pause
+
+    # shard index -> catches waiting for the next flush.
+    self.pending: Dict[int, List[CatchRow]] = {}
+
+  def record(self, guild_id: int, member_id: int, fish: Fish, amount: int) -> None:
+    """
+    Queues a catch for the next flush. Cheap, call it from the event loop.
+    """
+    row = (
+      guild_id,
+      member_id,
+      fish.id,
+      fish.area.value,
+      fish.rarity.value,
+      amount,
+      int(time.time()),
+    )
+    self.pending.setdefault(self.router.shard_for(guild_id), []).append(row)
+
+  def take(self) -> Dict[int, List[CatchRow]]:
+    """
+    Hands over everything queued so far, to be passed to flush.
+    """
+    pending, self.pending = self.pending, {}
+    return pending
+
+  def flush(self, pending: Dict[int, List[CatchRow]]) -> int:
+    """
+    Writes `pending` (from take) and returns how many catches were written. Blocks, run it on a worker
+    thread. A shard that fails keeps its catches queued for the next flush.
+    """
+    written = 0
+    for index, rows in pending.items():
+      conn = None
+      try:
+        conn = self.router.open_shard(index)
+        with conn:
+          conn.executemany(
+            """
+            INSERT INTO main.catch (guildid, memberid, fishid, area, rarity, amount, caught)
+            VALUES (?, ?, ?, ?, ?, ?, ?);
+          """,
+            rows,
+          )
+          for table, width in ROLLUPS.items():
+            conn.executemany(
+              f"""
+              INSERT INTO main.{table} (guildid, bucket, area, fishid, rarity, amount)
+              VALUES (?, ?, ?, ?, ?, ?)
+              ON CONFLICT (guildid, bucket, area, fishid) DO UPDATE SET amount = amount + excluded.amount;
+            """,
+              rollup_rows(rows, width),
+            )
+        written += len(rows)
+      except Exception as e:
+        self.metrics.increment('catches.failures')
+        LOGGER.warning(
+          'Could not write %s catch(es) to shard %s: %s', len(rows), index, e
+        )
+        # Lists are only appended to, a plain extend is safe from a worker thread.
+        self.pending.setdefault(index, []).extend(rows)
+      finally:
+        if conn is not None:
+          conn.close()
+
+    self.metrics.increment('catches.written', written)
+    return written
+
+  def prune(self) -> int:
+    """
+    Deletes raw catches and hourly totals past their retention, `prune_batch` rows per transaction with a
+    pause in between. Returns how many rows were deleted. Blocks, run it on a worker thread.
+    """
+    now = int(time.time())
+    deleted = 0
+
+    for index in range(self.router.shard_count):
+      conn = self.router.open_shard(index)
+      try:
+        deleted += self._prune_table(
+          conn,
+          'DELETE FROM main.catch WHERE id IN (SELECT id FROM main.catch WHERE caught < ? LIMIT ?);',
+          now - self.raw_days * DAY,
+        )
+        deleted += self._prune_table(
+          conn,
+          """
+          DELETE FROM main.catch_hourly WHERE (guildid, bucket, area, fishid) IN (
+            SELECT guildid, bucket, area, fishid FROM main.catch_hourly WHERE bucket < ? LIMIT ?
+          );
+        """,
+          now - self.hourly_days * DAY,
+        )
+      finally:
+        conn.close()
+
+    self.metrics.increment('catches.pruned', deleted)
+    if deleted:
+      LOGGER.info('Pruned %s old catch row(s).', deleted)
+    return deleted
+
+  def _prune_table(self, conn: sqlite3.Connection, sql: str, cutoff: int) -> int:
+    deleted = 0
+    while True:
+      with conn:
+        count = conn.execute(sql, (cutoff, self.prune_batch)).rowcount
+      deleted += count
+      if count < self.prune_batch:
+        return deleted
+      time.sleep(self.pause)
+
+  async def totals(
+    self, guild_id: int, since: int, rarity: Optional[int] = None
+  ) -> List[Tuple[int, int, int]]:
+    """
+    (fishid, rarity, amount) caught in a guild since `since`, most caught first. Reads the daily totals for
+    anything older than two days and the hourly ones otherwise, so `since` is rounded down to their bucket.
+    """
+    return await self.read_pool.run(guild_id, self._totals, guild_id, since, rarity)
+
+  def _totals(
+    self, conn: sqlite3.Connection, guild_id: int, since: int, rarity: Optional[int]
+  ) -> List[Tuple[int, int, int]]:
+    table = 'catch_daily' if time.time() - since > 2 * DAY else 'catch_hourly'
+    rows = conn.execute(
+      f"""
+      SELECT fishid, rarity, SUM(amount) AS amount FROM main.{table}
+      WHERE guildid = :guild AND bucket >= :since AND (:rarity IS NULL OR rarity = :rarity)
+      GROUP BY fishid
+      ORDER BY amount DESC;
+    """,
+      {'guild': guild_id, 'since': bucket(since, ROLLUPS[table]), 'rarity': rarity},
+    )
+    return [(row[0], row[1], row[2]) for row in rows]
+
+  async def activity(
+    self, guild_id: int, since: int, daily: bool
+  ) -> List[Tuple[int, int]]:
+    """
+    (bucket start, fish caught) per hour, or per day with `daily`, in a guild since `since`.
+    """
+    return await self.read_pool.run(guild_id, self._activity, guild_id, since, daily)
+
+  def _activity(
+    self, conn: sqlite3.Connection, guild_id: int, since: int, daily: bool
+  ) -> List[Tuple[int, int]]:
+    table = 'catch_daily' if daily else 'catch_hourly'
+    rows = conn.execute(
+      f"""
+      SELECT bucket, SUM(amount) FROM main.{table}
+      WHERE guildid = ? AND bucket >= ?
+      GROUP BY bucket
+      ORDER BY bucket;
+    """,
+      (guild_id, bucket(since, ROLLUPS[table])),
+    )
+    return [(row[0], row[1]) for row in rows]
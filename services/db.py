@@ -1,30 +1,49 @@
 import sqlite3
 import math
 import logging
-from typing import List, Tuple
-from datetime import datetime
+from typing import List, Optional, Tuple
 
 from models.area import Area
 from models.fish import Fish
 from models.fuser import FUser
 from models.rarity import Rarity
 from models.rod import Rod
+from services.read_pool import ReadPool
+from services.shard_router import ShardRouter
+from util.bitset import from_blob, set_bit, to_blob
+from util.timestamps import from_epoch, to_epoch
 
 LOGGER = logging.getLogger('FisherCat.DbService')
 
+# A member's inventory with unapplied ledger entries merged in. Takes (guild, member) twice.
+PENDING_INVENTORY = """
+  SELECT fishid, SUM(amount) AS amount FROM (
+    SELECT fishid, amount FROM inventory WHERE guildid = ? AND memberid = ?
+    UNION ALL
+    SELECT fishid, amount FROM ledger
+    WHERE guildid = ? AND memberid = ? AND applied = 0 AND fishid IS NOT NULL
+  )
+  GROUP BY fishid
+"""
+
 
 class DbService:
-  def __init__(self, connection: sqlite3.Connection):
-    self.connection = connection
+  # Economy tuning, also read by the offline simulator in tools/simulate_economy.py.
+  DAILY_BONUS_COINS = 500
+  DAILY_XP_BONUS = 100
+
+  LEVEL_INCREASE: float = 0.15
+  LEVEL_GAP: float = 1.7
 
-    self.DAILY_BONUS_COINS = 500
-    self.DAILY_XP_BONUS = 100
+  COIN_REWARD: int = 50
+  COIN_REWARD_INCREASE: float = 12.7
 
-    self.LEVEL_INCREASE: float = 0.15
-    self.LEVEL_GAP: float = 1.7
+  def __init__(self, router: ShardRouter, read_pool: ReadPool):
+    self.router = router
+    self.read_pool = read_pool
 
-    self.COIN_REWARD: int = 50
-    self.COIN_REWARD_INCREASE: float = 12.7
+    # Catalog tables (guild, member, fish, rod) live here; per-guild tables are routed to a shard.
+    self.connection: sqlite3.Connection = router.catalog
 
   def ensure_guild(self, guild_id: int) -> None:
     """
@@ -41,38 +60,25 @@ class DbService:
 
     with self.connection:
       cursor.execute('INSERT OR IGNORE INTO guild (id) VALUES (?)', (guild_id,))
-      LOGGER.info(f'Enrolled guild: {guild_id}')
+      LOGGER.info('Enrolled guild: %s', guild_id)
+
+    self.router.enroll(guild_id)
 
   def ensure_user(self, member_id: int, guild_id: int) -> FUser:
     """
     Add user to the database if not already present.
     """
-    cursor = self.connection.cursor()
-
-    result = cursor.execute(
-      """
-      SELECT * FROM guildmember WHERE guildid = ? AND memberid = ?;
-    """,
-      (guild_id, member_id),
-    ).fetchone()
+    connection = self.router.connection(guild_id)
 
-    if result is not None:
-      # User exists, fill up the fuser and return.
-      db_user = FUser()
-      db_user.coins = result['coins']
-      db_user.xp = result['xp']
-      db_user.xp_step = result['xpstep']
-      db_user.xp_next = result['xpnext']
-      db_user.level = result['level']
-      db_user.lastclaimed = datetime.strptime(
-        result['lastclaimed'], '%Y-%m-%d %H:%M:%S'
-      )
-      db_user.fishing_cooldown = result['fishingcooldown']
+    db_user = self._load_user(connection, guild_id, member_id)
+    if db_user is not None:
       return db_user
 
     # User does not exist, enroll them.
-    with self.connection:
-      cursor.execute('INSERT INTO member (id) VALUES (?);', (member_id,))
+    cursor = connection.cursor()
+    with connection:
+      # Members are shared between guilds, they may already be known from another one.
+      cursor.execute('INSERT OR IGNORE INTO member (id) VALUES (?);', (member_id,))
       cursor.execute(
         """
           INSERT INTO guildmember (guildid, memberid) VALUES (?, ?)
@@ -90,9 +96,58 @@ class DbService:
 
     return FUser()
 
+  def _load_user(
+    self, connection: sqlite3.Connection, guild_id: int, member_id: int
+  ) -> Optional[FUser]:
+    # The snapshot plus every ledger entry the compactor has not folded in yet.
+    result = connection.execute(
+      """
+      SELECT
+        gm.coins + IFNULL(SUM(l.coins), 0) AS coins,
+        gm.xp + IFNULL(SUM(l.xp), 0) AS xp,
+        gm.xpstep + IFNULL(SUM(l.xpstep), 0) AS xpstep,
+        gm.xpnext + IFNULL(SUM(l.xpnext), 0) AS xpnext,
+        gm.level + IFNULL(SUM(l.level), 0) AS level,
+        gm.lastclaimed, gm.fishingcooldown
+      FROM guildmember gm
+      LEFT JOIN ledger l
+        ON l.guildid = gm.guildid AND l.memberid = gm.memberid AND l.applied = 0
+      WHERE gm.guildid = ? AND gm.memberid = ?
+      GROUP BY gm.guildid, gm.memberid;
+    """,
+      (guild_id, member_id),
+    ).fetchone()
+
+    if result is None:
+      return None
+
+    db_user = FUser()
+    db_user.coins = result['coins']
+    db_user.xp = result['xp']
+    db_user.xp_step = result['xpstep']
+    db_user.xp_next = result['xpnext']
+    db_user.level = result['level']
+    db_user.lastclaimed = from_epoch(result['lastclaimed'])
+    db_user.fishing_cooldown = result['fishingcooldown']
+    db_user.mark_clean()
+    return db_user
+
+  def refresh_user(self, guild_id: int, member_id: int, user: FUser) -> FUser:
+    """
+    Brings `user` up to date with the database, keeping its unwritten changes on top. Use it before deciding
+    anything on a user that was loaded before an await, someone else may have changed them meanwhile.
+    """
+    fresh = self._load_user(self.router.connection(guild_id), guild_id, member_id)
+    if fresh is not None:
+      user.rebase(fresh)
+    return user
+
   def add_xp(
     self, guild_id: int, member_id: int, xp: int, user: FUser
   ) -> Tuple[int, int]:
+    # Level-ups depend on the current XP, a stale copy could level the user up twice.
+    self.refresh_user(guild_id, member_id, user)
+
     user.xp += xp
     total_coins = 0
     total_levels = 0
@@ -122,29 +177,40 @@ class DbService:
     self, guild_id: int, member_id: int, fish_id: int, fish_amount: int = 1
   ) -> None:
     """
-    Update player inventory with new fish.
+    Adds `fish_amount` of a fish to the member's inventory, as a ledger delta. Take fish with take_user_fish.
     """
-    with self.connection:
-      self.connection.execute(
-        f"""
-        INSERT INTO inventory (guildid, memberid, fishid, amount) VALUES (?, ?, ?, ?)
-        ON CONFLICT(guildid, memberid, fishid) DO UPDATE SET amount = amount + {fish_amount};
+    connection = self.router.connection(guild_id)
+
+    with connection:
+      connection.execute(
+        """
+        INSERT INTO ledger (guildid, memberid, fishid, amount) VALUES (?, ?, ?, ?);
       """,
         (guild_id, member_id, fish_id, fish_amount),
       )
 
-  def get_all_user_fish(self, guild_id: int, member_id: int) -> List[Tuple[Fish, int]]:
+  async def get_all_user_fish(
+    self, guild_id: int, member_id: int
+  ) -> List[Tuple[Fish, int]]:
     """
     Returns a list of tuples, containing the fish on the left and the amount of it on the right.
     """
-    cursor = self.connection.cursor()
+    return await self.read_pool.run(
+      guild_id, self._get_all_user_fish, guild_id, member_id
+    )
+
+  def _get_all_user_fish(
+    self, connection: sqlite3.Connection, guild_id: int, member_id: int
+  ) -> List[Tuple[Fish, int]]:
+    cursor = connection.cursor()
     cursor.execute(
-      """
-      SELECT i.amount, f.* FROM inventory i
+      f"""
+      SELECT i.amount, f.* FROM ({PENDING_INVENTORY}) i
       JOIN fish f ON i.fishid = f.id
-      WHERE i.guildid = ? AND i.memberid = ?;
+      WHERE i.amount > 0
+      ORDER BY i.fishid;
     """,
-      (guild_id, member_id),
+      (guild_id, member_id, guild_id, member_id),
     )
 
     rows = cursor.fetchall()
@@ -155,65 +221,92 @@ class DbService:
         id=row['id'],
         name=row['name'],
         xp=row['xp'],
-        rarity=Rarity[row['rarity']],
+        rarity=Rarity.decode(row['rarity']),
         odds=row['odds'],
-        area=Area[row['area']],
+        area=Area.decode(row['area']),
         base_value=row['base_value'],
       )
       fish_data.append((fish, row['amount']))
 
     return fish_data
 
-  def get_user_fish(
+  async def get_user_fish(
     self, guild_id: int, member_id: int, fish_id: int
-  ) -> Tuple[Fish, int]:
-    cursor = self.connection.cursor()
+  ) -> Optional[Tuple[Fish, int]]:
+    """
+    Returns the fish and how many of it the member has, or None if they have none.
+    """
+    return await self.read_pool.run(
+      guild_id, self._get_user_fish, guild_id, member_id, fish_id
+    )
+
+  def _get_user_fish(
+    self, connection: sqlite3.Connection, guild_id: int, member_id: int, fish_id: int
+  ) -> Optional[Tuple[Fish, int]]:
+    cursor = connection.cursor()
     cursor.execute(
-      """
-      SELECT i.amount, f.* FROM inventory i
+      f"""
+      SELECT i.amount, f.* FROM ({PENDING_INVENTORY}) i
       INNER JOIN fish f ON i.fishid = f.id
-      WHERE i.memberid = ? AND i.guildid = ? AND i.fishid = ?;
+      WHERE i.fishid = ? AND i.amount > 0;
     """,
-      (member_id, guild_id, fish_id),
+      (guild_id, member_id, guild_id, member_id, fish_id),
     )
 
     row = cursor.fetchone()
+    if row is None:
+      return None
 
     fish = Fish(
       id=row['id'],
       name=row['name'],
       xp=row['xp'],
-      rarity=Rarity[row['rarity']],
+      rarity=Rarity.decode(row['rarity']),
       odds=row['odds'],
-      area=Area[row['area']],
+      area=Area.decode(row['area']),
       base_value=row['base_value'],
     )
     return (fish, int(row['amount']))
 
-  def update_user_fish(
-    self, member_id: int, guild_id: int, fish_id: int, count: int
-  ) -> None:
-    with self.connection:
-      if count <= 0:
-        self.connection.execute(
-          """
-          DELETE FROM inventory
-          WHERE fishid = ? AND memberid = ? AND guildid = ?
-        """,
-          (fish_id, member_id, guild_id),
-        )
-      else:
-        self.connection.execute(
-          """
-          UPDATE inventory
-          SET amount = ?
-          WHERE fishid = ? AND memberid = ? AND guildid = ?;
-        """,
-          (count, fish_id, member_id, guild_id),
-        )
+  def take_user_fish(
+    self, guild_id: int, member_id: int, fish_id: int, amount: int
+  ) -> bool:
+    """
+    Takes `amount` of a fish if the member has that many right now, checked and written in one statement so
+    nothing can take them in between. Returns whether they were taken.
+    """
+    connection = self.router.connection(guild_id)
 
-  def get_user_rod(self, member_id: int, guild_id: int) -> Rod:
-    cursor = self.connection.cursor()
+    with connection:
+      cursor = connection.execute(
+        f"""
+        INSERT INTO ledger (guildid, memberid, fishid, amount)
+        SELECT ?, ?, ?, -? WHERE (
+          SELECT IFNULL(SUM(amount), 0) FROM ({PENDING_INVENTORY}) WHERE fishid = ?
+        ) >= ?;
+      """,
+        (
+          guild_id,
+          member_id,
+          fish_id,
+          amount,
+          guild_id,
+          member_id,
+          guild_id,
+          member_id,
+          fish_id,
+          amount,
+        ),
+      )
+      return cursor.rowcount > 0
+
+  async def get_user_rod(self, member_id: int, guild_id: int) -> Rod:
+    return await self.read_pool.run(guild_id, self._get_user_rod, member_id, guild_id)
+
+  def _get_user_rod(
+    self, connection: sqlite3.Connection, member_id: int, guild_id: int
+  ) -> Rod:
+    cursor = connection.cursor()
     query = """
       SELECT
         r.id, r.name, r.description, r.value, r.levelrequired,
@@ -237,83 +330,111 @@ class DbService:
       line_break_chance=dbrod['linebreakchance'],
     )
 
-  def get_user_rods(self, member_id: int, guild_id: int) -> List[Rod]:
-    cursor = self.connection.cursor()
+  async def get_rod_mask(self, member_id: int, guild_id: int) -> int:
+    """
+    Returns the rods the member owns as a bitmask, with bit n set if they own the rod with id n.
+    """
+    return await self.read_pool.run(guild_id, self._get_rod_mask, member_id, guild_id)
 
-    cursor.execute(
-      """
-        SELECT
-        m.memberid, m.guildid, m.rodid,
-        r.id, r.name, r.description, r.value, r.levelrequired, r.xpmultiplier, r.mincatch, r.maxcatch, r.linebreakchance
-        FROM memberrod m
-        JOIN rod r ON m.rodid = r.id
-        WHERE m.guildid = ? AND m.memberid = ?;
-      """,
+  def _get_rod_mask(
+    self, connection: sqlite3.Connection, member_id: int, guild_id: int
+  ) -> int:
+    row = connection.execute(
+      'SELECT rodmask FROM guildmember WHERE guildid = ? AND memberid = ?;',
       (guild_id, member_id),
-    )
-
-    rows = cursor.fetchall()
-    data = []
-
-    for dbrod in rows:
-      data.append(
-        Rod(
-          id=dbrod['id'],
-          name=dbrod['name'],
-          description=dbrod['description'],
-          value=dbrod['value'],
-          level_required=dbrod['levelrequired'],
-          xp_multiplier=dbrod['xpmultiplier'],
-          min_catch=dbrod['mincatch'],
-          max_catch=dbrod['maxcatch'],
-          line_break_chance=dbrod['linebreakchance'],
-        )
-      )
+    ).fetchone()
 
-    return data
+    return from_blob(row['rodmask']) if row is not None else 0
 
   def add_rod(self, member_id: int, guild_id: int, rod_id: int):
-    cursor = self.connection.cursor()
+    connection = self.router.connection(guild_id)
+
+    cursor = connection.cursor()
+
+    with connection:
+      cursor.execute(
+        """
+        INSERT OR IGNORE INTO memberrod (memberid, guildid, rodid) VALUES (?, ?, ?);
+      """,
+        (member_id, guild_id, rod_id),
+      )
 
-    cursor.execute("""
-      INSERT OR IGNORE INTO memberrod (memberid, guildid, rodid) VALUES (?, ?, ?);
-    """, (member_id, guild_id, rod_id))
+      row = cursor.execute(
+        'SELECT rodmask FROM guildmember WHERE guildid = ? AND memberid = ?;',
+        (guild_id, member_id),
+      ).fetchone()
 
-    self.connection.commit()
+      if row is not None:
+        cursor.execute(
+          'UPDATE guildmember SET rodmask = ? WHERE guildid = ? AND memberid = ?;',
+          (to_blob(set_bit(from_blob(row['rodmask']), rod_id)), guild_id, member_id),
+        )
 
   def equip_rod(self, member_id: int, guild_id: int, rod_id: int):
-    cursor = self.connection.cursor()
+    connection = self.router.connection(guild_id)
 
-    cursor.execute("""
+    cursor = connection.cursor()
+
+    cursor.execute(
+      """
       UPDATE guildmember SET rodid = ? WHERE memberid = ? AND guildid = ?;
-    """, (rod_id, member_id, guild_id))
+    """,
+      (rod_id, member_id, guild_id),
+    )
 
-    self.connection.commit()
+    connection.commit()
 
   def update_user(self, guild_id: int, member_id: int, user: FUser) -> None:
-    query = """
-      UPDATE guildmember
-      SET
-        coins = ?,
-        xp = ?,
-        xpstep = ?,
-        xpnext = ?,
-        level = ?,
-        lastclaimed = ?,
-        fishingcooldown = ?
-      WHERE guildid = ? AND memberid = ?;
     """
-    params = (
-      user.coins,
-      user.xp,
-      user.xp_step,
-      user.xp_next,
-      user.level,
-      user.lastclaimed.strftime('%Y-%m-%d %H:%M:%S'),
-      user.fishing_cooldown,
-      guild_id,
-      member_id,
-    )
+    Writes only what changed on the user since it was loaded: coins and XP as a ledger entry of deltas,
+    everything else in place.
+    """
+    deltas = user.deltas()
+    changes = user.changes()
+
+    connection = self.router.connection(guild_id)
+
+    with connection:
+      if deltas:
+        columns = ', '.join(deltas)
+        placeholders = ', '.join('?' * len(deltas))
+        connection.execute(
+          f'INSERT INTO ledger (guildid, memberid, {columns}) VALUES (?, ?, {placeholders});',
+          (guild_id, member_id, *deltas.values()),
+        )
 
-    with self.connection:
-      self.connection.execute(query, params)
+      if changes:
+        if 'lastclaimed' in changes:
+          changes['lastclaimed'] = to_epoch(changes['lastclaimed'])
+        assignments = ', '.join(f'{column} = ?' for column in changes)
+        connection.execute(
+          f'UPDATE guildmember SET {assignments} WHERE guildid = ? AND memberid = ?;',
+          (*changes.values(), guild_id, member_id),
+        )
+
+    user.mark_clean()
+
+  def spend_coins(self, guild_id: int, member_id: int, amount: int) -> Optional[int]:
+    """
+    Takes `amount` coins if the member has that many right now, checked and written in one statement so
+    nothing can spend them in between. Returns the coins left, or None if there were not enough.
+    """
+    connection = self.router.connection(guild_id)
+
+    with connection:
+      cursor = connection.execute(
+        """
+        INSERT INTO ledger (guildid, memberid, coins)
+        SELECT ?, ?, -? FROM guildmember gm
+        WHERE gm.guildid = ? AND gm.memberid = ? AND gm.coins + (
+          SELECT IFNULL(SUM(coins), 0) FROM ledger
+          WHERE guildid = gm.guildid AND memberid = gm.memberid AND applied = 0
+        ) >= ?;
+      """,
+        (guild_id, member_id, amount, guild_id, member_id, amount),
+      )
+      if cursor.rowcount == 0:
+        return None
+
+    user = self._load_user(connection, guild_id, member_id)
+    return user.coins if user is not None else None
@@ -6,14 +6,20 @@ from models.area import Area
 from models.fish import Fish
 from models.rarity import Rarity
 from models.rod import Rod
-from services.fish_service import FishService
-from util.weighted_random import WeightedRandom
+from services.fish_service import FishCatalog, FishService
+from util.bitset import set_bit, to_blob
+from util.json_stream import batched, iter_array
 
 import logging
 
+from typing import Callable
+
 
 LOGGER = logging.getLogger('FisherCat.DatabaseInitialisation')
 
+# Layout of the tables, stored in PRAGMA user_version. Older databases are upgraded with tools.migrate_schema.
+SCHEMA_VERSION = 2
+
 
 def drop_tables(conn: sqlite3.Connection) -> bool:
   """
@@ -37,10 +43,37 @@ def drop_tables(conn: sqlite3.Connection) -> bool:
     conn.commit()
     return True
   except sqlite3.Error as e:
-    LOGGER.error(f'Failed to drop tables: {e}')
+    LOGGER.error('Failed to drop tables: %s', e)
     return False
 
 
+def table_exists(conn: sqlite3.Connection, table: str) -> bool:
+  return (
+    conn.execute(
+      "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?;", (table,)
+    ).fetchone()
+    is not None
+  )
+
+
+def check_schema_version(conn: sqlite3.Connection, created: bool) -> None:
+  """
+  Marks freshly created tables with the current schema version, and warns about databases that still need migrating.
+  """
+  if created:
+    conn.execute(f'PRAGMA main.user_version = {SCHEMA_VERSION};')
+    return
+
+  # Databases from before the version was tracked report 0.
+  version = conn.execute('PRAGMA main.user_version;').fetchone()[0] or 1
+  if version < SCHEMA_VERSION:
+    LOGGER.warning(
+      'Database is on schema v%s, run tools.migrate_schema to upgrade it to v%s.',
+      version,
+      SCHEMA_VERSION,
+    )
+
+
 def initialize_database(conn: sqlite3.Connection) -> bool:
   if not conn:
     LOGGER.error('No connection provided.')
@@ -49,6 +82,8 @@ def initialize_database(conn: sqlite3.Connection) -> bool:
   try:
     cursor = conn.cursor()
 
+    created = not table_exists(conn, 'fish')
+
     cursor.execute('PRAGMA foreign_keys = ON;')
 
     cursor.execute("""
@@ -70,7 +105,7 @@ def initialize_database(conn: sqlite3.Connection) -> bool:
             xp INTEGER NOR NULL,
             rarity INTEGER NOT NULL,
             odds INTEGER NOT NULL,
-            area TEXT NOT NULL,
+            area INTEGER NOT NULL,
             base_value INTEGER NOT NULL
         );
     """)
@@ -100,7 +135,7 @@ def initialize_database(conn: sqlite3.Connection) -> bool:
           PRIMARY KEY (guildid, memberid, rodid),
           FOREIGN KEY (guildid, memberid) REFERENCES guildmember(guildid, memberid) ON DELETE CASCADE,
           FOREIGN KEY (rodid) REFERENCES rod(id) ON DELETE CASCADE
-      );
+      ) WITHOUT ROWID;
     """)
 
     cursor.execute("""
@@ -117,17 +152,19 @@ def initialize_database(conn: sqlite3.Connection) -> bool:
 
             level INTEGER DEFAULT 1,
 
-            lastclaimed TEXT DEFAULT '1970-01-01 02:00:00',
+            lastclaimed INTEGER DEFAULT 0,
 
             fishingcooldown INTEGER DEFAULT 15,
 
+            rodmask BLOB NOT NULL DEFAULT X'02',
+
             PRIMARY KEY (guildid, memberid),
 
             FOREIGN KEY (guildid) REFERENCES guild(id) ON DELETE CASCADE,
             FOREIGN KEY (memberid) REFERENCES member(id) ON DELETE CASCADE,
 
             FOREIGN KEY (rodid) REFERENCES rod(id) ON DELETE CASCADE
-        );
+        ) WITHOUT ROWID;
     """)
 
     cursor.execute("""
@@ -140,189 +177,395 @@ def initialize_database(conn: sqlite3.Connection) -> bool:
           PRIMARY KEY (guildid, memberid, fishid),
           FOREIGN KEY (guildid, memberid) REFERENCES guildmember(guildid, memberid) ON DELETE CASCADE,
           FOREIGN KEY (fishid) REFERENCES fish(id) ON DELETE CASCADE
+      ) WITHOUT ROWID;
+    """)
+
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS ledger (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          guildid INTEGER NOT NULL,
+          memberid INTEGER NOT NULL,
+
+          coins INTEGER NOT NULL DEFAULT 0,
+          xp INTEGER NOT NULL DEFAULT 0,
+          xpstep INTEGER NOT NULL DEFAULT 0,
+          xpnext INTEGER NOT NULL DEFAULT 0,
+          level INTEGER NOT NULL DEFAULT 0,
+
+          fishid INTEGER,
+          amount INTEGER NOT NULL DEFAULT 0,
+
+          created INTEGER DEFAULT (unixepoch()),
+          applied INTEGER NOT NULL DEFAULT 0
       );
     """)
 
+    cursor.execute("""
+      CREATE INDEX IF NOT EXISTS ledger_pending ON ledger (guildid, memberid) WHERE applied = 0;
+    """)
+
     conn.commit()
+    check_schema_version(conn, created)
     LOGGER.info('Tables created successfully.')
     return True
 
   except sqlite3.Error as e:
-    LOGGER.error(f'Could not create default tables: {e}')
+    LOGGER.error('Could not create default tables: %s', e)
     return False
 
 
-def import_fish(conn: sqlite3.Connection, fish_service: FishService):
+def initialize_shard(conn: sqlite3.Connection) -> bool:
+  """
+  Creates the per-guild tables in a shard database if they are missing. Catalog tables are reached through
+  the attached catalog, so foreign keys only point at tables inside the shard.
+  """
   if not conn:
     LOGGER.error('No connection provided.')
     return False
 
   try:
-    with open('./data/fish.json', 'r') as f:
-      fish_data = json.load(f)
-  except FileNotFoundError:
-    LOGGER.error('fish.json not found.')
-    return False
+    cursor = conn.cursor()
 
-  cursor = conn.cursor()
+    created = not table_exists(conn, 'guildmember')
 
-  try:
-    for f in fish_data['fish_data']:
-      cursor.execute(
-        """
-        INSERT INTO fish (name, xp, rarity, odds, area, base_value)
-        VALUES (?, ?, ?, ?, ?, ?);
-      """,
-        (f['name'], f['xp'], f['rarity'], f['odds'], f['area'], f['base_value']),
-      )
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS main.guildmember (
+            guildid INTEGER NOT NULL,
+            memberid INTEGER NOT NULL,
+            rodid INTEGER NOT NULL DEFAULT 1,
 
-      generated_id = cursor.lastrowid
-      if generated_id is None:
-        return False
-
-      fish = Fish(
-        id=generated_id,
-        name=f['name'],
-        xp=f['xp'],
-        rarity=Rarity[f['rarity']],
-        odds=f['odds'],
-        area=Area[f['area']],
-        base_value=f['base_value'],
-      )
+            coins INTEGER DEFAULT 0,
 
-      fish_service.fish.append(fish)
+            xp INTEGER DEFAULT 0,
+            xpstep INTEGER DEFAULT 1,
+            xpnext INTEGER DEFAULT 30,
+
+            level INTEGER DEFAULT 1,
+
+            lastclaimed INTEGER DEFAULT 0,
+
+            fishingcooldown INTEGER DEFAULT 15,
+
+            rodmask BLOB NOT NULL DEFAULT X'02',
+
+            PRIMARY KEY (guildid, memberid)
+        ) WITHOUT ROWID;
+    """)
+
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS main.memberrod (
+          guildid INTEGER NOT NULL,
+          memberid INTEGER NOT NULL,
+          rodid INTEGER NOT NULL,
+          PRIMARY KEY (guildid, memberid, rodid),
+          FOREIGN KEY (guildid, memberid) REFERENCES guildmember(guildid, memberid) ON DELETE CASCADE
+      ) WITHOUT ROWID;
+    """)
+
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS main.inventory (
+          guildid INTEGER NOT NULL,
+          memberid INTEGER NOT NULL,
+          fishid INTEGER NOT NULL,
+          amount INTEGER DEFAULT 0,
+
+          PRIMARY KEY (guildid, memberid, fishid),
+          FOREIGN KEY (guildid, memberid) REFERENCES guildmember(guildid, memberid) ON DELETE CASCADE
+      ) WITHOUT ROWID;
+    """)
+
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS main.ledger (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          guildid INTEGER NOT NULL,
+          memberid INTEGER NOT NULL,
+
+          coins INTEGER NOT NULL DEFAULT 0,
+          xp INTEGER NOT NULL DEFAULT 0,
+          xpstep INTEGER NOT NULL DEFAULT 0,
+          xpnext INTEGER NOT NULL DEFAULT 0,
+          level INTEGER NOT NULL DEFAULT 0,
+
+          fishid INTEGER,
+          amount INTEGER NOT NULL DEFAULT 0,
+
+          created INTEGER DEFAULT (unixepoch()),
+          applied INTEGER NOT NULL DEFAULT 0
+      );
+    """)
+
+    cursor.execute("""
+      CREATE INDEX IF NOT EXISTS main.ledger_pending ON ledger (guildid, memberid) WHERE applied = 0;
+    """)
+
+    # Every entry of a member, applied or not, for deleting them when they are purged.
+    cursor.execute("""
+      CREATE INDEX IF NOT EXISTS main.ledger_member ON ledger (guildid, memberid);
+    """)
+
+    create_catch_tables(cursor)
+
+    # Guilds the bot left (memberid 0) and members who left a guild, see services/purge.py.
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS main.departure (
+          guildid INTEGER NOT NULL,
+          memberid INTEGER NOT NULL,
+          departed INTEGER NOT NULL DEFAULT (unixepoch()),
+
+          PRIMARY KEY (guildid, memberid)
+      ) WITHOUT ROWID;
+    """)
+
+    columns = [row[1] for row in cursor.execute('PRAGMA main.table_info(guildmember);')]
+    if 'rodmask' not in columns:
+      add_rod_masks(conn)
 
-      fish_area: WeightedRandom = getattr(fish_service, fish.area.name)
-      try:
-        fish_area.add(fish, 1 / fish.odds)
-      except ValueError as e:
-        LOGGER.error(
-          f'Failed adding fish {fish.name} (1/{fish.odds}) to {fish.area.name}: {e}'
-        )
-        sys.exit(1)
     conn.commit()
-    LOGGER.info(f'Successfully imported {len(fish_data["fish_data"])} fish.')
+    check_schema_version(conn, created)
     return True
 
   except sqlite3.Error as e:
-    LOGGER.error(f'Database error during import: {e}')
-    return False
-  except KeyError as e:
-    LOGGER.error(f'JSON Data Error: Missing key {e}')
+    LOGGER.error('Could not create shard tables: %s', e)
     return False
 
 
-def load_existing_fish(conn: sqlite3.Connection, fish_service: FishService) -> bool:
-  if not conn:
-    LOGGER.error('No connection provided.')
-    return False
+def create_catch_tables(cursor: sqlite3.Cursor) -> None:
+  """
+  The catch history and its hourly and daily totals, see services/catch_log.py.
+  """
+  cursor.execute("""
+    CREATE TABLE IF NOT EXISTS main.catch (
+        id INTEGER PRIMARY KEY,
+        guildid INTEGER NOT NULL,
+        memberid INTEGER NOT NULL,
+        fishid INTEGER NOT NULL,
+        area INTEGER NOT NULL,
+        rarity INTEGER NOT NULL,
+        amount INTEGER NOT NULL,
+        caught INTEGER NOT NULL
+    );
+  """)
+
+  cursor.execute("""
+    CREATE INDEX IF NOT EXISTS main.catch_caught ON catch (caught);
+  """)
+
+  cursor.execute("""
+    CREATE INDEX IF NOT EXISTS main.catch_member ON catch (guildid, memberid);
+  """)
+
+  for table in ('catch_hourly', 'catch_daily'):
+    cursor.execute(f"""
+      CREATE TABLE IF NOT EXISTS main.{table} (
+          guildid INTEGER NOT NULL,
+          bucket INTEGER NOT NULL,
+          area INTEGER NOT NULL,
+          fishid INTEGER NOT NULL,
+          rarity INTEGER NOT NULL,
+          amount INTEGER NOT NULL DEFAULT 0,
 
-  cursor = conn.cursor()
+          PRIMARY KEY (guildid, bucket, area, fishid)
+      ) WITHOUT ROWID;
+    """)
 
-  try:
-    cursor.execute('SELECT id, name, xp, rarity, odds, area, base_value FROM fish')
-    rows = cursor.fetchall()
+    cursor.execute(f"""
+      CREATE INDEX IF NOT EXISTS main.{table}_bucket ON {table} (bucket);
+    """)
 
-    count = 0
-    for row in rows:
-      db_id, name, xp, rarity_str, odds, area_str, base_value = row
 
-      fish = Fish(
-        id=db_id,
-        name=name,
-        xp=xp,
-        rarity=Rarity[rarity_str],
-        odds=odds,
-        area=Area[area_str],
-        base_value=base_value,
-      )
+def add_rod_masks(conn: sqlite3.Connection) -> None:
+  """
+  Adds the rodmask column to a shard created before it existed, and fills it from memberrod.
+  """
+  cursor = conn.cursor()
+  cursor.execute(
+    "ALTER TABLE main.guildmember ADD COLUMN rodmask BLOB NOT NULL DEFAULT X'02';"
+  )
 
-      fish_service.fish.append(fish)
+  masks: dict[tuple[int, int], int] = {}
+  for row in cursor.execute('SELECT guildid, memberid, rodid FROM main.memberrod;'):
+    key = (row[0], row[1])
+    masks[key] = set_bit(masks.get(key, 0), row[2])
 
-      if hasattr(fish_service, fish.area.name):
-        fish_area: WeightedRandom = getattr(fish_service, fish.area.name)
+  cursor.executemany(
+    'UPDATE main.guildmember SET rodmask = ? WHERE guildid = ? AND memberid = ?;',
+    (
+      (to_blob(mask), guild_id, member_id)
+      for (guild_id, member_id), mask in masks.items()
+    ),
+  )
 
-        try:
-          fish_area.add(fish, 1 / fish.odds)
-        except ValueError as e:
-          LOGGER.error(
-            f'Failed adding fish {fish.name} (1/{fish.odds}) to {fish.area.name}: {e}'
-          )
-          sys.exit(1)
-      else:
-        LOGGER.warning(f"FishService missing area attribute '{fish.area.name}'")
+  LOGGER.info('Added rod masks for %s members.', len(masks))
 
-      count += 1
 
-    LOGGER.info(f'Successfully loaded {count} fish from database into memory.')
-    return True
+def fish_values(f: dict) -> tuple:
+  """
+  Checks one fish.json entry and turns it into a row for the fish table. Raises KeyError or ValueError.
+  """
+  if f['odds'] <= 0:
+    raise ValueError(f'{f["name"]} has odds of {f["odds"]}')
+
+  return (
+    f['name'],
+    f['xp'],
+    Rarity[f['rarity']].value,
+    f['odds'],
+    Area[f['area']].value,
+    f['base_value'],
+  )
+
 
+def rod_values(r: dict) -> tuple:
+  """
+  Checks one rods.json entry and turns it into a row for the rod table. Raises KeyError or ValueError.
+  """
+  if r['line_break_chance'] <= 0 or r['min_catch'] > r['max_catch']:
+    raise ValueError(f'{r["name"]} has an invalid catch range or break chance')
+
+  return (
+    r['name'],
+    r['description'],
+    r['value'],
+    r['level_required'],
+    r['xp_multiplier'],
+    r['min_catch'],
+    r['max_catch'],
+    r['line_break_chance'],
+  )
+
+
+def stream_rows(
+  conn: sqlite3.Connection,
+  path: str,
+  key: str,
+  sql: str,
+  to_row: Callable[[dict], tuple],
+  batch_size: int,
+) -> int | None:
+  """
+  Reads the array under `key` in `path` a batch at a time, checks every entry with `to_row` and inserts
+  the batch with executemany. Everything goes in one transaction, so a bad entry halfway through leaves
+  nothing behind. Returns the number of rows inserted, or None if it failed.
+  """
+  count = 0
+  try:
+    with open(path, 'r') as f, conn:
+      for batch in batched(iter_array(f, key), batch_size):
+        conn.executemany(sql, [to_row(entry) for entry in batch])
+        count += len(batch)
+  except FileNotFoundError:
+    LOGGER.error('%s not found.', path)
+    return None
+  except json.JSONDecodeError as e:
+    LOGGER.error('Could not read %s: %s', path, e)
+    return None
   except sqlite3.Error as e:
-    LOGGER.error(f'Database error during fish load: {e}')
-    return False
+    LOGGER.error('Database error during import: %s', e)
+    return None
   except KeyError as e:
-    LOGGER.error(f'Enum Conversion Error: Database contains invalid key {e}')
-    return False
+    LOGGER.error('JSON Data Error: Missing key %s', e)
+    return None
+  except ValueError as e:
+    LOGGER.error('Invalid catalog entry: %s', e)
+    return None
+
+  return count
 
 
-def import_rods(conn: sqlite3.Connection, fish_service: FishService) -> bool:
+def import_fish(
+  conn: sqlite3.Connection,
+  fish_service: FishService,
+  path: str = './data/fish.json',
+  batch_size: int = 1000,
+) -> bool:
   if not conn:
     LOGGER.error('No connection provided.')
     return False
 
-  try:
-    with open('./data/rods.json', 'r') as f:
-      rod_data = json.load(f)
-  except FileNotFoundError:
-    LOGGER.error('rods.json not found.')
+  count = stream_rows(
+    conn,
+    path,
+    'fish_data',
+    """
+    INSERT INTO fish (name, xp, rarity, odds, area, base_value)
+    VALUES (?, ?, ?, ?, ?, ?);
+  """,
+    fish_values,
+    batch_size,
+  )
+  if count is None:
     return False
 
-  cursor = conn.cursor()
+  LOGGER.info('Successfully imported %s fish.', count)
+  # The ids are only known once the rows are in, so the catalog is built from the table.
+  return load_existing_fish(conn, fish_service)
+
+
+def load_existing_fish(conn: sqlite3.Connection, fish_service: FishService) -> bool:
+  if not conn:
+    LOGGER.error('No connection provided.')
+    return False
 
   try:
-    for r in rod_data['rod_data']:
-      cursor.execute(
-        """
-        INSERT INTO rod (name, description, value, levelrequired, xpmultiplier, mincatch, maxcatch, linebreakchance)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-      """,
-        (
-          r['name'],
-          r['description'],
-          r['value'],
-          r['level_required'],
-          r['xp_multiplier'],
-          r['min_catch'],
-          r['max_catch'],
-          r['line_break_chance'],
-        ),
+    fish = [
+      Fish(
+        id=db_id,
+        name=name,
+        xp=xp,
+        rarity=Rarity.decode(rarity),
+        odds=odds,
+        area=Area.decode(area),
+        base_value=base_value,
       )
+      for db_id, name, xp, rarity, odds, area, base_value in conn.execute(
+        'SELECT id, name, xp, rarity, odds, area, base_value FROM fish'
+      )
+    ]
+  except sqlite3.Error as e:
+    LOGGER.error('Database error during fish load: %s', e)
+    return False
+  except (KeyError, ValueError) as e:
+    LOGGER.error('Enum Conversion Error: Database contains invalid key %s', e)
+    return False
 
-      generated_id = cursor.lastrowid
-      if generated_id is None:
-        return False
+  try:
+    # Samplers are built in one pass over the whole list.
+    fish_service.swap(FishCatalog(fish=fish, rods=fish_service.rods))
+  except (ValueError, ZeroDivisionError) as e:
+    LOGGER.error('Database contains fish with invalid odds: %s', e)
+    return False
 
-      fish_service.rods.append(
-        Rod(
-          id=generated_id,
-          name=r['name'],
-          description=r['description'],
-          value=r['value'],
-          level_required=r['level_required'],
-          xp_multiplier=r['xp_multiplier'],
-          max_catch=r['max_catch'],
-          min_catch=r['min_catch'],
-          line_break_chance=r['line_break_chance'],
-        )
-      )
+  LOGGER.info('Successfully loaded %s fish from database into memory.', len(fish))
+  return True
 
-    conn.commit()
-    LOGGER.info(f'Sucessfully imported {len(rod_data["rod_data"])} rods.')
-    return True
-  except sqlite3.Error as e:
-    LOGGER.error(f'Database error rod during load: {e}')
+
+def import_rods(
+  conn: sqlite3.Connection,
+  fish_service: FishService,
+  path: str = './data/rods.json',
+  batch_size: int = 1000,
+) -> bool:
+  if not conn:
+    LOGGER.error('No connection provided.')
     return False
 
+  count = stream_rows(
+    conn,
+    path,
+    'rod_data',
+    """
+    INSERT INTO rod (name, description, value, levelrequired, xpmultiplier, mincatch, maxcatch, linebreakchance)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+  """,
+    rod_values,
+    batch_size,
+  )
+  if count is None:
+    return False
+
+  LOGGER.info('Sucessfully imported %s rods.', count)
+  return load_existing_rods(conn, fish_service)
+
 
 def load_existing_rods(conn: sqlite3.Connection, fish_service: FishService):
   if not conn:
@@ -366,9 +609,145 @@ def load_existing_rods(conn: sqlite3.Connection, fish_service: FishService):
 
       count += 1
 
-    LOGGER.info(f'Sucessfully imported {count} rods.')
+    LOGGER.info('Sucessfully imported %s rods.', count)
     return True
 
   except sqlite3.Error as e:
-    LOGGER.error(f'Error importing rods: {e}')
+    LOGGER.error('Error importing rods: %s', e)
     return False
+
+
+def sync_catalog(
+  conn: sqlite3.Connection,
+  fish_path: str = './data/fish.json',
+  rod_path: str = './data/rods.json',
+) -> FishCatalog | None:
+  """
+  Writes the fish and rods from the data files into the database, matching existing rows by name,
+  and builds a new catalog from them. Fish and rods missing from the files stay in the database so
+  inventories keep working, but are left out of the catalog.
+  """
+  if not conn:
+    LOGGER.error('No connection provided.')
+    return None
+
+  try:
+    with open(fish_path, 'r') as f:
+      fish_data = json.load(f)['fish_data']
+    with open(rod_path, 'r') as f:
+      rod_data = json.load(f)['rod_data']
+  except (FileNotFoundError, json.JSONDecodeError, KeyError) as e:
+    LOGGER.error('Could not read catalog files: %s', e)
+    return None
+
+  # Check everything up front so a bad entry never leaves the database half updated.
+  try:
+    for f in fish_data:
+      fish_values(f)
+    for r in rod_data:
+      rod_values(r)
+  except (KeyError, ValueError) as e:
+    LOGGER.error('Invalid catalog entry: %s', e)
+    return None
+
+  try:
+    with conn:
+      for f in fish_data:
+        values = (
+          f['xp'],
+          Rarity[f['rarity']].value,
+          f['odds'],
+          Area[f['area']].value,
+          f['base_value'],
+          f['name'],
+        )
+        cursor = conn.execute(
+          """
+          UPDATE fish SET xp = ?, rarity = ?, odds = ?, area = ?, base_value = ?
+          WHERE name = ?;
+        """,
+          values,
+        )
+        if cursor.rowcount == 0:
+          conn.execute(
+            """
+            INSERT INTO fish (xp, rarity, odds, area, base_value, name)
+            VALUES (?, ?, ?, ?, ?, ?);
+          """,
+            values,
+          )
+
+      for r in rod_data:
+        values = (
+          r['description'],
+          r['value'],
+          r['level_required'],
+          r['xp_multiplier'],
+          r['min_catch'],
+          r['max_catch'],
+          r['line_break_chance'],
+          r['name'],
+        )
+        cursor = conn.execute(
+          """
+          UPDATE rod SET
+            description = ?, value = ?, levelrequired = ?, xpmultiplier = ?,
+            mincatch = ?, maxcatch = ?, linebreakchance = ?
+          WHERE name = ?;
+        """,
+          values,
+        )
+        if cursor.rowcount == 0:
+          conn.execute(
+            """
+            INSERT INTO rod (description, value, levelrequired, xpmultiplier, mincatch, maxcatch, linebreakchance, name)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+          """,
+            values,
+          )
+
+    fish_ids = {
+      row[1]: row[0]
+      for row in conn.execute('SELECT MIN(id), name FROM fish GROUP BY name')
+    }
+    rod_ids = {
+      row[1]: row[0]
+      for row in conn.execute('SELECT MIN(id), name FROM rod GROUP BY name')
+    }
+
+    catalog = FishCatalog(
+      fish=[
+        Fish(
+          id=fish_ids[f['name']],
+          name=f['name'],
+          xp=f['xp'],
+          rarity=Rarity[f['rarity']],
+          odds=f['odds'],
+          area=Area[f['area']],
+          base_value=f['base_value'],
+        )
+        for f in fish_data
+      ],
+      rods=[
+        Rod(
+          id=rod_ids[r['name']],
+          name=r['name'],
+          description=r['description'],
+          value=r['value'],
+          level_required=r['level_required'],
+          xp_multiplier=r['xp_multiplier'],
+          max_catch=r['max_catch'],
+          min_catch=r['min_catch'],
+          line_break_chance=r['line_break_chance'],
+        )
+        for r in rod_data
+      ],
+    )
+  except sqlite3.Error as e:
+    LOGGER.error('Database error during catalog sync: %s', e)
+    return None
+
+  LOGGER.info(
+    'Synced catalog with %s fish and %s rods.', len(catalog.fish), len(catalog.rods)
+  )
+  return catalog
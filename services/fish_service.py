@@ -1,11 +1,103 @@
+from typing import Dict, List, Optional
+
 from models.area import Area
+from models.fish import Fish
+from models.rod import Rod
+from util.trigram_index import TrigramIndex
 from util.weighted_random import WeightedRandom
 
 
+class FishCatalog:
+  """
+  One version of the fish and rod lists, with a sampler per area and a name index for lookups.
+  The lists are never changed once a catalog is live; reloading builds a new one and swaps it in.
+  Only the chances change, through reweight.
+  """
+
+  def __init__(self, fish: List[Fish] | None = None, rods: List[Rod] | None = None):
+    self.fish: List[Fish] = list(fish) if fish is not None else []
+    self.rods: List[Rod] = rods if rods is not None else []
+    self.index = TrigramIndex()
+    self.by_id: Dict[int, Fish] = {}
+
+    # Samplers are built from whole lists at once, add_fish is for growing a catalog one fish at a time.
+    by_area: Dict[Area, List[Fish]] = {area: [] for area in Area}
+    for f in self.fish:
+      by_area[f.area].append(f)
+      self.index.add(f.name, f)
+      self.by_id[f.id] = f
+
+    self.samplers: Dict[Area, WeightedRandom] = {
+      area: WeightedRandom.from_items((f, 1 / f.odds) for f in fish)
+      for area, fish in by_area.items()
+    }
+
+  def add_fish(self, fish: Fish) -> None:
+    self.samplers[fish.area].add(fish, 1 / fish.odds)
+    self.index.add(fish.name, fish)
+    self.by_id[fish.id] = fish
+    self.fish.append(fish)
+
+  def reweight(self, factors: Dict[int, float]) -> None:
+    """
+    Sets the chance of every fish in `factors` (by id) to its base chance, 1 / odds, times its factor.
+    Each one is an O(log n) update of its area's sampler, fish that are not mentioned keep their chance.
+    """
+    for fish_id, factor in factors.items():
+      fish = self.by_id.get(fish_id)
+      if fish is None:
+        continue
+
+      sampler = self.samplers[fish.area]
+      sampler.set_weight(sampler.index(fish), factor / fish.odds)
+
+  def sampler(self, area: Area) -> WeightedRandom:
+    return self.samplers[area]
+
+  def rod(self, rod_id: int) -> Optional[Rod]:
+    # A handful of rods, and they are appended to while loading, a scan beats keeping an index in sync.
+    return next((rod for rod in self.rods if rod.id == rod_id), None)
+
+
 class FishService:
   def __init__(self):
-    self.fish = []
-    self.rods = []
+    self.catalog = FishCatalog()
+    # Fish id -> factor on its chance, for events and the like. Kept here so they outlive a reload.
+    self.modifiers: Dict[int, float] = {}
+
+  @property
+  def fish(self) -> List[Fish]:
+    return self.catalog.fish
+
+  @property
+  def rods(self) -> List[Rod]:
+    return self.catalog.rods
+
+  def __getattr__(self, name: str) -> WeightedRandom:
+    # Area samplers used to be attributes named after the area, e.g. `fish_service.lake`.
+    if name in Area.__members__:
+      return self.catalog.sampler(Area[name])
+
+    raise AttributeError(name)
+
+  def swap(self, catalog: FishCatalog) -> FishCatalog:
+    """
+    Makes `catalog` the live catalog and returns the old one. Anything still holding the old catalog
+    keeps using it until it is done.
+    """
+    catalog.reweight(self.modifiers)
+    old, self.catalog = self.catalog, catalog
+    return old
+
+  def reweight(self, factors: Dict[int, float]) -> None:
+    """
+    Applies `factors` to the live catalog and to every catalog swapped in after it. A factor of 1
+    puts a fish back to its normal chance.
+    """
+    for fish_id, factor in factors.items():
+      if factor == 1:
+        self.modifiers.pop(fish_id, None)
+      else:
+        self.modifiers[fish_id] = factor
 
-    for area in Area:
-      setattr(self, area.name, WeightedRandom())
+    self.catalog.reweight(factors)
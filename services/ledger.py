@@ -0,0 +1,77 @@
+import sqlite3
+import logging
+
+LOGGER = logging.getLogger('FisherCat.Ledger')
+
+
+def compact_ledger(conn: sqlite3.Connection, batch_size: int = 1000) -> int:
+  """
+  Folds one batch of unapplied ledger entries into the guildmember and inventory snapshots.
+
+  Entries are marked as applied instead of deleted, so the ledger doubles as an audit trail.
+  Returns how many entries were folded in; call it again until it returns 0.
+  """
+  with conn:
+    row = conn.execute(
+      """
+      SELECT MAX(id) FROM (
+        SELECT id FROM ledger WHERE applied = 0 ORDER BY id LIMIT ?
+      );
+    """,
+      (batch_size,),
+    ).fetchone()
+
+    last_id = row[0]
+    if last_id is None:
+      return 0
+
+    conn.execute(
+      """
+      UPDATE guildmember
+      SET
+        coins = guildmember.coins + d.coins,
+        xp = guildmember.xp + d.xp,
+        xpstep = guildmember.xpstep + d.xpstep,
+        xpnext = guildmember.xpnext + d.xpnext,
+        level = guildmember.level + d.level
+      FROM (
+        SELECT
+          guildid, memberid,
+          SUM(coins) AS coins, SUM(xp) AS xp, SUM(xpstep) AS xpstep,
+          SUM(xpnext) AS xpnext, SUM(level) AS level
+        FROM ledger
+        WHERE applied = 0 AND id <= ? AND fishid IS NULL
+        GROUP BY guildid, memberid
+      ) AS d
+      WHERE guildmember.guildid = d.guildid AND guildmember.memberid = d.memberid;
+    """,
+      (last_id,),
+    )
+
+    conn.execute(
+      """
+      INSERT INTO inventory (guildid, memberid, fishid, amount)
+      SELECT guildid, memberid, fishid, SUM(amount) FROM ledger
+      WHERE applied = 0 AND id <= ? AND fishid IS NOT NULL
+      GROUP BY guildid, memberid, fishid
+      ON CONFLICT(guildid, memberid, fishid) DO UPDATE SET amount = amount + excluded.amount;
+    """,
+      (last_id,),
+    )
+
+    conn.execute(
+      """
+      DELETE FROM inventory
+      WHERE amount <= 0 AND (guildid, memberid, fishid) IN (
+        SELECT guildid, memberid, fishid FROM ledger
+        WHERE applied = 0 AND id <= ? AND fishid IS NOT NULL
+      );
+    """,
+      (last_id,),
+    )
+
+    cursor = conn.execute(
+      'UPDATE ledger SET applied = 1 WHERE applied = 0 AND id <= ?;', (last_id,)
+    )
+
+  return cursor.rowcount
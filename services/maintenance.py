@@ -0,0 +1,216 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from services.metrics import Metrics
+from services.shard_router import ShardRouter
+
+LOGGER = logging.getLogger('FisherCat.Maintenance')
+
+# Checkpoint goes last, in WAL mode the pages vacuum frees only leave the file once they are checkpointed.
+JOBS = ('analyze', 'vacuum', 'check', 'checkpoint')
+
+AUTO_VACUUM_MODES = {0: 'off', 1: 'full', 2: 'incremental'}
+
+
+def database_size(path: str) -> int:
+  """
+  Size of a database on disk, its WAL included.
+  """
+  size = 0
+  for file in (path, f'{path}-wal'):
+    try:
+      size += os.path.getsize(file)
+    except FileNotFoundError:
+      pass
+  return size
+
+
+def user_tables(conn: sqlite3.Connection) -> List[str]:
+  return [
+    row[0]
+    for row in conn.execute(
+      "SELECT name FROM main.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )
+  ]
+
+
+class MaintenanceService:
+  """
+  Keeps the catalog and every shard healthy: checkpoints and truncates the WAL, refreshes the planner's
+  statistics, hands free pages back to the filesystem and checks every table for corruption.
+
+  Every job works in small steps (one table, or `vacuum_pages` pages, at a time) with a pause in between,
+  so the bot's writer only ever waits for one step. Everything here blocks, run it on a worker thread.
+  """
+
+  def __init__(
+    self,
+    router: ShardRouter,
+    metrics: Metrics,
+    vacuum_pages: int = 256,
+    analysis_limit: int = 1000,
+    pause: float = 0.05,
+  ):
+    self.router = router
+    self.metrics = metrics
+    self.vacuum_pages = vacuum_pages
+    self.analysis_limit = analysis_limit
+    self.pause = pause
+
+    self.lock = threading.Lock()
+
+    self.last_run: Optional[datetime] = None
+    self.last_report: List[str] = []
+
+  def connect(self, path: str) -> sqlite3.Connection:
+    # Autocommit, so every statement is its own short transaction.
+    return sqlite3.connect(path, timeout=1.0, isolation_level=None)
+
+  def checkpoint(self, conn: sqlite3.Connection) -> str:
+    # A passive checkpoint first does the copying without waiting on anyone, so the
+    # truncating one that follows has next to nothing left to do.
+    _, pages, done = conn.execute('PRAGMA wal_checkpoint(PASSIVE);').fetchone()
+    busy, _, _ = conn.execute('PRAGMA wal_checkpoint(TRUNCATE);').fetchone()
+    if busy:
+      # A reader is still on an old snapshot, the WAL is truncated next time.
+      return (
+        f'checkpointed {done}/{pages} WAL pages, readers kept it from being truncated'
+      )
+    return f'checkpointed {max(done, 0)} WAL pages and truncated the WAL'
+
+  def analyze(self, conn: sqlite3.Connection) -> str:
+    # Only looks at this many rows per index, so each ANALYZE stays short on big tables.
+    conn.execute(f'PRAGMA analysis_limit = {self.analysis_limit};')
+
+    tables = user_tables(conn)
+    for table in tables:
+      conn.execute(f'ANALYZE main."{table}";')
+      time.sleep(self.pause)
+
+    conn.execute('PRAGMA optimize;')
+    return f'analyzed {len(tables)} tables'
+
+  def vacuum(self, conn: sqlite3.Connection) -> str:
+    mode = conn.execute('PRAGMA auto_vacuum;').fetchone()[0]
+    free = conn.execute('PRAGMA freelist_count;').fetchone()[0]
+    if mode != 2:
+      return f'{free} free pages, auto_vacuum is {AUTO_VACUUM_MODES[mode]} so they stay until a full VACUUM'
+
+    released = 0
+    while free > 0:
+      conn.execute(f'PRAGMA incremental_vacuum({self.vacuum_pages});').fetchall()
+      remaining = conn.execute('PRAGMA freelist_count;').fetchone()[0]
+      if remaining >= free:
+        break
+      released += free - remaining
+      free = remaining
+      time.sleep(self.pause)
+
+    return f'released {released} free pages'
+
+  def check(self, conn: sqlite3.Connection) -> str:
+    problems = []
+    tables = user_tables(conn)
+    for table in tables:
+      for (result,) in conn.execute(f'PRAGMA main.quick_check("{table}");'):
+        if result != 'ok':
+          problems.append(result)
+      time.sleep(self.pause)
+
+    if problems:
+      self.metrics.increment('maintenance.problems', len(problems))
+      for problem in problems:
+        LOGGER.error('quick_check: %s', problem)
+      return f'found {len(problems)} problem(s): {problems[0]}'
+    return f'checked {len(tables)} tables, no problems'
+
+  def run(self, jobs: Iterable[str] = JOBS) -> List[str]:
+    """
+    Runs `jobs` on every database, in the order of JOBS. Returns a report, one line per job and database.
+    """
+    jobs = [job for job in JOBS if job in set(jobs)]
+
+    with self.lock:
+      started = time.perf_counter()
+      report = []
+      reclaimed = 0
+
+      for path in self.router.database_paths():
+        name = os.path.basename(path)
+        before = database_size(path)
+
+        conn = self.connect(path)
+        try:
+          for job in jobs:
+            job_started = time.perf_counter()
+            try:
+              result = getattr(self, job)(conn)
+            except sqlite3.Error as e:
+              self.metrics.increment('maintenance.failures')
+              LOGGER.warning('%s on %s failed: %s', job, name, e)
+              result = f'failed: {e}'
+            report.append(
+              f'{name} {job}: {result} ({time.perf_counter() - job_started:.2f}s)'
+            )
+        finally:
+          conn.close()
+
+        freed = before - database_size(path)
+        reclaimed += max(freed, 0)
+        report.append(
+          f'{name}: {before / 1024:.0f} KiB -> {(before - freed) / 1024:.0f} KiB'
+        )
+
+      elapsed = time.perf_counter() - started
+      report.append(f'Took {elapsed:.2f}s and reclaimed {reclaimed / 1024:.0f} KiB.')
+
+      self.metrics.increment('maintenance.runs')
+      self.metrics.increment('maintenance.reclaimed_bytes', reclaimed)
+      self.metrics.set_gauge('maintenance.last_seconds', elapsed)
+      LOGGER.info(
+        'Ran %s on %s database(s) in %.2fs, reclaimed %s bytes.',
+        ', '.join(jobs),
+        len(self.router.database_paths()),
+        elapsed,
+        reclaimed,
+      )
+
+      self.last_run = datetime.now()
+      self.last_report = report
+      return report
+
+  def status(self) -> List[str]:
+    """
+    Size, free pages and WAL size of every database, and when maintenance last ran.
+    """
+    lines = []
+    for path in self.router.database_paths():
+      conn = self.connect(path)
+      try:
+        page_size = conn.execute('PRAGMA page_size;').fetchone()[0]
+        pages = conn.execute('PRAGMA page_count;').fetchone()[0]
+        free = conn.execute('PRAGMA freelist_count;').fetchone()[0]
+        mode = conn.execute('PRAGMA auto_vacuum;').fetchone()[0]
+      finally:
+        conn.close()
+
+      wal = database_size(path) - os.path.getsize(path)
+      lines.append(
+        f'{os.path.basename(path)}: {pages * page_size / 1024:.0f} KiB, '
+        f'{free} free pages ({free * page_size / 1024:.0f} KiB), '
+        f'WAL {wal / 1024:.0f} KiB, auto_vacuum {AUTO_VACUUM_MODES[mode]}'
+      )
+
+    if self.last_run is None:
+      lines.append('Maintenance has not run yet.')
+    else:
+      lines.append(f'Last run {self.last_run:%Y-%m-%d %H:%M}:')
+      lines.extend(f'  {line}' for line in self.last_report)
+
+    return lines
@@ -0,0 +1,36 @@
+import threading
+
+from collections import Counter
+from typing import Dict
+
+
+class Metrics:
+  """
+  In-process counters and gauges. Safe to update from any thread.
+  """
+
+  def __init__(self):
+    self.counters: Counter[str] = Counter()
+    self.gauges: Dict[str, float] = {}
+
+    self._lock = threading.Lock()
+
+  def increment(self, name: str, amount: float = 1) -> None:
+    with self._lock:
+      self.counters[name] += amount
+
+  def set_gauge(self, name: str, value: float) -> None:
+    with self._lock:
+      self.gauges[name] = value
+
+  def max_gauge(self, name: str, value: float) -> None:
+    """
+    Keeps the largest value ever reported for a gauge.
+    """
+    with self._lock:
+      if value > self.gauges.get(name, float('-inf')):
+        self.gauges[name] = value
+
+  def snapshot(self) -> Dict[str, float]:
+    with self._lock:
+      return {**self.counters, **self.gauges}
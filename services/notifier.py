@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+
+import discord
+
+from typing import Dict, List, Tuple
+
+from services.metrics import Metrics
+
+LOGGER = logging.getLogger('FisherCat.Notifier')
+
+# Discord rejects messages longer than this.
+MAX_MESSAGE_LENGTH = 2000
+
+
+class NotificationQueue:
+  """
+  Collects level-up announcements and other short reports per channel and sends them as a single
+  message per window.
+
+  Every channel gets at most one flusher task, so there is never more than one request in flight
+  against a channel's message route. While a send is waiting on a rate limit new announcements keep
+  piling up and get merged into the next message, and anything older than `stale_after` is dropped.
+  """
+
+  def __init__(
+    self,
+    metrics: Metrics,
+    window: float = 2.0,
+    stale_after: float = 30.0,
+  ):
+    self.metrics = metrics
+
+    self.window = window
+    self.stale_after = stale_after
+
+    # channel id -> [(mention, coins, queued at)]
+    self.pending: Dict[int, List[Tuple[str, int, float]]] = {}
+    # channel id -> [(line, queued at)]
+    self.reports: Dict[int, List[Tuple[str, float]]] = {}
+    self.channels: Dict[int, discord.abc.Messageable] = {}
+    self.flushers: Dict[int, asyncio.Task] = {}
+
+  def level_up(
+    self, channel: discord.abc.Messageable, mention: str, coins: int
+  ) -> None:
+    channel_id: int = channel.id  # type: ignore
+
+    self.channels[channel_id] = channel
+    self.pending.setdefault(channel_id, []).append((mention, coins, time.monotonic()))
+    self.metrics.increment('notifier.queued')
+    self.schedule(channel_id)
+
+  def report(self, channel: discord.abc.Messageable, line: str) -> None:
+    """
+    Queues a line of text, sent after the level-ups of the same window.
+    """
+    channel_id: int = channel.id  # type: ignore
+
+    self.channels[channel_id] = channel
+    self.reports.setdefault(channel_id, []).append((line, time.monotonic()))
+    self.metrics.increment('notifier.queued')
+    self.schedule(channel_id)
+
+  def schedule(self, channel_id: int) -> None:
+    if channel_id not in self.flushers:
+      self.flushers[channel_id] = asyncio.create_task(
+        self._flush(channel_id), name=f'FisherCat-Notifier-{channel_id}'
+      )
+
+  async def _flush(self, channel_id: int) -> None:
+    try:
+      while True:
+        await asyncio.sleep(self.window)
+
+        entries = self.pending.pop(channel_id, [])
+        reports = self.reports.pop(channel_id, [])
+        channel = self.channels[channel_id]
+
+        now = time.monotonic()
+        fresh = [e for e in entries if now - e[2] <= self.stale_after]
+        if len(fresh) != len(entries):
+          self.metrics.increment('notifier.dropped_stale', len(entries) - len(fresh))
+
+        message = self.format_message(fresh) if fresh else ''
+        # Reports are never dropped for being old, whatever does not fit waits for the next message.
+        sent_reports = 0
+        for line, _ in reports:
+          candidate = f'{message}\n{line}' if message else line
+          if len(candidate) > MAX_MESSAGE_LENGTH and (message or sent_reports):
+            break
+          message = candidate[:MAX_MESSAGE_LENGTH]
+          sent_reports += 1
+        if sent_reports < len(reports):
+          self.reports[channel_id] = reports[sent_reports:] + self.reports.get(
+            channel_id, []
+          )
+
+        if message:
+          try:
+            await channel.send(
+              message,
+              allowed_mentions=discord.AllowedMentions(users=True),
+            )
+            self.metrics.increment('notifier.sent')
+            self.metrics.increment('notifier.merged', len(fresh) + sent_reports)
+          except discord.HTTPException as e:
+            self.metrics.increment('notifier.failed')
+            LOGGER.warning('Could not send notification to %s: %s', channel_id, e)
+
+        if channel_id not in self.pending and channel_id not in self.reports:
+          break
+    finally:
+      self.flushers.pop(channel_id, None)
+      self.channels.pop(channel_id, None)
+
+  def format_message(self, entries: List[Tuple[str, int, float]]) -> str:
+    # Someone levelling up twice in one window shows up once with the coins added together.
+    totals: Dict[str, int] = {}
+    for mention, coins, _ in entries:
+      totals[mention] = totals.get(mention, 0) + coins
+
+    if len(totals) == 1:
+      mention, coins = next(iter(totals.items()))
+      return f'Congrats, {mention}! You leveled up and earned {coins} coins!'
+
+    message = 'Congrats! These fishers leveled up:'
+    for i, (mention, coins) in enumerate(totals.items()):
+      line = f'\n{mention} earned {coins} coins!'
+      rest = f'\n...and {len(totals) - i} more!'
+
+      if len(message) + len(line) + len(rest) > MAX_MESSAGE_LENGTH:
+        message += rest
+        break
+
+      message += line
+
+    return message
+
+  def close(self) -> None:
+    for task in self.flushers.values():
+      task.cancel()
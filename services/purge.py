@@ -0,0 +1,234 @@
+import logging
+import sqlite3
+import threading
+import time
+
+from typing import List, Optional, Tuple
+
+from services.metrics import Metrics
+from services.shard_router import ShardRouter
+
+LOGGER = logging.getLogger('FisherCat.Purge')
+
+DAY = 24 * 3600
+
+# The member id of a departure that covers the whole guild.
+WHOLE_GUILD = 0
+
+# Tables a purge deletes from, children before the rows they reference. The rollups have no member column,
+# they only go when the whole guild does.
+MEMBER_TABLES = ('inventory', 'memberrod', 'ledger', 'catch', 'guildmember')
+GUILD_TABLES = ('catch_hourly', 'catch_daily')
+
+
+def row_keys(conn: sqlite3.Connection, table: str) -> List[str]:
+  """
+  The columns that pick out one row: the primary key of a WITHOUT ROWID table, the rowid otherwise.
+  """
+  info = conn.execute(f'PRAGMA main.table_info({table});').fetchall()
+  keys = [
+    row[1] for row in sorted((row for row in info if row[5]), key=lambda row: row[5])
+  ]
+  without_rowid = conn.execute(
+    "SELECT sql LIKE '%WITHOUT ROWID%' FROM main.sqlite_master WHERE type = 'table' AND name = ?;",
+    (table,),
+  ).fetchone()[0]
+  return keys if without_rowid else ['rowid']
+
+
+class PurgeService:
+  """
+  Deletes the data of guilds the bot left, and of members who left a guild, once they have been gone for
+  `grace_days`. Coming back before then cancels it.
+
+  Departures are recorded in the guild's shard. A purge deletes `batch_size` rows per transaction, by key,
+  with a pause in between, so the bot's writer never waits long even for a big guild. Everything except
+  recording blocks, run it on a worker thread.
+  """
+
+  def __init__(
+    self,
+    router: ShardRouter,
+    metrics: Metrics,
+    grace_days: int = 30,
+    batch_size: int = 500,
+    pause: float = 0.05,
+  ):
+    self.router = router
+    self.metrics = metrics
+    self.grace_days = grace_days
+    self.batch_size = batch_size
+    self.pause = pause
+
+    self.lock = threading.Lock()
+
+  def depart(self, guild_id: int, member_id: int = WHOLE_GUILD) -> None:
+    """
+    Records that a member, or the bot itself with the default, left a guild. Cheap, call it from the event loop.
+    """
+    connection = self.router.connection(guild_id)
+    with connection:
+      connection.execute(
+        'INSERT OR IGNORE INTO main.departure (guildid, memberid) VALUES (?, ?);',
+        (guild_id, member_id),
+      )
+    self.metrics.increment('purge.departures')
+
+  def cancel(self, guild_id: int, member_id: int = WHOLE_GUILD) -> bool:
+    """
+    Forgets a departure, for a member or the bot coming back. Returns whether there was one.
+    """
+    connection = self.router.connection(guild_id)
+    with connection:
+      cursor = connection.execute(
+        'DELETE FROM main.departure WHERE guildid = ? AND memberid = ?;',
+        (guild_id, member_id),
+      )
+    return cursor.rowcount > 0
+
+  def pending(self) -> List[Tuple[int, int, int]]:
+    """
+    Every recorded departure as (guild id, member id, departed at), the oldest first.
+    """
+    departures = []
+    for index in range(self.router.shard_count):
+      conn = self.router.open_shard(index)
+      try:
+        departures.extend(
+          (row[0], row[1], row[2])
+          for row in conn.execute(
+            'SELECT guildid, memberid, departed FROM main.departure;'
+          )
+        )
+      finally:
+        conn.close()
+    return sorted(departures, key=lambda departure: departure[2])
+
+  def run(self, now: Optional[int] = None) -> List[str]:
+    """
+    Purges every departure older than the grace period. Returns a report, one line per departure.
+    """
+    cutoff = int(now if now is not None else time.time()) - self.grace_days * DAY
+
+    with self.lock:
+      started = time.perf_counter()
+      report = []
+      purged_guilds = set()
+
+      for index in range(self.router.shard_count):
+        conn = self.router.open_shard(index, timeout=1.0, isolation_level=None)
+        try:
+          due = conn.execute(
+            'SELECT guildid, memberid FROM main.departure WHERE departed <= ? ORDER BY departed;',
+            (cutoff,),
+          ).fetchall()
+
+          for guild_id, member_id in due:
+            if guild_id in purged_guilds:
+              continue
+
+            try:
+              deleted = self.purge(conn, guild_id, member_id)
+            except sqlite3.Error as e:
+              self.metrics.increment('purge.failures')
+              LOGGER.warning('Purging %s/%s failed: %s', guild_id, member_id, e)
+              report.append(f'{guild_id}/{member_id}: failed: {e}')
+              continue
+
+            if deleted is None:
+              report.append(f'{guild_id}/{member_id}: came back, stopped')
+              continue
+
+            if member_id == WHOLE_GUILD:
+              purged_guilds.add(guild_id)
+
+            who = 'guild' if member_id == WHOLE_GUILD else 'member'
+            self.metrics.increment(f'purge.{who}s')
+            self.metrics.increment('purge.rows', deleted)
+            report.append(f'{guild_id}/{member_id}: purged {deleted} rows')
+        finally:
+          conn.close()
+
+      elapsed = time.perf_counter() - started
+      self.metrics.set_gauge('purge.last_seconds', elapsed)
+      if report:
+        LOGGER.info('Purged %s departure(s) in %.2fs.', len(report), elapsed)
+      return report
+
+  def purge(
+    self, conn: sqlite3.Connection, guild_id: int, member_id: int
+  ) -> Optional[int]:
+    """
+    Deletes one departed guild or member in batches. Returns the rows deleted, or None if the departure was
+    cancelled while it ran, in which case whatever was not deleted yet stays.
+    """
+    tables = MEMBER_TABLES
+    where = 'guildid = ? AND memberid = ?'
+    params: Tuple[int, ...] = (guild_id, member_id)
+    if member_id == WHOLE_GUILD:
+      tables = GUILD_TABLES + MEMBER_TABLES
+      where = 'guildid = ?'
+      params = (guild_id,)
+
+    deleted = 0
+    for table in tables:
+      keys = ', '.join(row_keys(conn, table))
+      sql = f"""
+        DELETE FROM main.{table} WHERE ({keys}) IN (
+          SELECT {keys} FROM main.{table} WHERE {where} LIMIT ?
+        );
+      """
+
+      while True:
+        # Checked in the same transaction as every batch, so a member who just came back keeps the rest.
+        conn.execute('BEGIN IMMEDIATE;')
+        try:
+          if not self._departed(conn, guild_id, member_id):
+            conn.execute('ROLLBACK;')
+            return None
+          count = conn.execute(sql, (*params, self.batch_size)).rowcount
+          conn.execute('COMMIT;')
+        except BaseException:
+          conn.execute('ROLLBACK;')
+          raise
+
+        deleted += count
+        if count < self.batch_size:
+          break
+        time.sleep(self.pause)
+
+    if member_id == WHOLE_GUILD:
+      # The guild row is in the catalog. It goes before the departure, so a purge cut short in between is
+      # simply run again next time.
+      catalog = self.router.open_catalog(timeout=1.0)
+      try:
+        with catalog:
+          catalog.execute('DELETE FROM guild WHERE id = ?;', (guild_id,))
+      finally:
+        catalog.close()
+
+    conn.execute('BEGIN IMMEDIATE;')
+    try:
+      if member_id == WHOLE_GUILD:
+        # Whatever departures its members had are covered now.
+        conn.execute('DELETE FROM main.departure WHERE guildid = ?;', (guild_id,))
+      else:
+        conn.execute(
+          'DELETE FROM main.departure WHERE guildid = ? AND memberid = ?;',
+          (guild_id, member_id),
+        )
+      conn.execute('COMMIT;')
+    except BaseException:
+      conn.execute('ROLLBACK;')
+      raise
+
+    return deleted
+
+  def _departed(self, conn: sqlite3.Connection, guild_id: int, member_id: int) -> bool:
+    return (
+      conn.execute(
+        'SELECT 1 FROM main.departure WHERE guildid = ? AND memberid = ?;',
+        (guild_id, member_id),
+      ).fetchone()
+      is not None
+    )
@@ -0,0 +1,66 @@
+import asyncio
+import sqlite3
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from services.shard_router import ShardRouter
+
+
+class ReadPool:
+  """
+  Runs read-only queries on a thread pool. Each worker thread keeps its own read-only connection per shard,
+  and with WAL enabled those readers never wait behind the single writer.
+  """
+
+  def __init__(self, router: ShardRouter, workers: int = 4):
+    self.router = router
+
+    # An in-memory database only exists on the writer's connection, so reads have to go there.
+    self.enabled = router.catalog_path != ':memory:'
+
+    self.executor = ThreadPoolExecutor(
+      max_workers=workers, thread_name_prefix='FisherCat-Read'
+    )
+    self._local = threading.local()
+
+    # Reads waiting for a worker or running on one, a measure of how backed up the database is.
+    self.queued = 0
+
+  def _connection(self, shard: int) -> sqlite3.Connection:
+    connections: Dict[int, sqlite3.Connection] | None = getattr(
+      self._local, 'connections', None
+    )
+    if connections is None:
+      connections = self._local.connections = {}
+
+    conn = connections.get(shard)
+    if conn is None:
+      conn = self.router.open_shard(shard)
+      conn.execute('PRAGMA query_only = ON')
+      connections[shard] = conn
+
+    return conn
+
+  def _run(self, shard: int, fn: Callable[..., Any], args: tuple) -> Any:
+    return fn(self._connection(shard), *args)
+
+  async def run(self, guild_id: int, fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Calls `fn(connection, *args)` with a read-only connection to the guild's shard.
+    """
+    if not self.enabled:
+      return fn(self.router.connection(guild_id), *args)
+
+    loop = asyncio.get_running_loop()
+    self.queued += 1
+    try:
+      return await loop.run_in_executor(
+        self.executor, self._run, self.router.shard_for(guild_id), fn, args
+      )
+    finally:
+      self.queued -= 1
+
+  def close(self) -> None:
+    self.executor.shutdown(wait=False, cancel_futures=True)
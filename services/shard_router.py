@@ -0,0 +1,199 @@
+import logging
+import os
+import sqlite3
+
+from typing import Dict, List, Optional
+
+LOGGER = logging.getLogger('FisherCat.ShardRouter')
+
+# Per-guild tables that live in the shards. Everything else (fish, rod, guild, member) stays in the catalog.
+SHARD_TABLES = (
+  'guildmember',
+  'memberrod',
+  'inventory',
+  'ledger',
+  'catch',
+  'catch_hourly',
+  'catch_daily',
+  'departure',
+)
+
+# Marks the main database as the location of a guild, for data written before sharding was enabled.
+LEGACY_SHARD = -1
+
+
+def shard_path(catalog_path: str, index: int) -> str:
+  root, ext = os.path.splitext(catalog_path)
+  return f'{root}.shard{index}{ext or ".db"}'
+
+
+class ShardRouter:
+  """
+  Partitions the per-guild tables across `shard_count` SQLite files by guild id.
+
+  Every shard has its own connection, and with it its own writer lock, and attaches the catalog database
+  so joins against `fish` and `rod` keep working unqualified. All files run in WAL mode so readers
+  never block the writer. With a single shard everything lives in the
+  catalog database, exactly like before sharding existed.
+  """
+
+  def __init__(self, catalog_path: str, shard_count: int = 1):
+    if shard_count < 1:
+      raise ValueError('shard_count must be at least 1.')
+
+    self.catalog_path = catalog_path
+    self.shard_count = shard_count
+
+    self.catalog = self.open_catalog()
+
+    if shard_count == 1:
+      self.shard_paths: List[str] = [catalog_path]
+      self.shards: List[sqlite3.Connection] = [self.catalog]
+    else:
+      self.shard_paths = [shard_path(catalog_path, i) for i in range(shard_count)]
+      self.shards = [self.open_shard(i) for i in range(shard_count)]
+
+    # Guild id -> shard index, for guilds that were placed or moved explicitly.
+    self.directory: Dict[int, int] = {}
+    self.load_directory()
+
+    LOGGER.info('Routing guild data across %s shard(s).', shard_count)
+
+  def load_directory(self) -> None:
+    with self.catalog:
+      self.catalog.execute("""
+        CREATE TABLE IF NOT EXISTS guildshard (
+          guildid INTEGER PRIMARY KEY,
+          shard INTEGER NOT NULL
+        );
+      """)
+
+    self.directory = {
+      row['guildid']: row['shard']
+      for row in self.catalog.execute('SELECT guildid, shard FROM guildshard')
+    }
+
+  def database_paths(self) -> List[str]:
+    """
+    Every file the router uses, the catalog first.
+    """
+    if self.shard_count == 1:
+      return [self.catalog_path]
+    return [self.catalog_path, *self.shard_paths]
+
+  def open_catalog(self, **kwargs) -> sqlite3.Connection:
+    conn = sqlite3.connect(self.catalog_path, **kwargs)
+    conn.row_factory = sqlite3.Row
+    # Only takes effect on new files, it lets maintenance give free pages back in small steps.
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('PRAGMA journal_mode = WAL')
+    return conn
+
+  def open_shard(self, index: int, **kwargs) -> sqlite3.Connection:
+    """
+    Opens a new connection to a shard. Background jobs use this to get a connection of their own.
+    """
+    if self.shard_count == 1:
+      return self.open_catalog(**kwargs)
+
+    conn = sqlite3.connect(self.shard_paths[index], **kwargs)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('ATTACH DATABASE ? AS catalog', (self.catalog_path,))
+    return conn
+
+  def shard_for(self, guild_id: int) -> int:
+    if self.shard_count == 1:
+      return 0
+
+    return self.directory.get(guild_id, guild_id % self.shard_count)
+
+  def connection(self, guild_id: int) -> sqlite3.Connection:
+    return self.shards[self.shard_for(guild_id)]
+
+  def enroll(self, guild_id: int) -> None:
+    """
+    Pins a new guild to its shard so changing the shard count later does not move it.
+    """
+    if self.shard_count == 1 or guild_id in self.directory:
+      return
+
+    shard = self.shard_for(guild_id)
+    with self.catalog:
+      self.catalog.execute(
+        'INSERT OR IGNORE INTO guildshard (guildid, shard) VALUES (?, ?)',
+        (guild_id, shard),
+      )
+    self.directory[guild_id] = shard
+
+  def move_guild(self, guild_id: int, source: Optional[int], target: int) -> int:
+    """
+    Moves every row of a guild from `source` to `target` in one transaction and updates the directory.
+
+    `source` is a shard index, or `LEGACY_SHARD` for rows still in the main database.
+    This is meant for the rebalance tool, run while the bot is offline.
+    Returns the number of rows moved.
+    """
+    if source is None:
+      source = self.shard_for(guild_id)
+    if source == target:
+      return 0
+
+    target_conn = self.open_shard(target)
+
+    moved = 0
+    try:
+      # Legacy rows are in the catalog, which every shard connection already has attached.
+      src = 'catalog'
+      if source != LEGACY_SHARD:
+        src = 'src'
+        target_conn.execute('ATTACH DATABASE ? AS src', (self.shard_paths[source],))
+
+      with target_conn:
+        for table in SHARD_TABLES:
+          source_columns = {
+            row['name']
+            for row in target_conn.execute(f'PRAGMA {src}.table_info({table})')
+          }
+          if not source_columns:
+            # The source is older than the table, there is nothing of the guild in it to move.
+            continue
+
+          # Surrogate ids are left for the target to assign, they could already be taken there. Columns the
+          # source does not have yet get the target's defaults.
+          columns = ', '.join(
+            row['name']
+            for row in target_conn.execute(f'PRAGMA main.table_info({table})')
+            if row['name'] != 'id' and row['name'] in source_columns
+          )
+
+          cursor = target_conn.execute(
+            f"""
+            INSERT OR REPLACE INTO main.{table} ({columns})
+            SELECT {columns} FROM {src}.{table} WHERE guildid = ?;
+          """,
+            (guild_id,),
+          )
+          moved += cursor.rowcount
+
+          target_conn.execute(
+            f'DELETE FROM {src}.{table} WHERE guildid = ?', (guild_id,)
+          )
+
+        target_conn.execute(
+          'INSERT OR REPLACE INTO catalog.guildshard (guildid, shard) VALUES (?, ?)',
+          (guild_id, target),
+        )
+    finally:
+      target_conn.close()
+
+    self.directory[guild_id] = target
+    return moved
+
+  def close(self) -> None:
+    for conn in self.shards:
+      if conn is not self.catalog:
+        conn.close()
+
+    self.catalog.close()
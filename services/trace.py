@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from typing import Optional
+
+import discord
+
+LOGGER = logging.getLogger('FisherCat.Trace')
+
+TRACE_VERSION = 1
+
+
+class TraceRecorder:
+  """
+  Writes every interaction and guild message the bot receives to an NDJSON trace that tools/replay.py can
+  play back.
+
+  Only what is needed to replay them is kept: the kind of event, the command and its options, hashed ids
+  and the time since recording started. Ids are hashed with a random key that is never written down, so
+  a trace tells users apart without saying who they are. Lines are written by a background thread so the
+  event loop never waits on the disk.
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+    self.key = os.urandom(16)
+    self.started = time.monotonic()
+
+    self.lines: queue.SimpleQueue[Optional[bytes]] = queue.SimpleQueue()
+    self.file = open(path, 'ab')
+
+    self.writer = threading.Thread(target=self.run, name='TraceWriter', daemon=True)
+    self.writer.start()
+
+    self.write({'trace': TRACE_VERSION, 'started': int(time.time())})
+    LOGGER.info('Recording traffic to %s.', path)
+
+  def anonymize(self, id: int) -> int:
+    digest = hashlib.blake2b(id.to_bytes(8, 'little'), key=self.key, digest_size=8)
+    # Kept below 2**63 so it still fits wherever a Discord id does.
+    return int.from_bytes(digest.digest(), 'little') >> 1
+
+  def write(self, event: dict) -> None:
+    self.lines.put(json.dumps(event, separators=(',', ':')).encode() + b'\n')
+
+  def event(self, kind: str, guild_id: int, member_id: int, channel_id: int) -> dict:
+    return {
+      'k': kind,
+      't': round(time.monotonic() - self.started, 3),
+      'g': self.anonymize(guild_id),
+      'm': self.anonymize(member_id),
+      'ch': self.anonymize(channel_id),
+    }
+
+  def interaction(self, interaction: discord.Interaction) -> None:
+    if interaction.guild_id is None or interaction.data is None:
+      return
+
+    if interaction.type == discord.InteractionType.component:
+      event = self.event(
+        'component',
+        interaction.guild_id,
+        interaction.user.id,
+        interaction.channel_id or 0,
+      )
+      # Custom ids carry the owner's id, which has to match the hashed one when replayed.
+      event['id'] = interaction.data.get('custom_id', '').replace(
+        str(interaction.user.id), str(event['m'])
+      )
+    elif interaction.type in (
+      discord.InteractionType.application_command,
+      discord.InteractionType.autocomplete,
+    ):
+      kind = (
+        'command'
+        if interaction.type == discord.InteractionType.application_command
+        else 'autocomplete'
+      )
+      event = self.event(
+        kind, interaction.guild_id, interaction.user.id, interaction.channel_id or 0
+      )
+      event['c'] = interaction.data.get('name')
+      options = interaction.data.get('options', [])
+      event['o'] = {option['name']: option.get('value') for option in options}
+      focused = next(
+        (option['name'] for option in options if option.get('focused')), None
+      )
+      if focused is not None:
+        event['f'] = focused
+    else:
+      return
+
+    self.write(event)
+
+  def message(self, message: discord.Message) -> None:
+    if message.guild is None:
+      return
+
+    self.write(
+      self.event('message', message.guild.id, message.author.id, message.channel.id)
+    )
+
+  def run(self) -> None:
+    while (line := self.lines.get()) is not None:
+      self.file.write(line)
+      if self.lines.empty():
+        self.file.flush()
+
+  def close(self) -> None:
+    self.lines.put(None)
+    self.writer.join()
+    self.file.close()
@@ -0,0 +1,318 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from typing import Dict, List, Optional
+
+from services.shard_router import ShardRouter
+from util.bitset import from_blob, iter_bits, set_bit, to_blob
+
+LOGGER = logging.getLogger('FisherCat.Transfer')
+
+FORMAT = 'fishercat-guild'
+FORMAT_VERSION = 1
+
+# Per table: the query returning one guild's rows after a key, and the columns that key is made of.
+# Unapplied ledger entries are merged in, so an export is complete without the ledger itself.
+EXPORTS = {
+  'guildmember': (
+    """
+    SELECT
+      gm.guildid, gm.memberid, gm.rodid,
+      gm.coins + IFNULL(l.coins, 0) AS coins,
+      gm.xp + IFNULL(l.xp, 0) AS xp,
+      gm.xpstep + IFNULL(l.xpstep, 0) AS xpstep,
+      gm.xpnext + IFNULL(l.xpnext, 0) AS xpnext,
+      gm.level + IFNULL(l.level, 0) AS level,
+      gm.lastclaimed, gm.fishingcooldown, gm.rodmask
+    FROM guildmember gm
+    LEFT JOIN (
+      SELECT memberid, SUM(coins) AS coins, SUM(xp) AS xp, SUM(xpstep) AS xpstep,
+        SUM(xpnext) AS xpnext, SUM(level) AS level
+      FROM ledger WHERE guildid = :guild AND applied = 0
+      GROUP BY memberid
+    ) l ON l.memberid = gm.memberid
+    WHERE gm.guildid = :guild AND gm.memberid > :memberid
+    ORDER BY gm.memberid;
+  """,
+    ('memberid',),
+  ),
+  'inventory': (
+    """
+    SELECT :guild AS guildid, memberid, fishid, SUM(amount) AS amount FROM (
+      SELECT memberid, fishid, amount FROM inventory WHERE guildid = :guild
+      UNION ALL
+      SELECT memberid, fishid, amount FROM ledger
+      WHERE guildid = :guild AND applied = 0 AND fishid IS NOT NULL
+    )
+    WHERE (memberid, fishid) > (:memberid, :fishid)
+    GROUP BY memberid, fishid
+    HAVING SUM(amount) > 0
+    ORDER BY memberid, fishid;
+  """,
+    ('memberid', 'fishid'),
+  ),
+  'memberrod': (
+    """
+    SELECT guildid, memberid, rodid FROM memberrod
+    WHERE guildid = :guild AND (memberid, rodid) > (:memberid, :rodid)
+    ORDER BY memberid, rodid;
+  """,
+    ('memberid', 'rodid'),
+  ),
+}
+
+BLOB_COLUMNS = {'rodmask'}
+
+
+def checkpoint_path(path: str) -> str:
+  return f'{path}.checkpoint'
+
+
+def load_checkpoint(path: str) -> Optional[dict]:
+  try:
+    with open(checkpoint_path(path), 'r') as f:
+      return json.load(f)
+  except FileNotFoundError:
+    return None
+
+
+def save_checkpoint(path: str, checkpoint: dict) -> None:
+  # Replaced in one go, so a crash leaves either the old or the new checkpoint.
+  partial = f'{checkpoint_path(path)}.tmp'
+  with open(partial, 'w') as f:
+    json.dump(checkpoint, f)
+  os.replace(partial, checkpoint_path(path))
+
+
+def encode_line(entry: dict) -> bytes:
+  return json.dumps(entry, separators=(',', ':')).encode() + b'\n'
+
+
+def export_guild(
+  router: ShardRouter, guild_id: int, path: str, batch_size: int = 1000
+) -> int:
+  """
+  Streams one guild's members, inventories and rods to `path` as NDJSON, `batch_size` rows at a time.
+
+  Progress is saved next to the file after every batch. Running it again with the same arguments carries
+  on from there, and the checkpoint is removed once the export is complete. Returns the number of rows written.
+  """
+  checkpoint = load_checkpoint(path)
+  if checkpoint is not None and checkpoint['guild'] != guild_id:
+    raise ValueError(
+      f'{path} holds an unfinished export of guild {checkpoint["guild"]}.'
+    )
+
+  conn = router.open_shard(router.shard_for(guild_id), isolation_level=None)
+  # One read transaction for the whole export, so every table shows the same moment.
+  conn.execute('BEGIN;')
+
+  try:
+    if checkpoint is None:
+      out = open(path, 'wb')
+      out.write(
+        encode_line(
+          {
+            'format': FORMAT,
+            'version': FORMAT_VERSION,
+            'guild': guild_id,
+            'exported': int(time.time()),
+          }
+        )
+      )
+      # Ids differ between databases, so names are exported to match them up on import.
+      out.write(
+        encode_line(
+          {
+            'fish': {
+              row[0]: row[1] for row in conn.execute('SELECT id, name FROM fish')
+            },
+            'rods': {
+              row[0]: row[1] for row in conn.execute('SELECT id, name FROM rod')
+            },
+          }
+        )
+      )
+      checkpoint = {
+        'guild': guild_id,
+        'table': next(iter(EXPORTS)),
+        'after': None,
+        'offset': out.tell(),
+        'rows': 0,
+      }
+    else:
+      LOGGER.info('Resuming export of guild %s at %s.', guild_id, checkpoint['table'])
+      out = open(path, 'r+b')
+      out.truncate(checkpoint['offset'])
+      out.seek(checkpoint['offset'])
+
+    with out:
+      tables = list(EXPORTS)
+      for table in tables[tables.index(checkpoint['table']) :]:
+        sql, keys = EXPORTS[table]
+        after = checkpoint['after'] if checkpoint['table'] == table else None
+
+        cursor = conn.execute(
+          sql, {'guild': guild_id, **dict(zip(keys, after or [-1] * len(keys)))}
+        )
+        while rows := cursor.fetchmany(batch_size):
+          for row in rows:
+            entry = dict(row)
+            for column in BLOB_COLUMNS & entry.keys():
+              entry[column] = entry[column].hex()
+            out.write(encode_line({'table': table, 'row': entry}))
+
+          out.flush()
+          checkpoint.update(
+            table=table,
+            after=[rows[-1][key] for key in keys],
+            offset=out.tell(),
+            rows=checkpoint['rows'] + len(rows),
+          )
+          save_checkpoint(path, checkpoint)
+
+        checkpoint.update(table=table, after=None)
+
+      out.write(encode_line({'end': True, 'rows': checkpoint['rows']}))
+  finally:
+    conn.execute('COMMIT;')
+    conn.close()
+
+  os.remove(checkpoint_path(path))
+  return checkpoint['rows']
+
+
+def read_last_line(path: str) -> bytes:
+  with open(path, 'rb') as f:
+    f.seek(0, os.SEEK_END)
+    f.seek(max(f.tell() - 4096, 0))
+    return f.read().rstrip(b'\n').rsplit(b'\n', 1)[-1]
+
+
+def catalog_ids(
+  conn: sqlite3.Connection, table: str, names: Dict[str, str]
+) -> Dict[int, int]:
+  """
+  Maps exported ids to the ids of the same names in this database. Names it does not know are left out.
+  """
+  local = {
+    row[1]: row[0]
+    for row in conn.execute(f'SELECT MIN(id), name FROM {table} GROUP BY name')
+  }
+  return {int(id): local[name] for id, name in names.items() if name in local}
+
+
+def import_guild(
+  router: ShardRouter,
+  path: str,
+  batch_size: int = 1000,
+  guild_id: Optional[int] = None,
+) -> int:
+  """
+  Loads an export made by `export_guild`, into `guild_id` or the guild it was exported from.
+
+  Rows are inserted with executemany, one transaction per batch, and existing rows with the same key are
+  replaced, so a batch that is replayed after a crash does no harm. Like the export it checkpoints after
+  every batch and carries on when run again. Returns the number of rows imported.
+  """
+  try:
+    if json.loads(read_last_line(path)).get('end') is not True:
+      raise ValueError
+  except ValueError:
+    raise ValueError(f'{path} is not a complete export.')
+
+  with open(path, 'rb') as f:
+    header = json.loads(f.readline())
+    if header.get('format') != FORMAT or header.get('version') != FORMAT_VERSION:
+      raise ValueError(f'{path} is not a guild export this version can read.')
+
+    names = json.loads(f.readline())
+    guild_id = guild_id if guild_id is not None else header['guild']
+
+    checkpoint = load_checkpoint(path) or {'offset': f.tell(), 'rows': 0}
+    f.seek(checkpoint['offset'])
+
+    with router.catalog:
+      router.catalog.execute('INSERT OR IGNORE INTO guild (id) VALUES (?)', (guild_id,))
+    router.enroll(guild_id)
+
+    conn = router.open_shard(router.shard_for(guild_id))
+    fish_ids = catalog_ids(conn, 'fish', names['fish'])
+    rod_ids = catalog_ids(conn, 'rod', names['rods'])
+
+    def remap(table: str, row: dict) -> Optional[dict]:
+      row['guildid'] = guild_id
+      if table == 'inventory':
+        row['fishid'] = fish_ids.get(row['fishid'])
+        return row if row['fishid'] is not None else None
+      if table == 'memberrod':
+        row['rodid'] = rod_ids.get(row['rodid'])
+        return row if row['rodid'] is not None else None
+
+      # guildmember, fall back to the starter rod when the equipped one does not exist here.
+      row['rodid'] = rod_ids.get(row['rodid'], 1)
+      mask = set_bit(0, row['rodid'])
+      for rod_id in iter_bits(from_blob(bytes.fromhex(row['rodmask']))):
+        if rod_id in rod_ids:
+          mask = set_bit(mask, rod_ids[rod_id])
+      row['rodmask'] = to_blob(mask)
+      return row
+
+    def flush(table: str, rows: List[dict], offset: int) -> None:
+      if rows:
+        columns = list(rows[0])
+        with conn:
+          if table == 'guildmember':
+            conn.executemany(
+              'INSERT OR IGNORE INTO member (id) VALUES (?)',
+              ((row['memberid'],) for row in rows),
+            )
+          conn.executemany(
+            f"""
+            INSERT OR REPLACE INTO {table} ({', '.join(columns)})
+            VALUES ({', '.join('?' for _ in columns)});
+          """,
+            ([row[column] for column in columns] for row in rows),
+          )
+
+      checkpoint.update(offset=offset, rows=checkpoint['rows'] + len(rows))
+      save_checkpoint(path, checkpoint)
+
+    try:
+      table = None
+      batch: List[dict] = []
+      skipped = 0
+
+      while True:
+        offset = f.tell()
+        entry = json.loads(f.readline())
+        if entry.get('end'):
+          flush(table, batch, offset)
+          break
+
+        if batch and (entry['table'] != table or len(batch) >= batch_size):
+          flush(table, batch, offset)
+          batch = []
+
+        table = entry['table']
+        if table not in EXPORTS:
+          raise ValueError(f'{path} has rows for an unknown table {table}.')
+
+        row = remap(table, entry['row'])
+        if row is None:
+          skipped += 1
+        else:
+          batch.append(row)
+    finally:
+      conn.close()
+
+  if skipped:
+    LOGGER.warning(
+      'Skipped %s row(s) for fish or rods this database does not have.', skipped
+    )
+
+  os.remove(checkpoint_path(path))
+  return checkpoint['rows']
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from contextvars import ContextVar
+from typing import Optional
+
+from services.metrics import Metrics
+
+LOGGER = logging.getLogger('FisherCat.Watchdog')
+
+# Set by the command tree for every app command, so a stall can be pinned on the command that caused it.
+ACTIVE_COMMAND: ContextVar[Optional[str]] = ContextVar('active_command', default=None)
+
+
+class LoopWatchdog(threading.Thread):
+  """
+  Pings the event loop from a separate thread and reports when it stops answering.
+  """
+
+  def __init__(
+    self,
+    loop: asyncio.AbstractEventLoop,
+    loop_thread_id: int,
+    metrics: Metrics,
+    interval: float = 0.1,
+    threshold: float = 0.25,
+  ):
+    super().__init__(name='FisherCat-Watchdog', daemon=True)
+
+    self.loop = loop
+    self.loop_thread_id = loop_thread_id
+    self.metrics = metrics
+
+    self.interval = interval
+    self.threshold = threshold
+
+    self._stopped = threading.Event()
+
+  def run(self):
+    while not self._stopped.is_set():
+      pong = threading.Event()
+      sent = time.monotonic()
+
+      try:
+        self.loop.call_soon_threadsafe(pong.set)
+      except RuntimeError:
+        return  # Loop is closed.
+
+      if not pong.wait(self.threshold):
+        self._report_stall()
+
+        while not pong.wait(self.interval):
+          if self._stopped.is_set():
+            return
+
+        stalled_for = time.monotonic() - sent
+        self.metrics.increment('loop.stall_seconds', stalled_for)
+        self.metrics.max_gauge('loop.max_stall_seconds', stalled_for)
+        LOGGER.warning('Event loop recovered after %.3fs.', stalled_for)
+
+      self._stopped.wait(self.interval)
+
+  def stop(self) -> None:
+    self._stopped.set()
+
+  def _active_command(self) -> str:
+    task = asyncio.current_task(self.loop)
+    if task is None:
+      return '<no task>'
+
+    command = task.get_context().get(ACTIVE_COMMAND)
+    return command or task.get_name()
+
+  def _report_stall(self) -> None:
+    self.metrics.increment('loop.stalls')
+
+    frame = sys._current_frames().get(self.loop_thread_id)
+    stack = ''.join(traceback.format_stack(frame)) if frame else '<unavailable>\n'
+
+    LOGGER.warning(
+      'Event loop blocked for more than %ss while running %s:\n%s',
+      self.threshold,
+      self._active_command(),
+      stack,
+    )
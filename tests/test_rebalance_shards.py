@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from services.db_init import initialize_shard
+from services.shard_router import ShardRouter
+from tools.rebalance_shards import migrate
+from util.bitset import from_blob, has_bit
+
+# The tables and some rows of a database from before sharding, the ledger and rod masks.
+BASELINE_SCHEMA = """
+  CREATE TABLE guild (id INTEGER PRIMARY KEY);
+  CREATE TABLE member (id INTEGER PRIMARY KEY);
+  CREATE TABLE fish (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      name TEXT NOT NULL,
+      xp INTEGER NOR NULL,
+      rarity INTEGER NOT NULL,
+      odds INTEGER NOT NULL,
+      area TEXT NOT NULL,
+      base_value INTEGER NOT NULL
+  );
+  CREATE TABLE rod (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    levelrequired INTEGER NOT NULL,
+    xpmultiplier REAL NOT NULL,
+    mincatch INTEGER NOT NULL,
+    maxcatch INTEGER NOT NULL,
+    linebreakchance INTEGER NOR NULL
+  );
+  CREATE TABLE memberrod (
+      guildid INTEGER NOT NULL,
+      memberid INTEGER NOT NULL,
+      rodid INTEGER NOT NULL,
+      PRIMARY KEY (guildid, memberid, rodid),
+      FOREIGN KEY (guildid, memberid) REFERENCES guildmember(guildid, memberid) ON DELETE CASCADE,
+      FOREIGN KEY (rodid) REFERENCES rod(id) ON DELETE CASCADE
+  );
+  CREATE TABLE guildmember (
+      guildid INTEGER NOT NULL,
+      memberid INTEGER NOT NULL,
+      rodid INTEGER NOT NULL DEFAULT 1,
+      coins INTEGER DEFAULT 0,
+      xp INTEGER DEFAULT 0,
+      xpstep INTEGER DEFAULT 1,
+      xpnext INTEGER DEFAULT 30,
+      level INTEGER DEFAULT 1,
+      lastclaimed TEXT DEFAULT '1970-01-01 02:00:00',
+      fishingcooldown INTEGER DEFAULT 15,
+      PRIMARY KEY (guildid, memberid),
+      FOREIGN KEY (guildid) REFERENCES guild(id) ON DELETE CASCADE,
+      FOREIGN KEY (memberid) REFERENCES member(id) ON DELETE CASCADE,
+      FOREIGN KEY (rodid) REFERENCES rod(id) ON DELETE CASCADE
+  );
+  CREATE TABLE inventory (
+      guildid INTEGER NOT NULL,
+      memberid INTEGER NOT NULL,
+      fishid INTEGER NOT NULL,
+      amount INTEGER DEFAULT 0,
+      PRIMARY KEY (guildid, memberid, fishid),
+      FOREIGN KEY (guildid, memberid) REFERENCES guildmember(guildid, memberid) ON DELETE CASCADE,
+      FOREIGN KEY (fishid) REFERENCES fish(id) ON DELETE CASCADE
+  );
+
+  INSERT INTO guild (id) VALUES (10), (11);
+  INSERT INTO member (id) VALUES (1), (2);
+  INSERT INTO fish (name, xp, rarity, odds, area, base_value) VALUES ('Cod', 5, 'COMMON', 2, 'LAKE', 10);
+  INSERT INTO rod (name, description, value, levelrequired, xpmultiplier, mincatch, maxcatch, linebreakchance)
+  VALUES ('Stick', 'A stick.', 0, 1, 1.0, 1, 1, 10), ('Pole', 'A pole.', 100, 5, 1.5, 1, 2, 20);
+  INSERT INTO guildmember (guildid, memberid, rodid, coins) VALUES (10, 1, 2, 50), (11, 2, 1, 7);
+  INSERT INTO memberrod (guildid, memberid, rodid) VALUES (10, 1, 1), (10, 1, 2), (11, 2, 1);
+  INSERT INTO inventory (guildid, memberid, fishid, amount) VALUES (10, 1, 1, 3);
+"""
+
+
+class MigrateTest(unittest.TestCase):
+  def test_migrate_baseline_database(self):
+    path = os.path.join(tempfile.mkdtemp(), 'fishy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.close()
+
+    router = ShardRouter(path, 2)
+    try:
+      for shard in router.shards:
+        initialize_shard(shard)
+
+      migrate(router)
+
+      self.assertEqual(
+        router.catalog.execute('SELECT COUNT(*) FROM main.guildmember').fetchone()[0], 0
+      )
+
+      member = (
+        router.connection(10)
+        .execute(
+          'SELECT coins, rodmask FROM main.guildmember WHERE guildid = 10 AND memberid = 1;'
+        )
+        .fetchone()
+      )
+      self.assertEqual(member['coins'], 50)
+      self.assertTrue(has_bit(from_blob(member['rodmask']), 2))
+
+      inventory = (
+        router.connection(10)
+        .execute('SELECT amount FROM main.inventory WHERE guildid = 10;')
+        .fetchone()
+      )
+      self.assertEqual(inventory['amount'], 3)
+
+      self.assertEqual(router.shard_for(11), 1)
+      self.assertIsNotNone(
+        router.connection(11)
+        .execute('SELECT 1 FROM main.guildmember WHERE guildid = 11;')
+        .fetchone()
+      )
+    finally:
+      router.close()
+
+
+if __name__ == '__main__':
+  unittest.main()
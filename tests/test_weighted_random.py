@@ -0,0 +1,30 @@
+import unittest
+
+from util.weighted_random import WeightedRandom
+
+
+class WeightedRandomTest(unittest.TestCase):
+  def test_never_draws_zero_weight(self):
+    sampler = WeightedRandom.from_items([('a', 0.1), ('b', 0.2), ('c', 0.3)])
+    sampler.set_weight(0, 0)
+    sampler.set_weight(2, 0)
+
+    for _ in range(1000):
+      self.assertEqual(sampler.get(), 'b')
+
+  def test_reweight_everything_to_zero(self):
+    weights = [0.1, 0.2, 0.3, 1 / 3, 1 / 7]
+    sampler = WeightedRandom.from_items(zip('abcde', weights))
+    for index in range(len(weights)):
+      sampler.set_weight(index, 0)
+
+    self.assertEqual(sampler.total_weight, 0)
+    for _ in range(1000):
+      self.assertIsNone(sampler.get())
+
+    sampler.set_weight(3, 0.5)
+    self.assertEqual(sampler.get(), 'd')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,244 @@
+"""
+Upgrades a database and its shards to the current schema version (SCHEMA_VERSION in services/db_init.py).
+
+v2 stores rarities and areas as integers and timestamps as seconds since the epoch, and keys guildmember,
+memberrod and inventory by their primary key only (WITHOUT ROWID).
+
+It can run while the bot is online. Every table is copied in small batches, and triggers on the old table
+keep the copy up to date with writes made in the meantime. The old table is only locked to swap in the
+copy. The bot reads both layouts, so it keeps working halfway through.
+
+  python -m tools.migrate_schema fishy.db
+  python -m tools.migrate_schema fishy.db --shards 4 --batch-size 500
+"""
+
+import argparse
+import logging
+import re
+import sqlite3
+import time
+
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from models.area import Area
+from models.rarity import Rarity
+from services.db_init import SCHEMA_VERSION
+from services.shard_router import shard_path
+
+LOGGER = logging.getLogger('FisherCat.MigrateSchema')
+
+
+def enum_to_int(enum: Type[Enum]) -> str:
+  cases = ' '.join(f"WHEN '{member.name}' THEN {member.value}" for member in enum)
+  return f'CASE {{value}} {cases} ELSE CAST({{value}} AS INTEGER) END'
+
+
+# v1 wrote lastclaimed in local time and the ledger used CURRENT_TIMESTAMP, which is UTC.
+LOCAL_TIME_TO_EPOCH = "CASE WHEN {value} GLOB '*-*' THEN unixepoch({value}, 'utc') ELSE CAST({value} AS INTEGER) END"
+UTC_TIME_TO_EPOCH = "CASE WHEN {value} GLOB '*-*' THEN unixepoch({value}) ELSE CAST({value} AS INTEGER) END"
+
+
+def without_rowid(sql: str) -> str:
+  if 'WITHOUT ROWID' in sql:
+    return sql
+  return re.sub(r'\)\s*;?\s*$', ') WITHOUT ROWID', sql)
+
+
+# Per table, in the order they are migrated: how to rewrite its CREATE TABLE and how to convert its columns.
+MIGRATIONS: Dict[str, Tuple[Callable[[str], str], Dict[str, str]]] = {
+  'fish': (
+    lambda sql: re.sub(r'\barea TEXT\b', 'area INTEGER', sql),
+    {'rarity': enum_to_int(Rarity), 'area': enum_to_int(Area)},
+  ),
+  'guildmember': (
+    lambda sql: without_rowid(
+      re.sub(
+        r"\blastclaimed TEXT DEFAULT '[^']*'", 'lastclaimed INTEGER DEFAULT 0', sql
+      )
+    ),
+    {'lastclaimed': LOCAL_TIME_TO_EPOCH},
+  ),
+  'memberrod': (without_rowid, {}),
+  'inventory': (without_rowid, {}),
+  'ledger': (
+    lambda sql: re.sub(
+      r'\bcreated TEXT DEFAULT CURRENT_TIMESTAMP\b',
+      'created INTEGER DEFAULT (unixepoch())',
+      sql,
+    ),
+    {'created': UTC_TIME_TO_EPOCH},
+  ),
+}
+
+
+def connect(path: str) -> sqlite3.Connection:
+  # Transactions are opened by hand, so DDL and the batches run exactly where they are meant to.
+  conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+  conn.execute('PRAGMA journal_mode = WAL;')
+  return conn
+
+
+def table_sql(conn: sqlite3.Connection, table: str) -> Optional[str]:
+  row = conn.execute(
+    "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?;", (table,)
+  ).fetchone()
+  return row[0] if row else None
+
+
+def migrate_table(
+  conn: sqlite3.Connection, table: str, batch_size: int, pause: float
+) -> int:
+  """
+  Rebuilds one table in the v2 layout. Returns the number of rows copied, 0 if it was already up to date.
+  """
+  sql = table_sql(conn, table)
+  rewrite, conversions = MIGRATIONS[table]
+  upgraded = rewrite(sql)
+  if upgraded == sql:
+    return 0
+
+  copy = f'{table}_v2'
+  info = conn.execute(f'PRAGMA table_info({table});').fetchall()
+  columns = [row[1] for row in info]
+  keys = [
+    row[1] for row in sorted((row for row in info if row[5]), key=lambda row: row[5])
+  ]
+
+  def values(prefix: str) -> str:
+    return ', '.join(
+      conversions[column].format(value=prefix + column)
+      if column in conversions
+      else prefix + column
+      for column in columns
+    )
+
+  column_list = ', '.join(columns)
+  key_list = ', '.join(keys)
+  key_params = ', '.join('?' for _ in keys)
+  old_keys = ', '.join(f'OLD.{key}' for key in keys)
+
+  indexes = [
+    row[0]
+    for row in conn.execute(
+      "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL;",
+      (table,),
+    )
+  ]
+
+  # Start over if an earlier run was interrupted; dropping the copy also drops its triggers' target.
+  conn.execute('BEGIN IMMEDIATE;')
+  for trigger in ('insert', 'update', 'delete'):
+    conn.execute(f'DROP TRIGGER IF EXISTS {copy}_{trigger};')
+  conn.execute(f'DROP TABLE IF EXISTS {copy};')
+  conn.execute(re.sub(r'^CREATE TABLE "?\w+"?', f'CREATE TABLE {copy}', upgraded))
+  conn.execute(f"""
+    CREATE TRIGGER {copy}_insert AFTER INSERT ON {table} BEGIN
+      INSERT OR REPLACE INTO {copy} ({column_list}) VALUES ({values('NEW.')});
+    END;
+  """)
+  conn.execute(f"""
+    CREATE TRIGGER {copy}_update AFTER UPDATE ON {table} BEGIN
+      DELETE FROM {copy} WHERE ({key_list}) = ({old_keys});
+      INSERT OR REPLACE INTO {copy} ({column_list}) VALUES ({values('NEW.')});
+    END;
+  """)
+  conn.execute(f"""
+    CREATE TRIGGER {copy}_delete AFTER DELETE ON {table} BEGIN
+      DELETE FROM {copy} WHERE ({key_list}) = ({old_keys});
+    END;
+  """)
+  conn.execute('COMMIT;')
+
+  # Copy in primary key order. Rows the triggers already wrote are newer, so they are kept.
+  copied = 0
+  last: Optional[List] = None
+  while True:
+    after = f'({key_list}) > ({key_params})' if last else '1'
+    params = tuple(last or ())
+
+    conn.execute('BEGIN IMMEDIATE;')
+    bound = conn.execute(
+      f'SELECT {key_list} FROM {table} WHERE {after} ORDER BY {key_list} LIMIT 1 OFFSET ?;',
+      (*params, batch_size - 1),
+    ).fetchone()
+    upto = f'AND ({key_list}) <= ({key_params})' if bound else ''
+    cursor = conn.execute(
+      f'INSERT OR IGNORE INTO {copy} ({column_list}) SELECT {values("")} FROM {table} WHERE {after} {upto};',
+      (*params, *(bound or ())),
+    )
+    conn.execute('COMMIT;')
+
+    copied += cursor.rowcount
+    if bound is None:
+      break
+
+    last = list(bound)
+    time.sleep(pause)
+
+  conn.execute('BEGIN IMMEDIATE;')
+  conn.execute(f'DROP TABLE {table};')
+  conn.execute(f'ALTER TABLE {copy} RENAME TO {table};')
+  for index in indexes:
+    conn.execute(index)
+  conn.execute('COMMIT;')
+
+  return copied
+
+
+def migrate_database(path: str, batch_size: int, pause: float) -> None:
+  conn = connect(path)
+
+  try:
+    version = conn.execute('PRAGMA user_version;').fetchone()[0] or 1
+    if version >= SCHEMA_VERSION:
+      LOGGER.info('%s is already on schema v%s.', path, version)
+      return
+
+    for table in MIGRATIONS:
+      if table_sql(conn, table) is None:
+        continue
+
+      started = time.perf_counter()
+      copied = migrate_table(conn, table, batch_size, pause)
+      LOGGER.info(
+        '%s: migrated %s (%s rows, %.2fs).',
+        path,
+        table,
+        copied,
+        time.perf_counter() - started,
+      )
+
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION};')
+    LOGGER.info('%s is now on schema v%s.', path, SCHEMA_VERSION)
+  finally:
+    conn.close()
+
+
+def main():
+  logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+
+  parser = argparse.ArgumentParser(
+    description='Upgrade a database to the current schema.'
+  )
+  parser.add_argument('database', help='Path to the main (catalog) database.')
+  parser.add_argument('--shards', type=int, default=1, help='Number of shards.')
+  parser.add_argument(
+    '--batch-size', type=int, default=1000, help='Rows copied per transaction.'
+  )
+  parser.add_argument(
+    '--pause', type=float, default=0.05, help='Seconds to wait between batches.'
+  )
+
+  args = parser.parse_args()
+  if args.batch_size < 1:
+    parser.error('--batch-size must be at least 1.')
+
+  migrate_database(args.database, args.batch_size, args.pause)
+  if args.shards > 1:
+    for index in range(args.shards):
+      migrate_database(shard_path(args.database, index), args.batch_size, args.pause)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,90 @@
+"""
+Moves guilds between database shards. Run it while the bot is offline.
+
+  python -m tools.rebalance_shards fishy.db --shards 4 status
+  python -m tools.rebalance_shards fishy.db --shards 4 migrate
+  python -m tools.rebalance_shards fishy.db --shards 4 move 1234567890 2
+"""
+
+import argparse
+import logging
+
+from services.db_init import initialize_shard
+from services.shard_router import LEGACY_SHARD, ShardRouter
+
+LOGGER = logging.getLogger('FisherCat.Rebalance')
+
+
+def status(router: ShardRouter) -> None:
+  for index, conn in enumerate(router.shards):
+    count = conn.execute(
+      'SELECT COUNT(DISTINCT guildid) FROM main.guildmember'
+    ).fetchone()[0]
+    print(f'shard {index}: {count} guild(s) ({router.shard_paths[index]})')
+
+
+def migrate(router: ShardRouter) -> None:
+  """
+  Moves guilds still stored in the main database (from before sharding was enabled) into their shards.
+  """
+  # A database from before sharding never had the shard tables brought up to date in the main file, the
+  # rows are copied column for column so it needs the same schema as the shards first.
+  if not initialize_shard(router.catalog):
+    LOGGER.error('Could not bring the main database up to date, nothing was moved.')
+    return
+
+  guilds = [
+    row['guildid']
+    for row in router.catalog.execute('SELECT DISTINCT guildid FROM main.guildmember')
+  ]
+
+  for guild_id in guilds:
+    target = router.shard_for(guild_id)
+    moved = router.move_guild(guild_id, LEGACY_SHARD, target)
+    LOGGER.info('Moved guild %s to shard %s (%s rows).', guild_id, target, moved)
+
+  LOGGER.info('Migrated %s guild(s).', len(guilds))
+
+
+def main():
+  logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+
+  parser = argparse.ArgumentParser(description='Move guilds between database shards.')
+  parser.add_argument('database', help='Path to the main (catalog) database.')
+  parser.add_argument('--shards', type=int, required=True, help='Number of shards.')
+
+  commands = parser.add_subparsers(dest='command', required=True)
+  commands.add_parser('status', help='Show how many guilds live in each shard.')
+  commands.add_parser('migrate', help='Move unsharded guilds out of the main database.')
+
+  move = commands.add_parser('move', help='Move one guild to another shard.')
+  move.add_argument('guild', type=int)
+  move.add_argument('shard', type=int)
+
+  args = parser.parse_args()
+  if args.shards < 2:
+    parser.error('--shards must be at least 2.')
+
+  router = ShardRouter(args.database, args.shards)
+  for shard in router.shards:
+    initialize_shard(shard)
+
+  try:
+    if args.command == 'status':
+      status(router)
+    elif args.command == 'migrate':
+      migrate(router)
+    elif args.command == 'move':
+      if not 0 <= args.shard < router.shard_count:
+        parser.error(f'shard must be between 0 and {router.shard_count - 1}.')
+
+      moved = router.move_guild(args.guild, None, args.shard)
+      LOGGER.info(
+        'Moved guild %s to shard %s (%s rows).', args.guild, args.shard, moved
+      )
+  finally:
+    router.close()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,340 @@
+"""
+Replays a traffic trace recorded with FISHER_TRACE through the real cogs, against a copy of a database.
+
+The database (and its shards) are copied to a scratch folder first, so the original is never touched.
+Events are fed in at their recorded pace divided by --speed, and the report shows how long every kind
+of event took to get its first response and to finish.
+
+  python -m tools.replay trace.ndjson fishy.db --speed 10
+  python -m tools.replay trace.ndjson fishy.db --shards 4 --speed 100 --limit 50000
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import types
+
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import discord
+from discord import app_commands, ui
+
+import fisher_bot
+from services.backup import copy_database
+from services.shard_router import shard_path
+from services.trace import TRACE_VERSION
+
+# Interaction ids only have to be unique within a replay.
+INTERACTION_IDS = itertools.count(1)
+
+LOGGER = logging.getLogger('FisherCat.Replay')
+
+
+class FakeResponse:
+  def __init__(self, interaction: 'FakeInteraction'):
+    self.interaction = interaction
+    self.done = False
+
+  def is_done(self) -> bool:
+    return self.done
+
+  def respond(self):
+    if not self.done:
+      self.done = True
+      self.interaction.responded = time.perf_counter()
+
+  async def send_message(self, *args, **kwargs):
+    self.respond()
+
+  async def edit_message(self, *args, **kwargs):
+    self.respond()
+
+  async def defer(self, *args, **kwargs):
+    self.respond()
+
+  async def autocomplete(self, choices):
+    self.respond()
+
+
+class FakeFollowup:
+  async def send(self, *args, **kwargs):
+    pass
+
+
+class FakeChannel:
+  def __init__(self, id: int):
+    self.id = id
+
+  async def send(self, *args, **kwargs):
+    pass
+
+
+class FakeInteraction:
+  """
+  Stands in for a discord.Interaction, with just enough of it for the cogs. Responses go nowhere, only
+  the moment of the first one is kept.
+  """
+
+  def __init__(
+    self, client: fisher_bot.FisherBot, event: dict, user, channel: FakeChannel
+  ):
+    self.client = client
+    self.id = next(INTERACTION_IDS)
+    self.type = (
+      discord.InteractionType.autocomplete
+      if event['k'] == 'autocomplete'
+      else discord.InteractionType.application_command
+    )
+    self.guild_id: int = event['g']
+    self.guild = types.SimpleNamespace(id=event['g'])
+    self.channel_id = channel.id
+    self.channel = channel
+    self.user = user
+    self.command: Optional[app_commands.Command] = None
+    self.message = None
+    self.data = {'custom_id': event.get('id'), 'name': event.get('c')}
+    self.namespace = types.SimpleNamespace(**event.get('o', {}))
+    self.created_at = discord.utils.utcnow()
+    # What FisherBot.dispatch records for a real interaction.
+    self.extras: dict = {'received': time.monotonic()}
+
+    self.response = FakeResponse(self)
+    self.followup = FakeFollowup()
+    self.responded: Optional[float] = None
+
+
+class Replayer:
+  def __init__(self, bot: fisher_bot.FisherBot):
+    self.bot = bot
+
+    self.users: Dict[int, types.SimpleNamespace] = {}
+    self.channels: Dict[int, FakeChannel] = {}
+
+    # label -> [(seconds to first response, seconds to finish)]
+    self.timings: Dict[str, List[tuple]] = defaultdict(list)
+    self.errors: Dict[str, int] = defaultdict(int)
+    self.skipped: Dict[str, int] = defaultdict(int)
+
+  def user(self, id: int):
+    if id not in self.users:
+      self.users[id] = types.SimpleNamespace(
+        id=id,
+        name=f'user{id % 10000}',
+        display_name=f'user{id % 10000}',
+        mention=f'<@{id}>',
+        bot=False,
+        avatar=None,
+        display_avatar=types.SimpleNamespace(
+          url='https://cdn.discordapp.com/embed/avatars/0.png'
+        ),
+      )
+    return self.users[id]
+
+  def channel(self, id: int) -> FakeChannel:
+    if id not in self.channels:
+      self.channels[id] = FakeChannel(id)
+    return self.channels[id]
+
+  async def play(self, event: dict) -> None:
+    kind = event['k']
+    label = f'/{event["c"]}' if kind == 'command' else kind
+    if kind == 'autocomplete':
+      label = f'/{event["c"]} autocomplete'
+
+    started = time.perf_counter()
+    interaction = FakeInteraction(
+      self.bot, event, self.user(event['m']), self.channel(event['ch'])
+    )
+
+    try:
+      if kind == 'message':
+        message = types.SimpleNamespace(
+          author=interaction.user,
+          guild=interaction.guild,
+          channel=interaction.channel,
+        )
+        await self.bot.on_message(message)  # type: ignore
+      elif kind == 'component':
+        if not await self.component(interaction, event['id']):
+          self.skipped[kind] += 1
+          return
+      else:
+        command = self.bot.tree.get_command(event['c'])
+        if not isinstance(command, app_commands.Command):
+          self.skipped[label] += 1
+          return
+
+        interaction.command = command
+        if kind == 'autocomplete':
+          await command._invoke_autocomplete(
+            interaction, event['f'], interaction.namespace
+          )  # type: ignore
+        else:
+          await self.command(interaction, command)
+    except Exception as e:
+      self.errors[label] += 1
+      LOGGER.debug('%s failed: %s', label, e)
+
+    finished = time.perf_counter()
+    responded = interaction.responded or finished
+    self.timings[label].append((responded - started, finished - started))
+
+  async def command(
+    self, interaction: FakeInteraction, command: app_commands.Command
+  ) -> None:
+    # The same route the command tree takes: the global check, the command's checks, then the callback.
+    try:
+      if not await self.bot.tree.interaction_check(interaction):  # type: ignore
+        return
+      await command._invoke_with_namespace(interaction, interaction.namespace)  # type: ignore
+    except app_commands.AppCommandError as e:
+      await self.bot.on_tree_error(interaction, e)  # type: ignore
+    else:
+      await self.bot.on_app_command_completion(interaction, command)  # type: ignore
+
+  async def component(self, interaction: FakeInteraction, custom_id: str) -> bool:
+    # Same steps as discord.py's dispatch of dynamic items.
+    store = self.bot._connection._view_store
+    for pattern, factory in store._dynamic_items.items():
+      match = pattern.fullmatch(custom_id)
+      if match is None:
+        continue
+
+      item = await factory.from_custom_id(
+        interaction, ui.Button(custom_id=custom_id), match
+      )  # type: ignore
+      if await item.interaction_check(interaction):  # type: ignore
+        await item.callback(interaction)  # type: ignore
+      return True
+
+    return False
+
+  def report(self, elapsed: float, trace_seconds: float) -> None:
+    print(
+      f'\nReplayed {trace_seconds:.1f}s of traffic in {elapsed:.1f}s ({trace_seconds / elapsed:.1f}x).'
+    )
+    print(
+      f'{"event":<28}{"count":>8}{"errors":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"max ms":>9}{"done p99":>10}'
+    )
+
+    for label, timings in sorted(self.timings.items(), key=lambda item: -len(item[1])):
+      first = sorted(t[0] for t in timings)
+      done = sorted(t[1] for t in timings)
+
+      def pick(values: List[float], q: float) -> float:
+        return values[min(int(len(values) * q), len(values) - 1)] * 1000
+
+      print(
+        f'{label:<28}{len(timings):>8}{self.errors[label]:>8}'
+        f'{pick(first, 0.5):>9.1f}{pick(first, 0.95):>9.1f}{pick(first, 0.99):>9.1f}'
+        f'{first[-1] * 1000:>9.1f}{pick(done, 0.99):>10.1f}'
+      )
+
+    for label, count in self.skipped.items():
+      print(f'Skipped {count} {label} event(s) with nothing to run them.')
+
+    metrics = self.bot.metrics.snapshot()
+    print(
+      f'Event loop stalls: {metrics.get("loop.stalls", 0):g}, '
+      f'longest {metrics.get("loop.max_stall_seconds", 0) * 1000:.0f}ms.'
+    )
+    print(
+      f'Shed {metrics.get("admission.command.shed", 0):g} command(s) and '
+      f'{metrics.get("admission.message.shed", 0):g} message(s), '
+      f'peak load {metrics.get("admission.peak_load", 0):.2f}.'
+    )
+
+
+def copy_databases(database: str, shards: int, scratch: str) -> str:
+  paths = [database] + (
+    [shard_path(database, i) for i in range(shards)] if shards > 1 else []
+  )
+
+  for path in paths:
+    source = sqlite3.connect(path)
+    try:
+      copy_database(source, os.path.join(scratch, os.path.basename(path)), pages=-1)
+    finally:
+      source.close()
+
+  return os.path.join(scratch, os.path.basename(database))
+
+
+async def replay(args, database: str) -> None:
+  bot = fisher_bot.FisherBot(database, shard_count=args.shards)
+  # Nobody owns the replayed bot, so owner-only commands are refused like they are for everyone else.
+  bot.owner_id = -1
+
+  async with bot:
+    # Not setup_hook, syncing the command tree needs a login.
+    bot.start_services()
+    await bot.load_modules()
+
+    replayer = Replayer(bot)
+    tasks: set = set()
+
+    with open(args.trace, 'r') as f:
+      header = json.loads(f.readline())
+      if header.get('trace') != TRACE_VERSION:
+        raise SystemExit(f'{args.trace} is not a trace this version can replay.')
+
+      started = time.perf_counter()
+      last = 0.0
+      for count, line in enumerate(f):
+        if args.limit and count >= args.limit:
+          break
+
+        event = json.loads(line)
+        last = event['t']
+        delay = started + event['t'] / args.speed - time.perf_counter()
+        if delay > 0:
+          await asyncio.sleep(delay)
+
+        task = asyncio.create_task(replayer.play(event))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+      if tasks:
+        await asyncio.wait(tasks)
+
+    replayer.report(time.perf_counter() - started, last)
+
+
+def main():
+  logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(message)s')
+
+  parser = argparse.ArgumentParser(
+    description='Replay recorded traffic against a copy of a database.'
+  )
+  parser.add_argument('trace', help='Trace file recorded with FISHER_TRACE.')
+  parser.add_argument('database', help='Path to the main (catalog) database to copy.')
+  parser.add_argument('--shards', type=int, default=1, help='Number of shards.')
+  parser.add_argument(
+    '--speed', type=float, default=1.0, help='How much faster than recorded, 1 to 100.'
+  )
+  parser.add_argument(
+    '--limit', type=int, default=0, help='Stop after this many events.'
+  )
+
+  args = parser.parse_args()
+  if not 1 <= args.speed <= 100:
+    parser.error('--speed must be between 1 and 100.')
+
+  scratch = tempfile.mkdtemp(prefix='fisher-replay-')
+  try:
+    database = copy_databases(args.database, args.shards, scratch)
+    asyncio.run(replay(args, database))
+  finally:
+    shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,233 @@
+"""
+Monte Carlo simulation of the fishing economy, using the real catalog in data/.
+
+Every simulated player casts on cooldown with one rod in one area and sells everything they catch.
+It reports coins and XP per hour, how long it takes to reach each rod's level requirement and how
+earnings grow over time. Chat XP and dailies are left out.
+
+  python -m tools.simulate_economy --hours 100 --runs 200
+  python -m tools.simulate_economy --area ocean --cooldown 10 15 20
+"""
+
+import argparse
+import itertools
+import json
+import math
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+try:
+  import numpy as np
+except ImportError:
+  raise SystemExit('The simulator needs numpy: pip install numpy')
+
+from models.area import Area
+from services.db import DbService
+
+# Casts are simulated in blocks of this many to keep memory flat.
+CHUNK_CASTS = 200_000
+
+# Enough levels that no simulated player can run off the end of the table.
+MAX_LEVEL = 5_000
+
+
+def load_catalog(fish_path: str, rod_path: str) -> Tuple[List[dict], List[dict]]:
+  with open(fish_path, 'r') as f:
+    fish = json.load(f)['fish_data']
+  with open(rod_path, 'r') as f:
+    rods = json.load(f)['rod_data']
+  return (fish, rods)
+
+
+def level_tables() -> Tuple[np.ndarray, np.ndarray]:
+  """
+  Returns the total XP needed to reach each level and the total coins rewarded by then,
+  following DbService.add_xp. Index 0 is level 1.
+  """
+  cost = [0, 30]
+  reward = [0, math.floor(DbService.COIN_REWARD + 2 * DbService.COIN_REWARD_INCREASE)]
+  for level in range(2, MAX_LEVEL):
+    cost.append(
+      math.floor(math.pow(level / DbService.LEVEL_INCREASE, DbService.LEVEL_GAP))
+    )
+    reward.append(
+      math.floor(DbService.COIN_REWARD + (level + 1) * DbService.COIN_REWARD_INCREASE)
+    )
+
+  return (np.cumsum(cost, dtype=np.float64), np.cumsum(reward, dtype=np.float64))
+
+
+def simulate_run(
+  rod: dict,
+  fish: List[dict],
+  casts: int,
+  casts_per_hour: float,
+  targets: np.ndarray,
+  seed: int,
+) -> Dict[str, np.ndarray]:
+  """
+  Simulates one player. Returns their XP and coins at the end of every hour,
+  and the hour they first had each of the `targets` total XP (NaN if never).
+  """
+  rng = np.random.default_rng(seed)
+
+  weights = np.array([1 / f['odds'] for f in fish])
+  weights /= weights.sum()
+  values = np.array([f['base_value'] for f in fish], dtype=np.float64)
+  xps = np.array([f['xp'] for f in fish], dtype=np.float64)
+
+  keep = 1 - 1 / rod['line_break_chance']
+
+  cast_coins = np.empty(casts)
+  cast_xp = np.empty(casts)
+  for start in range(0, casts, CHUNK_CASTS):
+    size = min(CHUNK_CASTS, casts - start)
+
+    hooked = rng.integers(rod['min_catch'], rod['max_catch'] + 1, size=size)
+    landed = rng.binomial(hooked, keep)
+    species = rng.multinomial(landed, weights)
+
+    cast_coins[start : start + size] = species @ values
+    cast_xp[start : start + size] = np.floor(species @ xps * rod['xp_multiplier'])
+
+  hour_marks = (np.arange(1, int(casts / casts_per_hour) + 1) * casts_per_hour).astype(
+    int
+  ) - 1
+
+  total_xp = np.cumsum(cast_xp)
+  reached = np.searchsorted(total_xp, targets).astype(np.float64)
+  reached[reached >= casts] = np.nan
+
+  return {
+    'xp': total_xp[hour_marks],
+    'coins': np.cumsum(cast_coins)[hour_marks],
+    'reached': (reached + 1) / casts_per_hour,
+  }
+
+
+def simulate(
+  rod: dict,
+  fish: List[dict],
+  targets: np.ndarray,
+  hours: int,
+  cooldown: float,
+  runs: int,
+  seed: int,
+  pool: ProcessPoolExecutor,
+) -> Dict[str, np.ndarray]:
+  casts_per_hour = 3600 / cooldown
+  casts = int(hours * casts_per_hour)
+
+  results = list(
+    pool.map(
+      simulate_run,
+      itertools.repeat(rod),
+      itertools.repeat(fish),
+      itertools.repeat(casts),
+      itertools.repeat(casts_per_hour),
+      itertools.repeat(targets),
+      range(seed, seed + runs),
+    )
+  )
+
+  return {
+    'xp': np.stack([r['xp'] for r in results]),
+    'coins': np.stack([r['coins'] for r in results]),
+    'reached': np.stack([r['reached'] for r in results]),
+  }
+
+
+def report(
+  rod: dict,
+  area: Area,
+  cooldown: float,
+  rods: List[dict],
+  result: Dict[str, np.ndarray],
+  tables: Tuple[np.ndarray, np.ndarray],
+) -> None:
+  xp_needed, rewards = tables
+
+  levels = np.searchsorted(xp_needed, result['xp'], side='right')
+  coins = result['coins'] + rewards[levels - 1]
+  hours = coins.shape[1]
+
+  print(
+    f'\n{rod["name"]} in the {area.name}, {cooldown:g}s cooldown, {len(coins)} runs:'
+  )
+  print(f'  sales:   {np.mean(result["coins"][:, -1]) / hours:,.0f} coins/h')
+  print(f'  xp:      {np.mean(result["xp"][:, -1]) / hours:,.0f} XP/h')
+  print(f'  overall: {np.mean(coins[:, -1]) / hours:,.0f} coins/h with level rewards')
+
+  for i, target in enumerate(rods):
+    reached = result['reached'][:, i]
+    when = (
+      f'{np.nanmedian(reached):.2f}h (median)'
+      if not np.isnan(reached).all()
+      else f'not within {hours}h'
+    )
+    print(f'  level {target["level_required"]} for {target["name"]}: {when}')
+
+  # Coins earned during each hour, to show how income grows as players level up.
+  per_hour = np.diff(np.mean(coins, axis=0), prepend=0)
+  marks = sorted(
+    {1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, hours} & set(range(1, hours + 1))
+  )
+  curve = ', '.join(f'h{mark}: {per_hour[mark - 1]:,.0f}' for mark in marks)
+  print(f'  income:  {curve}')
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Simulate the fishing economy.')
+  parser.add_argument('--fish', default='./data/fish.json')
+  parser.add_argument('--rods', default='./data/rods.json')
+  parser.add_argument('--hours', type=int, default=100, help='Hours of play per run.')
+  parser.add_argument('--runs', type=int, default=100, help='Players per scenario.')
+  parser.add_argument(
+    '--cooldown',
+    type=float,
+    nargs='+',
+    default=[15],
+    help='Fishing cooldowns to sweep.',
+  )
+  parser.add_argument('--area', choices=[a.name for a in Area], nargs='+')
+  parser.add_argument('--rod', nargs='+', help='Rod names to simulate.')
+  parser.add_argument('--workers', type=int, default=None)
+  parser.add_argument('--seed', type=int, default=0)
+
+  args = parser.parse_args()
+
+  fish, rods = load_catalog(args.fish, args.rods)
+  tables = level_tables()
+  xp_needed, _ = tables
+
+  areas = [Area[a] for a in args.area] if args.area else list(Area)
+  chosen_rods = [r for r in rods if not args.rod or r['name'] in args.rod]
+
+  # Total XP needed for each rod's level requirement.
+  targets = np.array([xp_needed[r['level_required'] - 1] for r in rods])
+
+  started = time.perf_counter()
+  total_casts = 0
+
+  with ProcessPoolExecutor(max_workers=args.workers) as pool:
+    for rod, area, cooldown in itertools.product(chosen_rods, areas, args.cooldown):
+      area_fish = [f for f in fish if f['area'] == area.name]
+      if not area_fish:
+        print(f'\nNo fish in the {area.name}, skipping.')
+        continue
+
+      result = simulate(
+        rod, area_fish, targets, args.hours, cooldown, args.runs, args.seed, pool
+      )
+      total_casts += int(args.hours * 3600 / cooldown) * args.runs
+
+      report(rod, area, cooldown, rods, result, tables)
+
+  elapsed = time.perf_counter() - started
+  print(f'\nSimulated {total_casts:,} casts in {elapsed:.2f}s.')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,65 @@
+"""
+Exports a guild's economy to an NDJSON file and imports it into another database.
+
+  python -m tools.transfer_guild fishy.db export 1234567890 guild.ndjson
+  python -m tools.transfer_guild other.db --shards 4 import guild.ndjson
+
+Both stream in batches and save a checkpoint next to the file, so an interrupted run picks up where it
+stopped when started again with the same arguments. Fish and rods are matched by name.
+"""
+
+import argparse
+import logging
+import time
+
+from services.db_init import initialize_shard
+from services.shard_router import ShardRouter
+from services.transfer import export_guild, import_guild
+
+LOGGER = logging.getLogger('FisherCat.TransferGuild')
+
+
+def main():
+  logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+
+  parser = argparse.ArgumentParser(description='Export or import one guild.')
+  parser.add_argument('database', help='Path to the main (catalog) database.')
+  parser.add_argument('--shards', type=int, default=1, help='Number of shards.')
+  parser.add_argument('--batch-size', type=int, default=1000, help='Rows per batch.')
+
+  commands = parser.add_subparsers(dest='command', required=True)
+
+  export = commands.add_parser('export', help='Write a guild to a file.')
+  export.add_argument('guild', type=int)
+  export.add_argument('file')
+
+  load = commands.add_parser('import', help='Load a guild from a file.')
+  load.add_argument('file')
+  load.add_argument('--as-guild', type=int, help='Import under another guild id.')
+
+  args = parser.parse_args()
+  if args.batch_size < 1:
+    parser.error('--batch-size must be at least 1.')
+
+  router = ShardRouter(args.database, args.shards)
+  for shard in router.shards:
+    initialize_shard(shard)
+
+  started = time.perf_counter()
+  try:
+    if args.command == 'export':
+      rows = export_guild(router, args.guild, args.file, args.batch_size)
+      LOGGER.info('Exported guild %s to %s (%s rows).', args.guild, args.file, rows)
+    elif args.command == 'import':
+      rows = import_guild(router, args.file, args.batch_size, args.as_guild)
+      LOGGER.info('Imported %s (%s rows).', args.file, rows)
+  except ValueError as e:
+    parser.error(str(e))
+  finally:
+    router.close()
+
+  LOGGER.info('Took %.2fs.', time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+  main()
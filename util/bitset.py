@@ -0,0 +1,32 @@
+from typing import Iterator, Optional
+
+
+def to_blob(mask: int) -> bytes:
+  """
+  Encodes a bitmask as little-endian bytes, so it can be stored in a BLOB column of any width.
+  """
+  return mask.to_bytes((mask.bit_length() + 7) // 8 or 1, 'little')
+
+
+def from_blob(blob: Optional[bytes]) -> int:
+  if not blob:
+    return 0
+  return int.from_bytes(blob, 'little')
+
+
+def has_bit(mask: int, index: int) -> bool:
+  return (mask >> index) & 1 == 1
+
+
+def set_bit(mask: int, index: int) -> int:
+  return mask | (1 << index)
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+  """
+  Yields the index of every set bit, lowest first.
+  """
+  while mask:
+    low = mask & -mask
+    yield low.bit_length() - 1
+    mask ^= low
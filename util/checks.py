@@ -0,0 +1,14 @@
+from discord import app_commands
+
+import discord
+
+
+def owner_only():
+  """
+  App command check that only lets the bot owner (or team members) through.
+  """
+
+  async def predicate(interaction: discord.Interaction) -> bool:
+    return await interaction.client.is_owner(interaction.user)  # type: ignore
+
+  return app_commands.check(predicate)
@@ -0,0 +1,94 @@
+import json
+import re
+
+from typing import Any, Iterator, List, TextIO
+
+_DECODER = json.JSONDecoder()
+_SKIP_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_array(f: TextIO, key: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+  """
+  Yields the items of the array under `key` in a JSON object like `{"key": [...]}` one at a time,
+  reading `chunk_size` characters at a time, so only one item has to be in memory at once.
+
+  Raises json.JSONDecodeError when the file is not shaped like that or is cut short.
+  """
+  buffer = ''
+  eof = False
+
+  def fill() -> bool:
+    nonlocal buffer, eof
+    if eof:
+      return False
+    chunk = f.read(chunk_size)
+    if not chunk:
+      eof = True
+      return False
+    buffer += chunk
+    return True
+
+  # Find the opening bracket of the array.
+  marker = json.dumps(key)
+  while True:
+    start = buffer.find(marker)
+    if start != -1:
+      bracket = buffer.find('[', start + len(marker))
+      if bracket != -1:
+        buffer = buffer[bracket + 1 :]
+        break
+    if not fill():
+      raise json.JSONDecodeError(f'No array called {key}', buffer, 0)
+
+  position = 0
+  while True:
+    # Skip to the next item, past whitespace and the comma between items.
+    while True:
+      position = _SKIP_WHITESPACE.match(buffer, position).end()  # type: ignore
+      if position < len(buffer):
+        break
+      buffer, position = '', 0
+      if not fill():
+        raise json.JSONDecodeError(f'Array {key} is not closed', buffer, position)
+
+    if buffer[position] == ']':
+      return
+    if buffer[position] == ',':
+      position += 1
+      continue
+
+    try:
+      item, end = _DECODER.raw_decode(buffer, position)
+    except json.JSONDecodeError:
+      # Most likely the item runs past the end of the buffer, read more and try again.
+      buffer, position = buffer[position:], 0
+      if not fill():
+        raise
+      continue
+
+    # A number at the end of the buffer may have been cut short ("-3." decodes as -3), so an item
+    # only counts once the comma or bracket after it has been read.
+    after = _SKIP_WHITESPACE.match(buffer, end).end()  # type: ignore
+    if after == len(buffer) or buffer[after] not in ',]':
+      buffer, after, position = buffer[position:], after - position, 0
+      if not fill():
+        raise json.JSONDecodeError("Expecting ',' delimiter or ']'", buffer, after)
+      continue
+
+    yield item
+    position = end
+
+    # Drop what has been read once in a while so the buffer stays small.
+    if position > chunk_size:
+      buffer, position = buffer[position:], 0
+
+
+def batched(items: Iterator[Any], size: int) -> Iterator[List[Any]]:
+  batch = []
+  for item in items:
+    batch.append(item)
+    if len(batch) >= size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
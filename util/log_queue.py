@@ -0,0 +1,126 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import discord
+
+
+class JsonFormatter(logging.Formatter):
+  """
+  One JSON object per line, for log collectors.
+  """
+
+  def format(self, record: logging.LogRecord) -> str:
+    entry = {
+      'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+      'level': record.levelname,
+      'logger': record.name,
+      'message': record.getMessage(),
+    }
+    if record.exc_info:
+      entry['exception'] = self.formatException(record.exc_info)
+    if record.stack_info:
+      entry['stack'] = self.formatStack(record.stack_info)
+
+    return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+  """
+  Keeps one in every `n` records below WARNING for the loggers in `rates` (and their children), so chatty
+  loggers can stay on without flooding the output. Warnings and errors always pass.
+  """
+
+  def __init__(self, rates: Dict[str, int]):
+    super().__init__()
+    self.rates = rates
+    self.counts: Dict[str, int] = {}
+
+  def rate(self, name: str) -> int:
+    while name:
+      if name in self.rates:
+        return self.rates[name]
+      name = name.rpartition('.')[0]
+    return 1
+
+  def filter(self, record: logging.LogRecord) -> bool:
+    if record.levelno >= logging.WARNING:
+      return True
+
+    rate = self.rate(record.name)
+    if rate <= 1:
+      return True
+
+    count = self.counts.get(record.name, 0)
+    self.counts[record.name] = count + 1
+    return count % rate == 0
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+  """
+  The stock QueueHandler formats every record before queueing it, so that it can be pickled. This queue
+  never leaves the process, so records are queued as they are and formatted by the listener thread.
+  """
+
+  def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+    return record
+
+
+def parse_sampling(spec: Optional[str]) -> Dict[str, int]:
+  """
+  Reads `FisherCat.DbService=10,FisherCat.Ledger=100` into {logger: keep one in n}.
+  """
+  rates = {}
+  for part in (spec or '').split(','):
+    if not part.strip():
+      continue
+    name, _, rate = part.partition('=')
+    rates[name.strip()] = max(int(rate), 1)
+  return rates
+
+
+def setup_logging(
+  level: int = logging.INFO,
+  json_output: bool = False,
+  sampling: Optional[Dict[str, int]] = None,
+) -> logging.handlers.QueueListener:
+  """
+  Points the root logger at a queue that a background thread drains to stderr, so a slow terminal or
+  disk never holds up the event loop. The output looks the same as discord.utils.setup_logging unless
+  `json_output` is set. The listener is flushed and stopped when the process exits.
+  """
+  handler = logging.StreamHandler(sys.stderr)
+  if json_output:
+    handler.setFormatter(JsonFormatter())
+  elif discord.utils.stream_supports_colour(handler.stream):
+    handler.setFormatter(discord.utils._ColourFormatter())
+  else:
+    handler.setFormatter(
+      logging.Formatter(
+        '[{asctime}] [{levelname:<8}] {name}: {message}', '%Y-%m-%d %H:%M:%S', style='{'
+      )
+    )
+
+  records: queue.SimpleQueue = queue.SimpleQueue()
+  queue_handler = LazyQueueHandler(records)
+  if sampling:
+    queue_handler.addFilter(SamplingFilter(sampling))
+
+  root = logging.getLogger()
+  for old in root.handlers[:]:
+    root.removeHandler(old)
+  root.addHandler(queue_handler)
+  root.setLevel(level)
+
+  listener = logging.handlers.QueueListener(
+    records, handler, respect_handler_level=True
+  )
+  listener.start()
+  atexit.register(listener.stop)
+  return listener
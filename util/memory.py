@@ -0,0 +1,85 @@
+import gc
+import linecache
+import tracemalloc
+
+from typing import Dict, Optional, Tuple
+
+# The snapshot the next diff is compared against, replaced every time one is taken.
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+# Allocations made by tracemalloc and the import system are noise for our purposes.
+_IGNORED = (
+  tracemalloc.Filter(False, tracemalloc.__file__),
+  tracemalloc.Filter(False, linecache.__file__),
+  tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+  tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+  tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def is_tracing() -> bool:
+  return tracemalloc.is_tracing()
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+  return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+
+def start_tracing(frames: int = 1) -> None:
+  """
+  Starts tracing allocations, keeping `frames` frames of traceback for each, and takes the first snapshot.
+  Tracing makes every allocation slower, so stop it once done.
+  """
+  global _last_snapshot
+
+  tracemalloc.start(frames)
+  _last_snapshot = _take_snapshot()
+
+
+def stop_tracing() -> None:
+  global _last_snapshot
+
+  _last_snapshot = None
+  tracemalloc.stop()
+
+
+def allocation_diff(top: int = 25) -> str:
+  """
+  Takes a snapshot and lists the `top` allocation sites that grew the most since the previous one.
+
+  Blocks while the snapshot is taken and compared, so run it on a worker thread.
+  """
+  global _last_snapshot
+
+  if _last_snapshot is None:
+    raise RuntimeError('Allocations are not being traced.')
+
+  snapshot = _take_snapshot()
+  stats = snapshot.compare_to(_last_snapshot, 'lineno')
+  _last_snapshot = snapshot
+
+  current, peak = tracemalloc.get_traced_memory()
+  lines = [
+    f'Traced memory: {current / 1024:.1f} KiB now, {peak / 1024:.1f} KiB at peak, '
+    f'{tracemalloc.get_tracemalloc_memory() / 1024:.1f} KiB used by tracemalloc itself.',
+    '',
+    f'Top {top} allocation sites since the last snapshot:',
+  ]
+  lines.extend(str(stat) for stat in stats[:top])
+  return '\n'.join(lines)
+
+
+def count_objects(classes: Dict[str, type]) -> Dict[str, Tuple[int, int]]:
+  """
+  Counts the live instances of every class in `classes` (subclasses included) with one pass over the
+  garbage collector, returning {name: (count, shallow bytes)}.
+  """
+  counts = {name: (0, 0) for name in classes}
+
+  for obj in gc.get_objects():
+    for name, cls in classes.items():
+      if isinstance(obj, cls):
+        count, size = counts[name]
+        counts[name] = (count + 1, size + obj.__sizeof__())
+
+  return counts
@@ -1,46 +1,124 @@
-from typing import Any
+from typing import Any, Dict, Tuple, Type
 from discord import ui
 import discord
 
 
+async def check_owner(interaction: discord.Interaction, member_id: int) -> bool:
+  if interaction.user.id != member_id:
+    await interaction.response.send_message(
+      "This isn't your fishing shop! Use the command yourself to browse.",
+      ephemeral=True,
+    )
+    return False
+  return True
+
+
+class PageButton(
+  ui.DynamicItem[ui.Button],
+  template=r'page:(?P<kind>\w+):(?P<member_id>\d+):(?P<page>-?\d+)',
+):
+  """
+  Previous/Next button. The paginator kind, owner and target page all live in the custom_id.
+  """
+
+  def __init__(self, kind: str, member_id: int, page: int, label: str, disabled=False):
+    super().__init__(
+      ui.Button(
+        label=label,
+        style=discord.ButtonStyle.blurple,
+        disabled=disabled,
+        custom_id=f'page:{kind}:{member_id}:{page}',
+      )
+    )
+
+    self.kind = kind
+    self.member_id = member_id
+    self.page = page
+
+  @classmethod
+  async def from_custom_id(
+    cls, interaction: discord.Interaction, item: ui.Button, match
+  ) -> 'PageButton':
+    return cls(
+      match['kind'], int(match['member_id']), int(match['page']), str(item.label)
+    )
+
+  async def interaction_check(self, interaction: discord.Interaction) -> bool:
+    return await check_owner(interaction, self.member_id)
+
+  async def callback(self, interaction: discord.Interaction):
+    paginator = PaginatorView.kinds.get(self.kind)
+    if paginator is None:
+      return
+
+    embed, view = await paginator.render(interaction, self.member_id, self.page)
+    await interaction.response.edit_message(embed=embed, view=view)
+
+
 class PaginatorView(ui.View):
-  def __init__(self, data, member_id: int, per_page=5, timeout=60, title='results'):
-    super().__init__(timeout=timeout)
+  """
+  Stateless paginator. A view only lives long enough to be sent; every click loads the data again
+  through `load` and builds a new view, so nothing is held between clicks and buttons survive restarts.
 
-    self.data = data
-    self.per_page = per_page
-    self.timeout = timeout
-    self.title = title
+  Subclasses set a unique `kind` and implement `load`.
+  """
+
+  kinds: Dict[str, Type['PaginatorView']] = {}
+
+  kind = 'results'
+  per_page = 5
+  title = 'results'
+
+  def __init_subclass__(cls, **kwargs):
+    super().__init_subclass__(**kwargs)
+    PaginatorView.kinds[cls.kind] = cls
+
+  def __init__(self, member_id: int, page: int = 0):
+    super().__init__(timeout=None)
 
     self.member_id = member_id
 
-    self.current_page = 0
-    self.total_pages = (len(data) + self.per_page - 1) // self.per_page
+    self.current_page = page
+    self.total_pages = 1
 
-    self.update_buttons()
+  @classmethod
+  async def render(
+    cls, interaction: discord.Interaction, member_id: int, page: int
+  ) -> Tuple[discord.Embed, 'PaginatorView']:
+    view = cls(member_id, page)
+    data = await view.load(interaction)
 
-  async def interaction_check(self, interaction: discord.Interaction) -> bool:
-    if interaction.user.id != self.member_id:
-        await interaction.response.send_message(
-            "This isn't your fishing shop! Use the command yourself to browse.",
-            ephemeral=True
-        )
-        return False
-    return True
+    view.total_pages = max(1, (len(data) + view.per_page - 1) // view.per_page)
+    view.current_page = min(max(page, 0), view.total_pages - 1)
+    view.update_buttons()
 
-  def update_buttons(self):
-    self.children[0].disabled = self.current_page == 0  # type: ignore
-    self.children[1].disabled = self.current_page == self.total_pages - 1  # type: ignore
+    start = view.current_page * view.per_page
+    embed = await view.format_page(data[start : start + view.per_page])
+    return (embed, view)
 
-  async def update_message(self, interaction: discord.Interaction):
-    entries = self.get_current_page_data()
-    embed = await self.format_page(entries)
-    await interaction.response.edit_message(embed=embed, view=self)
+  async def load(self, interaction: discord.Interaction) -> list[Any]:
+    raise NotImplementedError
 
-  def get_current_page_data(self) -> list[Any]:
-    start = self.current_page * self.per_page
-    end = start + self.per_page
-    return self.data[start:end]
+  def update_buttons(self):
+    self.clear_items()
+    self.add_item(
+      PageButton(
+        self.kind,
+        self.member_id,
+        self.current_page - 1,
+        'Previous',
+        disabled=self.current_page == 0,
+      )
+    )
+    self.add_item(
+      PageButton(
+        self.kind,
+        self.member_id,
+        self.current_page + 1,
+        'Next',
+        disabled=self.current_page == self.total_pages - 1,
+      )
+    )
 
   async def format_page(self, entries: list[Any]) -> discord.Embed:
     embed = discord.Embed(
@@ -49,25 +127,3 @@ class PaginatorView(ui.View):
     description = '\n'.join(str(x) for x in entries)
     embed.description = description
     return embed
-
-  @ui.button(label='Previous', style=discord.ButtonStyle.blurple)
-  async def prev_button(
-    self, interaction: discord.Interaction, button: discord.ui.Button
-  ):
-    if not await self.interaction_check(interaction):
-      return
-
-    self.current_page -= 1
-    self.update_buttons()
-    await self.update_message(interaction)
-
-  @ui.button(label='Next', style=discord.ButtonStyle.blurple)
-  async def next_button(
-    self, interaction: discord.Interaction, button: discord.ui.Button
-  ):
-    if not await self.interaction_check(interaction):
-      return
-
-    self.current_page += 1
-    self.update_buttons()
-    await self.update_message(interaction)
@@ -0,0 +1,93 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+
+from collections import Counter
+from types import FrameType
+from typing import Optional, Tuple
+
+
+def collapse_stack(frame: Optional[FrameType]) -> str:
+  """
+  Turns a frame into a single `root;caller;callee` line, the format flame graph tools expect.
+  """
+  parts = []
+  while frame is not None:
+    code = frame.f_code
+    parts.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+    frame = frame.f_back
+
+  return ';'.join(reversed(parts))
+
+
+class StackSampler(threading.Thread):
+  """
+  Samples the stack of another thread on an interval and counts identical stacks.
+  """
+
+  def __init__(self, thread_id: int, interval: float = 0.005):
+    super().__init__(name='FisherCat-StackSampler', daemon=True)
+
+    self.thread_id = thread_id
+    self.interval = interval
+
+    self.samples: Counter[str] = Counter()
+    self._stopped = threading.Event()
+
+  def run(self):
+    while not self._stopped.wait(self.interval):
+      frame = sys._current_frames().get(self.thread_id)
+      if frame is None:
+        continue
+
+      self.samples[collapse_stack(frame)] += 1
+
+  def stop(self) -> None:
+    self._stopped.set()
+    self.join()
+
+  def collapsed(self) -> str:
+    return '\n'.join(f'{stack} {count}' for stack, count in self.samples.most_common())
+
+
+_PROFILE_LOCK = asyncio.Lock()
+
+
+def is_profiling() -> bool:
+  return _PROFILE_LOCK.locked()
+
+
+async def profile_loop(
+  seconds: float, collapsed: bool = False, top: int = 50
+) -> Tuple[str, Optional[str]]:
+  """
+  Profiles everything the event loop thread runs for `seconds`.
+
+  Returns the top functions by cumulative time and, if asked for, collapsed stacks for flame graphs.
+  """
+  async with _PROFILE_LOCK:
+    profiler = cProfile.Profile()
+    sampler = StackSampler(threading.get_ident()) if collapsed else None
+
+    # cProfile hooks the calling thread, which is the loop thread, so awaiting here
+    # records every callback the loop runs until we disable it again.
+    profiler.enable()
+    if sampler is not None:
+      sampler.start()
+
+    try:
+      await asyncio.sleep(seconds)
+    finally:
+      profiler.disable()
+      if sampler is not None:
+        sampler.stop()
+
+  stream = io.StringIO()
+  stats = pstats.Stats(profiler, stream=stream)
+  stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+
+  return (stream.getvalue(), sampler.collapsed() if sampler is not None else None)
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+# How timestamps were stored before schema v2, in local time.
+LEGACY_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def to_epoch(moment: datetime) -> int:
+  return int(moment.timestamp())
+
+
+def from_epoch(value) -> datetime:
+  """
+  Reads a timestamp from the database, which is seconds since the epoch since schema v2 and a formatted
+  string before that.
+  """
+  if isinstance(value, str) and not value.isdigit():
+    return datetime.strptime(value, LEGACY_FORMAT)
+  return datetime.fromtimestamp(int(value))
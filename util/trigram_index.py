@@ -0,0 +1,89 @@
+import re
+
+from collections import Counter, defaultdict
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Set
+
+
+class TrigramIndex:
+  """
+  Typo-tolerant name lookup. Every name is split into trigrams, and a query scores names by how many
+  trigrams they share with it, so only names with at least one shared trigram are ever looked at.
+  """
+
+  def __init__(self, min_score: float = 0.2):
+    self.min_score = min_score
+
+    self.keys: List[str] = []
+    self.items: List[Any] = []
+    self.grams: List[Set[str]] = []
+
+    # trigram -> indices of every name containing it
+    self.postings: Dict[str, List[int]] = defaultdict(list)
+
+  @staticmethod
+  def normalize(text: str) -> str:
+    return ' '.join(re.sub(r'[^\w]+', ' ', text.lower()).split())
+
+  @staticmethod
+  def trigrams(text: str) -> Set[str]:
+    # Padding lets short queries and word starts match too.
+    padded = f'  {text} '
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+  def add(self, key: str, item: Any) -> None:
+    key = self.normalize(key)
+    grams = self.trigrams(key)
+
+    index = len(self.items)
+    self.keys.append(key)
+    self.items.append(item)
+    self.grams.append(grams)
+
+    for gram in grams:
+      self.postings[gram].append(index)
+
+  def search(
+    self,
+    query: str,
+    limit: int = 25,
+    predicate: Optional[Callable[[Any], bool]] = None,
+  ) -> List[Any]:
+    """
+    Returns up to `limit` items, best match first. An empty query returns items in insertion order.
+    """
+    query = self.normalize(query)
+
+    if not query:
+      matches = (item for item in self.items if predicate is None or predicate(item))
+      return list(islice(matches, limit))
+
+    grams = self.trigrams(query)
+    postings = sorted((self.postings.get(gram, []) for gram in grams), key=len)
+
+    # Trigrams found in a large share of all names barely narrow things down and make up most of the
+    # work, so candidates come from the selective ones. Scores still use every trigram.
+    cutoff = max(len(self.items) // 20, 64)
+    selective = [p for p in postings if len(p) <= cutoff] or postings[:1]
+
+    shared: Counter[int] = Counter()
+    for posting in selective:
+      shared.update(posting)
+
+    scored = []
+    for index, _ in shared.most_common(limit * 8 if predicate is None else None):
+      item = self.items[index]
+      if predicate is not None and not predicate(item):
+        continue
+
+      # Dice coefficient, with a bonus for names that contain the query outright.
+      key_grams = self.grams[index]
+      score = 2 * len(grams & key_grams) / (len(grams) + len(key_grams))
+      if query in self.keys[index]:
+        score += 1
+
+      if score >= self.min_score:
+        scored.append((-score, self.keys[index], index))
+
+    scored.sort()
+    return [self.items[index] for _, _, index in scored[:limit]]
@@ -1,29 +1,125 @@
+import math
 import random
-import bisect
 
-from typing import Any
+from typing import Any, Dict, Iterable, List, Tuple
+
+# A total below this is rounding left over from weights that were set back to 0.
+EPSILON = 1e-12
 
 
 class WeightedRandom:
+  """
+  Draws items with a chance proportional to their weight.
+
+  Weights are kept in a Fenwick tree, so drawing, adding an item and changing a weight are all O(log n)
+  and the distribution never has to be rebuilt. A weight of 0 keeps the item but never draws it.
+  """
+
   def __init__(self):
-    self.items = []
-    self.cummulative_weight = []
-    self.total_weight = 0
+    self.items: List[Any] = []
+    self.weights: List[float] = []
+    # 1-based, tree[i] holds the sum of the weights in (i - lowbit(i), i].
+    self.tree: List[float] = [0.0]
+    self.positions: Dict[int, int] = {}
+    self.total_weight: float = 0.0
+
+  @classmethod
+  def from_items(cls, pairs: Iterable[Tuple[Any, float]]) -> 'WeightedRandom':
+    """
+    Builds a sampler from (item, weight) pairs in one O(n) pass, instead of one add() per item.
+    """
+    sampler = cls()
+    for item, weight in pairs:
+      if weight <= 0:
+        raise ValueError('weight must be positive.')
+      sampler.positions[id(item)] = len(sampler.items)
+      sampler.items.append(item)
+      sampler.weights.append(weight)
+
+    tree = sampler.tree = [0.0, *sampler.weights]
+    size = len(tree) - 1
+    for i in range(1, size + 1):
+      parent = i + (i & -i)
+      if parent <= size:
+        tree[parent] += tree[i]
+
+    sampler.total_weight = sampler._prefix(size)
+    return sampler
+
+  def _prefix(self, count: int) -> float:
+    # Sum of the first `count` weights.
+    total = 0.0
+    while count > 0:
+      total += self.tree[count]
+      count -= count & -count
+    return total
 
   def add(self, item: Any, weight: float) -> None:
     if weight <= 0:
       raise ValueError('weight must be positive.')
 
+    self.positions[id(item)] = len(self.items)
     self.items.append(item)
+    self.weights.append(weight)
+
+    # The new node covers (i - lowbit(i), i], the weights before it in that range are already in the tree.
+    i = len(self.items)
+    self.tree.append(weight + self._prefix(i - 1) - self._prefix(i - (i & -i)))
     self.total_weight += weight
 
-    self.cummulative_weight.append(self.total_weight)
+  def index(self, item: Any) -> int:
+    """
+    Position of `item`, raises KeyError if it was never added.
+    """
+    return self.positions[id(item)]
+
+  def weight(self, index: int) -> float:
+    return self.weights[index]
+
+  def set_weight(self, index: int, weight: float) -> None:
+    """
+    Changes the weight of the item at `index` in O(log n).
+    """
+    if weight < 0:
+      raise ValueError('weight must not be negative.')
+
+    delta = weight - self.weights[index]
+    self.weights[index] = weight
+    self.total_weight += delta
+    if self.total_weight < EPSILON:
+      # Summed afresh, so weights that all went back to 0 leave exactly 0 instead of rounding residue.
+      self.total_weight = math.fsum(self.weights)
+
+    i = index + 1
+    while i < len(self.tree):
+      self.tree[i] += delta
+      i += i & -i
 
   def get(self) -> Any:
     if not self.items:
       return None
 
-    rnd_point = random.uniform(0, self.total_weight)
-    idx = bisect.bisect_right(self.cummulative_weight, rnd_point)
+    total = self.total_weight
+    if total <= 0:
+      return None
+
+    # Walks down the tree to the first item whose running total passes the random point.
+    remaining = random.uniform(0, total)
+    position = 0
+    step = 1 << (len(self.items).bit_length() - 1)
+    while step:
+      candidate = position + step
+      if candidate < len(self.tree) and self.tree[candidate] <= remaining:
+        position = candidate
+        remaining -= self.tree[candidate]
+      step >>= 1
+
+    # Rounding can put the point at the very top, or on an item whose weight was set to 0.
+    position = min(position, len(self.items) - 1)
+    while position > 0 and self.weights[position] <= 0:
+      position -= 1
+
+    if self.weights[position] <= 0:
+      return None
 
-    return self.items[idx]
+    return self.items[position]